@@ -5,7 +5,11 @@ test_workflows.py - Test BPMN workflow engine
 
 import pytest
 import asyncio
-from workflow_engine import WorkflowEngine, StepType
+from datetime import datetime, timedelta
+from workflow_engine import (
+    WorkflowEngine, WorkflowInstance, WorkflowTimerScheduler, StepType, ConditionError, compile_condition
+)
+from workflow_store import InMemoryInstanceStore, ConcurrentModificationError
 
 
 @pytest.fixture
@@ -299,6 +303,116 @@ async def test_evaluation_step():
     assert result.output["total_criteria"] == 2
 
 
+@pytest.mark.asyncio
+async def test_resume_workflow_from_store(simple_workflow_def):
+    """Test another engine resumes an instance from the shared store"""
+    store = InMemoryInstanceStore()
+    await store.save_definition("simple", simple_workflow_def)
+    await store.create(WorkflowInstance(
+        id="wf-011",
+        definition_id="simple",
+        context={"name": "Ana"},
+        current_step=1
+    ))
+    
+    engine = WorkflowEngine(store)
+    instance = await engine.resume_workflow("wf-011")
+    
+    assert instance.status == "completed"
+    assert [s.step_id for s in instance.steps_executed] == ["step2"]
+    stored = await store.load("wf-011")
+    assert stored.status == "completed"
+    assert stored.version == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_save_rejected(engine, simple_workflow_def):
+    """Test optimistic versioning rejects a stale save"""
+    engine.register_definition("simple", simple_workflow_def)
+    await engine.start_workflow("simple", "wf-012", {"name": "Ana"})
+    
+    first = await engine.store.load("wf-012")
+    second = await engine.store.load("wf-012")
+    await engine.store.save(first, [])
+    
+    with pytest.raises(ConcurrentModificationError):
+        await engine.store.save(second, [])
+
+
+@pytest.mark.asyncio
+async def test_wait_step_resumed_by_scheduler(engine):
+    """Test ESPERA suspends the instance until the scheduler resumes it"""
+    workflow_def = {
+        "id": "wait",
+        "name": "Wait",
+        "steps": [
+            {"id": "plazo", "type": StepType.ESPERA.value, "config": {"duration_seconds": 3600}, "next": 1},
+            {"id": "notificar", "type": StepType.NOTIFICACION.value, "config": {"recipients": ["a@b.es"]}, "next": 2}
+        ]
+    }
+    engine.register_definition("wait", workflow_def)
+    scheduler = WorkflowTimerScheduler(engine)
+    
+    instance = await engine.start_workflow("wait", "wf-013", {})
+    assert instance.status == "waiting"
+    assert await engine.store.next_wake_at() == instance.wake_at
+    
+    assert await scheduler.fire_due() == 0
+    assert await scheduler.fire_due(now=datetime.utcnow() + timedelta(hours=2)) == 1
+    
+    resumed = await engine.store.load("wf-013")
+    assert resumed.status == "completed"
+    assert [s.step_id for s in resumed.steps_executed] == ["plazo", "notificar"]
+    assert await engine.store.next_wake_at() is None
+
+
+def test_compiled_conditions():
+    """Test compiled condition expressions"""
+    context = {"amount": 7500, "tipo": "factura", "solicitud": {"urgente": True}, "documentos_completos": True}
+    
+    assert compile_condition("amount > 5000 and tipo == 'factura'")(context) is True
+    assert compile_condition("context.get('amount', 0) <= 5000")(context) is False
+    assert compile_condition("1000 < amount < 10000")(context) is True
+    assert compile_condition("tipo in ['factura', 'contrato']")(context) is True
+    assert compile_condition("solicitud.urgente or not documentos_completos")(context) is True
+    assert compile_condition("context['solicitud']['urgente'] == true")(context) is True
+    # Missing fields never raise
+    assert compile_condition("importe > 100")(context) is False
+    assert compile_condition("")(context) is True
+
+
+@pytest.mark.parametrize("condition", [
+    "__import__('os').system('true')",
+    "amount.__class__",
+    "amount + 1 > 2",
+    "[x for x in range(10)]",
+    "lambda: 1",
+    "amount >",
+])
+def test_unsafe_conditions_rejected(condition):
+    """Test conditions outside the allowed subset are rejected"""
+    with pytest.raises(ConditionError):
+        compile_condition(condition)
+
+
+def test_invalid_condition_rejected_at_registration(engine):
+    """Test definitions with invalid conditions fail to register"""
+    workflow_def = {
+        "id": "unsafe",
+        "steps": [
+            {
+                "id": "decide",
+                "type": StepType.DECISION.value,
+                "next": {"condition": "open('/etc/passwd')", "then": 1}
+            }
+        ]
+    }
+    
+    with pytest.raises(ConditionError):
+        engine.register_definition("unsafe", workflow_def)
+    assert "unsafe" not in engine.definitions
+
+
 async def main():
     """Run tests"""
     pytest.main([__file__, "-v"])
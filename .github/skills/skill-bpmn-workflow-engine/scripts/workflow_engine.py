@@ -3,17 +3,170 @@
 workflow_engine.py - Lightweight BPMN workflow orchestration
 """
 
+import ast
 import json
 import asyncio
-from datetime import datetime
+import operator
+from datetime import datetime, timedelta
 from enum import Enum
+from functools import lru_cache
 from typing import Dict, List, Any, Callable, Coroutine
 from dataclasses import dataclass, field, asdict
 import logging
 
+from workflow_store import InstanceStore, InMemoryInstanceStore
+
 logger = logging.getLogger(__name__)
 
 
+class ConditionError(ValueError):
+    """Condition uses syntax outside the allowed subset"""
+
+
+Condition = Callable[[Dict[str, Any]], bool]
+
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda left, right: left in right,
+    ast.NotIn: lambda left, right: left not in right,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+# JSON-style literals used in definitions ("documentos_completos == true")
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+_MISSING = object()
+
+
+def _compile_node(node: ast.AST) -> Callable[[Dict[str, Any]], Any]:
+    """Compile an expression node into a closure over the context"""
+    if isinstance(node, ast.BoolOp):
+        operands = [_compile_node(v) for v in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda ctx: all(op(ctx) for op in operands)
+        return lambda ctx: any(op(ctx) for op in operands)
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile_node(node.operand)
+        if isinstance(node.op, ast.Not):
+            return lambda ctx: not operand(ctx)
+        if isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+            value = -node.operand.value
+            return lambda ctx: value
+
+    elif isinstance(node, ast.Compare):
+        left = _compile_node(node.left)
+        pairs = []
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _COMPARISONS:
+                break
+            pairs.append((_COMPARISONS[type(op)], _compile_node(comparator)))
+        else:
+            def compare(ctx):
+                current = left(ctx)
+                for compare_op, right in pairs:
+                    value = right(ctx)
+                    if not compare_op(current, value):
+                        return False
+                    current = value
+                return True
+            return compare
+
+    elif isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float, bool, type(None))):
+        value = node.value
+        return lambda ctx: value
+
+    elif isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        if all(isinstance(e, ast.Constant) for e in node.elts):
+            values = tuple(e.value for e in node.elts)
+            return lambda ctx: values
+        items = [_compile_node(e) for e in node.elts]
+        return lambda ctx: [item(ctx) for item in items]
+
+    elif isinstance(node, ast.Name):
+        name = node.id
+        if name in _LITERALS:
+            value = _LITERALS[name]
+            return lambda ctx: value
+        if name == "context":
+            return lambda ctx: ctx
+        return lambda ctx: ctx.get(name)
+
+    elif isinstance(node, ast.Subscript):
+        target = _compile_node(node.value)
+        key = _compile_node(node.slice)
+
+        def subscript(ctx):
+            container = target(ctx)
+            return container.get(key(ctx)) if isinstance(container, dict) else None
+        return subscript
+
+    elif isinstance(node, ast.Attribute):
+        # Dotted access into nested dicts: solicitud.importe
+        target = _compile_node(node.value)
+        attr = node.attr
+
+        def attribute(ctx):
+            container = target(ctx)
+            return container.get(attr) if isinstance(container, dict) else None
+        return attribute
+
+    elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "get"
+          and not node.keywords and 1 <= len(node.args) <= 2):
+        # context.get('amount', 0) / datos.get('x')
+        target = _compile_node(node.func.value)
+        key = _compile_node(node.args[0])
+        default = _compile_node(node.args[1]) if len(node.args) == 2 else (lambda ctx: None)
+
+        def get(ctx):
+            container = target(ctx)
+            value = container.get(key(ctx), _MISSING) if isinstance(container, dict) else _MISSING
+            return default(ctx) if value is _MISSING else value
+        return get
+
+    raise ConditionError(f"Unsupported syntax in condition: {ast.dump(node)[:80]}")
+
+
+def _check_names(tree: ast.AST):
+    for node in ast.walk(tree):
+        name = node.id if isinstance(node, ast.Name) else node.attr if isinstance(node, ast.Attribute) else None
+        if name and name.startswith("_"):
+            raise ConditionError(f"Private names are not allowed in conditions: {name}")
+
+
+@lru_cache(maxsize=1024)
+def compile_condition(condition: str) -> Condition:
+    """
+    Parse a condition once into a predicate over the instance context.
+
+    Only comparisons, and/or/not, literals and context field access
+    (name, a.b, a['b'], context.get('b', default)) are accepted; anything
+    else raises ConditionError, so conditions can't execute code.
+    """
+    if not condition or not condition.strip():
+        return lambda ctx: True
+    try:
+        tree = ast.parse(condition.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ConditionError(f"Invalid condition {condition!r}: {e.msg}") from e
+    _check_names(tree)
+    expression = _compile_node(tree.body)
+
+    def predicate(ctx: Dict[str, Any]) -> bool:
+        try:
+            return bool(expression(ctx))
+        except TypeError:
+            # e.g. None > 5000 when the field is missing
+            return False
+    return predicate
+
+
 class StepType(str, Enum):
     """Step execution types"""
     VALIDACION = "validacion"
@@ -41,17 +194,21 @@ class WorkflowInstance:
     definition_id: str
     context: Dict[str, Any]
     current_step: int = 0
-    status: str = "running"  # running, completed, failed
+    status: str = "running"  # running, waiting, completed, failed
     steps_executed: List[StepResult] = field(default_factory=list)
     started_at: datetime = field(default_factory=datetime.utcnow)
     completed_at: datetime | None = None
+    version: int = 0  # Optimistic lock, bumped by every store save
+    wake_at: datetime | None = None  # When a waiting instance is resumed
 
 
 class WorkflowEngine:
     """Lightweight BPMN workflow engine"""
     
-    def __init__(self):
+    def __init__(self, store: InstanceStore | None = None):
+        self.store = store or InMemoryInstanceStore()
         self.definitions: Dict[str, dict] = {}
+        self.conditions: Dict[str, Dict[int, Condition]] = {}  # definition -> step index -> predicate
         self.handlers: Dict[StepType, Callable] = {
             StepType.VALIDACION: self._handle_validation,
             StepType.EVALUACION: self._handle_evaluation,
@@ -60,11 +217,20 @@ class WorkflowEngine:
             StepType.DECISION: self._handle_decision,
             StepType.ESPERA: self._handle_wait,
         }
-        self.instances: Dict[str, WorkflowInstance] = {}
+        self.instances: Dict[str, WorkflowInstance] = {}  # Local cache; the store is authoritative
+        self._published: set = set()  # Definitions already written to the store
+        self.scheduler: "WorkflowTimerScheduler | None" = None
     
     def register_definition(self, definition_id: str, definition: dict):
-        """Register workflow definition"""
+        """Register workflow definition, compiling its conditions up front"""
+        conditions = {}
+        for index, step in enumerate(definition.get("steps", [])):
+            next_step = step.get("next")
+            if isinstance(next_step, dict):
+                conditions[index] = compile_condition(next_step.get("condition", ""))
         self.definitions[definition_id] = definition
+        self.conditions[definition_id] = conditions
+        self._published.discard(definition_id)
         logger.info(f"Registered workflow definition: {definition_id}")
     
     def register_handler(self, step_type: StepType, handler: Callable):
@@ -82,12 +248,17 @@ class WorkflowEngine:
         if definition_id not in self.definitions:
             raise ValueError(f"Definition not found: {definition_id}")
         
+        if definition_id not in self._published:
+            await self.store.save_definition(definition_id, self.definitions[definition_id])
+            self._published.add(definition_id)
+        
         instance = WorkflowInstance(
             id=workflow_id,
             definition_id=definition_id,
             context=context
         )
         
+        await self.store.create(instance)
         self.instances[workflow_id] = instance
         logger.info(f"Started workflow {workflow_id}")
         
@@ -96,19 +267,50 @@ class WorkflowEngine:
         
         return instance
     
+    async def resume_workflow(self, workflow_id: str) -> WorkflowInstance:
+        """Load an instance from the store and continue it on this worker"""
+        instance = await self.store.load(workflow_id)
+        if instance is None:
+            raise ValueError(f"Workflow not found: {workflow_id}")
+        
+        if instance.definition_id not in self.definitions:
+            definition = await self.store.load_definition(instance.definition_id)
+            if definition is None:
+                raise ValueError(f"Definition not found: {instance.definition_id}")
+            self.register_definition(instance.definition_id, definition)
+            self._published.add(instance.definition_id)
+        
+        self.instances[workflow_id] = instance
+        logger.info(f"Resuming workflow {workflow_id} at step {instance.current_step}")
+        
+        await self._execute_step(instance)
+        
+        return instance
+    
     async def _execute_step(self, instance: WorkflowInstance):
-        """Execute current step"""
+        """Execute steps until the instance completes or fails, saving after each one"""
         
         definition = self.definitions[instance.definition_id]
         steps = definition["steps"]
         
-        if instance.current_step >= len(steps):
-            instance.status = "completed"
-            instance.completed_at = datetime.utcnow()
-            logger.info(f"Workflow {instance.id} completed")
-            return
+        while instance.status == "running":
+            saved = len(instance.steps_executed)
+            
+            if instance.current_step >= len(steps):
+                instance.status = "completed"
+                instance.completed_at = datetime.utcnow()
+                logger.info(f"Workflow {instance.id} completed")
+            else:
+                await self._run_step(instance, steps[instance.current_step])
+            
+            # Raises ConcurrentModificationError if another worker advanced the instance
+            await self.store.save(instance, instance.steps_executed[saved:])
         
-        step = steps[instance.current_step]
+        if instance.status == "waiting" and self.scheduler:
+            self.scheduler.notify(instance.wake_at)
+    
+    async def _run_step(self, instance: WorkflowInstance, step: dict):
+        """Execute current step and move to the next one"""
         step_type = StepType(step["type"])
         
         logger.info(f"Executing step {instance.current_step}: {step['id']}")
@@ -120,7 +322,11 @@ class WorkflowEngine:
             
             result = await handler(step, instance.context)
             result.step_id = step["id"]
-            result.status = "success"
+            
+            if result.status == "waiting":
+                # Suspend; the timer scheduler resumes the instance at the next step
+                instance.status = "waiting"
+                instance.wake_at = result.output.pop("wake_at")
             
             instance.steps_executed.append(result)
             instance.context.update(result.output)
@@ -129,16 +335,13 @@ class WorkflowEngine:
             next_step = step.get("next", instance.current_step + 1)
             
             if isinstance(next_step, dict):  # Conditional transition
-                condition = next_step.get("condition", "")
-                if self._evaluate_condition(condition, instance.context):
+                condition = self.conditions[instance.definition_id][instance.current_step]
+                if condition(instance.context):
                     instance.current_step = next_step["then"]
                 else:
                     instance.current_step = next_step.get("else", instance.current_step + 1)
             else:
                 instance.current_step = next_step
-            
-            # Execute next step recursively
-            await self._execute_step(instance)
         
         except Exception as e:
             logger.error(f"Error in step {step['id']}: {e}")
@@ -215,25 +418,24 @@ class WorkflowEngine:
         return StepResult(step_id="", status="success", output={})
     
     async def _handle_wait(self, step: dict, context: Dict) -> StepResult:
-        """Wait step"""
+        """Wait step (durable: the instance is suspended, not the worker)"""
         duration = step.get("config", {}).get("duration_seconds", 1)
-        await asyncio.sleep(duration)
         
         return StepResult(
             step_id="",
-            status="success",
-            output={"waited_seconds": duration}
+            status="waiting",
+            output={
+                "waited_seconds": duration,
+                "wake_at": datetime.utcnow() + timedelta(seconds=duration)
+            }
         )
     
     @staticmethod
     def _evaluate_condition(condition: str, context: Dict) -> bool:
         """Evaluate conditional expression"""
-        if not condition:
-            return True
-        
         try:
-            return eval(condition, {"__builtins__": {}}, context)
-        except Exception as e:
+            return compile_condition(condition)(context)
+        except ConditionError as e:
             logger.error(f"Error evaluating condition: {e}")
             return False
     
@@ -256,6 +458,70 @@ class WorkflowEngine:
         }
 
 
+class WorkflowTimerScheduler:
+    """
+    Resumes waiting instances when their ESPERA step expires.
+
+    One loop per process: it sleeps until the store's earliest wake_at (or
+    until a new wait on this engine is earlier), then claims due instances
+    in batches and resumes them. Pending waits live in the store, so they
+    survive restarts.
+    """
+    
+    def __init__(self, engine: WorkflowEngine, batch_size: int = 100, max_sleep: float = 60.0):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep  # Bounds the delay for waits scheduled by other workers
+        self._wakeup = asyncio.Event()
+        self._stopped = False
+        self._next_wake: datetime | None = None
+        engine.scheduler = self
+    
+    def notify(self, wake_at: datetime):
+        """Wake the loop if wake_at is earlier than its planned wake-up"""
+        if self._next_wake is None or wake_at < self._next_wake:
+            self._wakeup.set()
+    
+    async def fire_due(self, now: datetime | None = None) -> int:
+        """Resume one batch of due instances"""
+        workflow_ids = await self.engine.store.claim_due(now or datetime.utcnow(), self.batch_size)
+        results = await asyncio.gather(
+            *(self.engine.resume_workflow(workflow_id) for workflow_id in workflow_ids),
+            return_exceptions=True
+        )
+        for workflow_id, result in zip(workflow_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error resuming workflow {workflow_id}: {result}")
+        return len(workflow_ids)
+    
+    async def run(self):
+        """Scheduler loop; runs until stop()"""
+        while not self._stopped:
+            self._next_wake = None
+            self._wakeup.clear()
+            next_wake = None
+            try:
+                if await self.fire_due() >= self.batch_size:
+                    continue
+                next_wake = await self.engine.store.next_wake_at()
+            except Exception as e:
+                logger.error(f"Timer scheduler iteration failed: {e}")
+            
+            now = datetime.utcnow()
+            timeout = self.max_sleep
+            if next_wake is not None:
+                timeout = min(max((next_wake - now).total_seconds(), 0.0), self.max_sleep)
+            self._next_wake = now + timedelta(seconds=timeout)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+
 # Example usage
 if __name__ == "__main__":
     async def main():
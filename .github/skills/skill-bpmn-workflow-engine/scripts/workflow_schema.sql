@@ -0,0 +1,50 @@
+-- Workflow engine persistence (PostgresInstanceStore in workflow_store.py)
+-- Instances are updated with optimistic versioning: every save bumps `version`
+-- and only succeeds if the caller saw the previous one.
+
+-- Workflow Definitions
+CREATE TABLE IF NOT EXISTS workflow_definition (
+    id VARCHAR(100) PRIMARY KEY,
+    definition JSONB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Workflow Instances
+CREATE TABLE IF NOT EXISTS workflow_instance (
+    id VARCHAR(100) PRIMARY KEY,
+    definition_id VARCHAR(100) NOT NULL REFERENCES workflow_definition(id),
+    context JSONB NOT NULL DEFAULT '{}',
+    current_step INT NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',  -- running, waiting, completed, failed
+    version INT NOT NULL DEFAULT 0,
+    started_at TIMESTAMP NOT NULL,
+    completed_at TIMESTAMP,
+    wake_at TIMESTAMP,  -- ESPERA steps: when the timer scheduler resumes the instance
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Lookup by status and step ("which instances are waiting on approval?")
+CREATE INDEX IF NOT EXISTS idx_workflow_instance_status_step
+    ON workflow_instance (status, definition_id, current_step);
+
+-- Only active instances: stays small however many completed instances accumulate
+CREATE INDEX IF NOT EXISTS idx_workflow_instance_active
+    ON workflow_instance (definition_id, current_step)
+    WHERE status IN ('running', 'waiting');
+
+-- Pending waits: the scheduler only ever reads the head of this index
+CREATE INDEX IF NOT EXISTS idx_workflow_instance_wake_at
+    ON workflow_instance (wake_at)
+    WHERE status = 'waiting';
+
+-- Step History (append-only)
+CREATE TABLE IF NOT EXISTS workflow_step_result (
+    instance_id VARCHAR(100) NOT NULL REFERENCES workflow_instance(id) ON DELETE CASCADE,
+    seq INT NOT NULL,
+    step_id VARCHAR(100) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    output JSONB NOT NULL DEFAULT '{}',
+    error TEXT,
+    executed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (instance_id, seq)
+);
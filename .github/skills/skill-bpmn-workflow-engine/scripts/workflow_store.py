@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+workflow_store.py - Persistence for WorkflowEngine instances
+
+InMemoryInstanceStore keeps everything in the process (default, tests).
+PostgresInstanceStore stores instances and step history in Postgres
+(schema in workflow_schema.sql) so any worker can resume an instance.
+"""
+
+import json
+from abc import ABC, abstractmethod
+from copy import deepcopy
+from datetime import datetime
+from typing import Dict, List, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from workflow_engine import WorkflowInstance, StepResult
+
+
+class ConcurrentModificationError(RuntimeError):
+    """Instance was saved by someone else since it was loaded"""
+
+
+class InstanceStore(ABC):
+    """Storage for workflow definitions, instances and step history"""
+
+    @abstractmethod
+    async def save_definition(self, definition_id: str, definition: dict):
+        """Store (or replace) a workflow definition"""
+
+    @abstractmethod
+    async def load_definition(self, definition_id: str) -> dict | None:
+        """Load a workflow definition"""
+
+    @abstractmethod
+    async def create(self, instance: "WorkflowInstance"):
+        """Store a new instance at version 0"""
+
+    @abstractmethod
+    async def save(self, instance: "WorkflowInstance", new_results: List["StepResult"]):
+        """
+        Save instance state and append step results.
+
+        Raises ConcurrentModificationError unless the stored version still
+        equals instance.version; on success instance.version is incremented.
+        """
+
+    @abstractmethod
+    async def load(self, workflow_id: str) -> "WorkflowInstance | None":
+        """Load an instance with its step history"""
+
+    @abstractmethod
+    async def claim_due(self, now: datetime, limit: int) -> List[str]:
+        """
+        Move waiting instances whose wake_at has passed back to running.
+
+        Returns their ids; each instance is claimed by exactly one caller.
+        """
+
+    @abstractmethod
+    async def next_wake_at(self) -> datetime | None:
+        """Earliest wake_at among waiting instances"""
+
+    @abstractmethod
+    async def list_instances(
+        self,
+        status: str,
+        definition_id: str | None = None,
+        current_step: int | None = None,
+        limit: int = 100
+    ) -> List[str]:
+        """Ids of instances in a status (optionally at a definition/step)"""
+
+
+class InMemoryInstanceStore(InstanceStore):
+    """Process-local store"""
+
+    def __init__(self):
+        self.definitions: Dict[str, dict] = {}
+        self.instances: Dict[str, "WorkflowInstance"] = {}
+
+    async def save_definition(self, definition_id: str, definition: dict):
+        self.definitions[definition_id] = deepcopy(definition)
+
+    async def load_definition(self, definition_id: str) -> dict | None:
+        definition = self.definitions.get(definition_id)
+        return deepcopy(definition) if definition is not None else None
+
+    async def create(self, instance: "WorkflowInstance"):
+        if instance.id in self.instances:
+            raise ValueError(f"Workflow already exists: {instance.id}")
+        self.instances[instance.id] = deepcopy(instance)
+
+    async def save(self, instance: "WorkflowInstance", new_results: List["StepResult"]):
+        stored = self.instances.get(instance.id)
+        if stored is None or stored.version != instance.version:
+            raise ConcurrentModificationError(f"Workflow {instance.id} was modified concurrently")
+        instance.version += 1
+        self.instances[instance.id] = deepcopy(instance)
+
+    async def load(self, workflow_id: str) -> "WorkflowInstance | None":
+        instance = self.instances.get(workflow_id)
+        return deepcopy(instance) if instance is not None else None
+
+    async def claim_due(self, now: datetime, limit: int) -> List[str]:
+        due = sorted(
+            (i for i in self.instances.values() if i.status == "waiting" and i.wake_at <= now),
+            key=lambda i: i.wake_at
+        )[:limit]
+        for instance in due:
+            instance.status = "running"
+            instance.wake_at = None
+            instance.version += 1
+        return [i.id for i in due]
+
+    async def next_wake_at(self) -> datetime | None:
+        return min((i.wake_at for i in self.instances.values() if i.status == "waiting"), default=None)
+
+    async def list_instances(
+        self,
+        status: str,
+        definition_id: str | None = None,
+        current_step: int | None = None,
+        limit: int = 100
+    ) -> List[str]:
+        return [
+            i.id for i in self.instances.values()
+            if i.status == status
+            and (definition_id is None or i.definition_id == definition_id)
+            and (current_step is None or i.current_step == current_step)
+        ][:limit]
+
+
+class PostgresInstanceStore(InstanceStore):
+    """Postgres store on an asyncpg pool (asyncpg imported lazily)"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @classmethod
+    async def connect(cls, dsn: str, min_size: int = 2, max_size: int = 10) -> "PostgresInstanceStore":
+        """Create a store with its own connection pool"""
+        import asyncpg
+        return cls(await asyncpg.create_pool(dsn, min_size=min_size, max_size=max_size))
+
+    async def create_schema(self, schema_path: str | None = None):
+        """Apply workflow_schema.sql (idempotent)"""
+        from pathlib import Path
+        path = Path(schema_path) if schema_path else Path(__file__).with_name("workflow_schema.sql")
+        async with self.pool.acquire() as conn:
+            await conn.execute(path.read_text(encoding="utf-8"))
+
+    async def close(self):
+        await self.pool.close()
+
+    async def save_definition(self, definition_id: str, definition: dict):
+        await self.pool.execute(
+            """
+            INSERT INTO workflow_definition (id, definition) VALUES ($1, $2::jsonb)
+            ON CONFLICT (id) DO UPDATE SET definition = EXCLUDED.definition, updated_at = now()
+            """,
+            definition_id, json.dumps(definition)
+        )
+
+    async def load_definition(self, definition_id: str) -> dict | None:
+        raw = await self.pool.fetchval(
+            "SELECT definition FROM workflow_definition WHERE id = $1", definition_id
+        )
+        return json.loads(raw) if raw is not None else None
+
+    async def create(self, instance: "WorkflowInstance"):
+        await self.pool.execute(
+            """
+            INSERT INTO workflow_instance
+                (id, definition_id, context, current_step, status, version, started_at, completed_at, wake_at)
+            VALUES ($1, $2, $3::jsonb, $4, $5, $6, $7, $8, $9)
+            """,
+            instance.id, instance.definition_id, _dumps(instance.context), instance.current_step,
+            instance.status, instance.version, instance.started_at, instance.completed_at, instance.wake_at
+        )
+
+    async def save(self, instance: "WorkflowInstance", new_results: List["StepResult"]):
+        first_seq = len(instance.steps_executed) - len(new_results)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                updated = await conn.fetchval(
+                    """
+                    UPDATE workflow_instance
+                    SET context = $2::jsonb, current_step = $3, status = $4, completed_at = $5,
+                        wake_at = $7, version = version + 1, updated_at = now()
+                    WHERE id = $1 AND version = $6
+                    RETURNING version
+                    """,
+                    instance.id, _dumps(instance.context), instance.current_step, instance.status,
+                    instance.completed_at, instance.version, instance.wake_at
+                )
+                if updated is None:
+                    raise ConcurrentModificationError(f"Workflow {instance.id} was modified concurrently")
+                if new_results:
+                    await conn.executemany(
+                        """
+                        INSERT INTO workflow_step_result
+                            (instance_id, seq, step_id, status, output, error, executed_at)
+                        VALUES ($1, $2, $3, $4, $5::jsonb, $6, $7)
+                        """,
+                        [
+                            (instance.id, first_seq + i, r.step_id, r.status, _dumps(r.output), r.error, r.executed_at)
+                            for i, r in enumerate(new_results)
+                        ]
+                    )
+        instance.version = updated
+
+    async def load(self, workflow_id: str) -> "WorkflowInstance | None":
+        from workflow_engine import WorkflowInstance, StepResult
+
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM workflow_instance WHERE id = $1", workflow_id)
+            if row is None:
+                return None
+            results = await conn.fetch(
+                """
+                SELECT step_id, status, output, error, executed_at
+                FROM workflow_step_result WHERE instance_id = $1 ORDER BY seq
+                """,
+                workflow_id
+            )
+
+        return WorkflowInstance(
+            id=row["id"],
+            definition_id=row["definition_id"],
+            context=json.loads(row["context"]),
+            current_step=row["current_step"],
+            status=row["status"],
+            steps_executed=[
+                StepResult(
+                    step_id=r["step_id"],
+                    status=r["status"],
+                    output=json.loads(r["output"]),
+                    error=r["error"],
+                    executed_at=r["executed_at"]
+                )
+                for r in results
+            ],
+            started_at=row["started_at"],
+            completed_at=row["completed_at"],
+            version=row["version"],
+            wake_at=row["wake_at"]
+        )
+
+    async def claim_due(self, now: datetime, limit: int) -> List[str]:
+        # SKIP LOCKED: concurrent schedulers split the due instances instead of waiting on each other
+        rows = await self.pool.fetch(
+            """
+            UPDATE workflow_instance
+            SET status = 'running', wake_at = NULL, version = version + 1, updated_at = now()
+            WHERE id IN (
+                SELECT id FROM workflow_instance
+                WHERE status = 'waiting' AND wake_at <= $1
+                ORDER BY wake_at
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id
+            """,
+            now, limit
+        )
+        return [r["id"] for r in rows]
+
+    async def next_wake_at(self) -> datetime | None:
+        return await self.pool.fetchval(
+            "SELECT min(wake_at) FROM workflow_instance WHERE status = 'waiting'"
+        )
+
+    async def list_instances(
+        self,
+        status: str,
+        definition_id: str | None = None,
+        current_step: int | None = None,
+        limit: int = 100
+    ) -> List[str]:
+        # Only the filters given, so the planner can use the status/step indexes
+        clauses, args = ["status = $1"], [status]
+        if definition_id is not None:
+            args.append(definition_id)
+            clauses.append(f"definition_id = ${len(args)}")
+        if current_step is not None:
+            args.append(current_step)
+            clauses.append(f"current_step = ${len(args)}")
+        args.append(limit)
+        rows = await self.pool.fetch(
+            f"SELECT id FROM workflow_instance WHERE {' AND '.join(clauses)} LIMIT ${len(args)}",
+            *args
+        )
+        return [r["id"] for r in rows]
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
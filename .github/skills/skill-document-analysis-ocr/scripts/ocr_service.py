@@ -5,12 +5,14 @@ ocr_service.py - OCR document processing and metadata extraction service
 
 import asyncio
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
 import tempfile
 
 import pytesseract
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 import aiofiles
 from PIL import Image
 import ollama
@@ -18,47 +20,157 @@ import ollama
 logger = logging.getLogger(__name__)
 
 
+def _rasterize_page(pdf_path: str, page_num: int, output_folder: str, dpi: int) -> str:
+    """Render a single page to a PNG in `output_folder` and return its path.
+
+    pdftoppm writes the file directly, so the bitmap never sits in this process.
+    """
+    paths = convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        first_page=page_num,
+        last_page=page_num,
+        output_folder=output_folder,
+        fmt="png",
+        paths_only=True,
+    )
+    return paths[0]
+
+
+def _ocr_image(image_path: str, lang: str, delete: bool) -> str:
+    """OCR one image file (runs in a worker process)."""
+    try:
+        with Image.open(image_path) as image:
+            return pytesseract.image_to_string(image, lang=lang).strip()
+    finally:
+        if delete:
+            os.remove(image_path)
+
+
 class OCRService:
     """OCR and document processing service"""
     
-    def __init__(self, ollama_url: str = "http://localhost:11434"):
+    def __init__(
+        self,
+        ollama_url: str = "http://localhost:11434",
+        ocr_workers: Optional[int] = None,
+        max_pages_in_flight: int = 4,
+        dpi: int = 200,
+        lang: str = "spa+eng",  # Spanish + English
+    ):
         self.ollama_url = ollama_url
         self.client = ollama.Client(host=ollama_url)
+        self.ocr_workers = ocr_workers or os.cpu_count() or 1
+        self.max_pages_in_flight = max_pages_in_flight
+        self.dpi = dpi
+        self.lang = lang
+        self._pool: Optional[ProcessPoolExecutor] = None
     
-    async def extract_text_from_pdf(
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Process pool shared by every document this service OCRs."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.ocr_workers)
+        return self._pool
+    
+    def close(self):
+        """Shut down the OCR worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    async def iter_pdf_pages(
         self,
         pdf_path: str,
         start_page: int = 1,
         end_page: Optional[int] = None
-    ) -> Dict[int, str]:
-        """Extract text from PDF pages"""
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """Yield (page number, text) in page order as each page is OCR'd.
+
+        Pages are rasterized one at a time to a temp directory and OCR'd in
+        the process pool; at most ``max_pages_in_flight`` page images exist
+        at once, whatever the page count. Close the generator (e.g. with
+        ``contextlib.aclosing``) when stopping early: pending work is then
+        waited for and the temp directory removed.
+        """
         
         pdf_file = Path(pdf_path)
         if not pdf_file.exists():
             raise FileNotFoundError(f"PDF not found: {pdf_path}")
         
-        try:
-            logger.info(f"Converting PDF to images: {pdf_file.name}")
-            
-            # Convert PDF to images
-            images = convert_from_path(
-                pdf_path,
-                first_page=start_page,
-                last_page=end_page
-            )
+        loop = asyncio.get_running_loop()
+        info = await asyncio.to_thread(pdfinfo_from_path, pdf_path)
+        last_page = min(end_page or info["Pages"], info["Pages"])
+        logger.info(f"Streaming OCR of {pdf_file.name}: pages {start_page}-{last_page}")
+        
+        # A slot is taken before a page is rasterized and freed when its OCR
+        # (which deletes the image) finishes; the queue keeps page order
+        slots = asyncio.Semaphore(self.max_pages_in_flight)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pages_in_flight)
+        in_flight: set = set()
+        
+        def page_done(future: asyncio.Future):
+            in_flight.discard(future)
+            slots.release()
+        
+        with tempfile.TemporaryDirectory(prefix="ocr-") as tmp_dir:
+            async def rasterize():
+                try:
+                    for page_num in range(start_page, last_page + 1):
+                        await slots.acquire()
+                        render = loop.run_in_executor(None, _rasterize_page, pdf_path, page_num, tmp_dir, self.dpi)
+                        try:
+                            image_path = await asyncio.shield(render)
+                        except asyncio.CancelledError:
+                            # The thread cannot be interrupted: wait for it so it does not outlive the temp dir
+                            await asyncio.gather(render, return_exceptions=True)
+                            raise
+                        except Exception:
+                            slots.release()
+                            raise
+                        future = loop.run_in_executor(
+                            self._get_pool(), _ocr_image, image_path, self.lang, True
+                        )
+                        in_flight.add(future)
+                        future.add_done_callback(page_done)
+                        await queue.put((page_num, future))
+                except Exception as e:
+                    await queue.put(e)
+                    return
+                await queue.put(None)
             
-            # Extract text from each image
+            producer = asyncio.create_task(rasterize())
+            try:
+                while (item := await queue.get()) is not None:
+                    if isinstance(item, Exception):
+                        raise item
+                    page_num, future = item
+                    yield page_num, await future
+            finally:
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+                # Let in-flight OCR finish before the temp directory is removed
+                await asyncio.gather(*in_flight, return_exceptions=True)
+    
+    async def extract_text_from_pdf(
+        self,
+        pdf_path: str,
+        start_page: int = 1,
+        end_page: Optional[int] = None
+    ) -> Dict[int, str]:
+        """Extract text from PDF pages"""
+        
+        try:
             text_by_page = {}
-            for page_num, image in enumerate(images, start=start_page):
-                logger.info(f"Extracting text from page {page_num}")
-                
-                text = pytesseract.image_to_string(
-                    image,
-                    lang='spa+eng'  # Spanish + English
-                )
-                text_by_page[page_num] = text.strip()
+            async for page_num, text in self.iter_pdf_pages(pdf_path, start_page, end_page):
+                text_by_page[page_num] = text
             
-            logger.info(f"Extracted text from {len(images)} pages")
+            logger.info(f"Extracted text from {len(text_by_page)} pages")
             return text_by_page
         
         except Exception as e:
@@ -74,17 +186,10 @@ class OCRService:
         
         try:
             logger.info(f"Extracting text from image: {image_file.name}")
-            
-            # Load image
-            image = Image.open(image_file)
-            
-            # Extract text
-            text = pytesseract.image_to_string(
-                image,
-                lang='spa+eng'
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_pool(), _ocr_image, str(image_file), self.lang, False
             )
-            
-            return text.strip()
         
         except Exception as e:
             logger.error(f"Error extracting text from image: {e}")
@@ -143,7 +248,9 @@ Provide response as JSON.""",
         try:
             logger.info(f"Extracting metadata (type: {document_type})")
             
-            response = self.client.generate(
+            # The ollama client is synchronous: keep it off the event loop
+            response = await asyncio.to_thread(
+                self.client.generate,
                 model='mistral',
                 prompt=prompt,
                 stream=False,
@@ -248,9 +355,10 @@ Provide response as JSON.""",
         self,
         directory: str,
         file_pattern: str = "*.pdf",
-        document_type: str = "general"
+        document_type: str = "general",
+        concurrency: int = 4
     ) -> List[Dict[str, Any]]:
-        """Process multiple documents in a directory"""
+        """Process the documents in a directory, `concurrency` files at a time"""
         
         doc_dir = Path(directory)
         if not doc_dir.exists():
@@ -259,30 +367,31 @@ Provide response as JSON.""",
         files = list(doc_dir.glob(file_pattern))
         logger.info(f"Found {len(files)} files to process")
         
-        results = []
-        for file_path in files:
-            try:
-                result = await self.process_document(str(file_path), document_type)
-                results.append(result)
-            except Exception as e:
-                logger.error(f"Failed to process {file_path}: {e}")
-                results.append({
-                    "file_name": file_path.name,
-                    "error": str(e)
-                })
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def process(file_path: Path) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await self.process_document(str(file_path), document_type)
+                except Exception as e:
+                    logger.error(f"Failed to process {file_path}: {e}")
+                    return {
+                        "file_name": file_path.name,
+                        "error": str(e)
+                    }
         
-        return results
+        # Pages of all files share the process pool; results keep file order
+        return list(await asyncio.gather(*(process(f) for f in files)))
 
 
 # Example usage
 async def main():
-    service = OCRService()
-    
-    # Process single document
-    result = await service.process_document(
-        "./sample.pdf",
-        document_type="invoice"
-    )
+    with OCRService() as service:
+        # Process single document
+        result = await service.process_document(
+            "./sample.pdf",
+            document_type="invoice"
+        )
     
     print(f"Document: {result['file_name']}")
     print(f"Quality: {result['quality']['score']}%")
@@ -0,0 +1,128 @@
+"""Partition trazabilidad by month on timestamp
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(year: int, month: int, months: int):
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+
+def _create_month_partitions(first_year: int, first_month: int, last_year: int, last_month: int):
+    year, month = first_year, first_month
+    while (year, month) <= (last_year, last_month):
+        next_year, next_month = _add_months(year, month, 1)
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS trazabilidad_p{year:04d}{month:02d} "
+            f"PARTITION OF trazabilidad "
+            f"FOR VALUES FROM ('{year:04d}-{month:02d}-01') TO ('{next_year:04d}-{next_month:02d}-01')"
+        )
+        year, month = next_year, next_month
+
+
+def upgrade() -> None:
+    """Replace the trazabilidad heap with a table partitioned by month."""
+    bind = op.get_bind()
+    columns = {c["name"] for c in sa.inspect(bind).get_columns("trazabilidad")}
+    # 002 created usuario_id/datos_nuevos while the model (and create_all) uses user_id/metadata_json
+    user_column = "usuario_id" if "usuario_id" in columns else "user_id"
+    metadata_expr = "datos_nuevos::text" if "datos_nuevos" in columns else "metadata_json"
+    if "datos_anteriores" in columns and "datos_nuevos" in columns:
+        # Keep 002's previous values too, under "datos_anteriores" (wrapping datos_nuevos if it is not an object)
+        metadata_expr = """
+            CASE
+                WHEN datos_anteriores IS NULL THEN datos_nuevos::text
+                WHEN jsonb_typeof(datos_nuevos::jsonb) = 'object'
+                    THEN (datos_nuevos::jsonb || jsonb_build_object('datos_anteriores', datos_anteriores::jsonb))::text
+                WHEN datos_nuevos IS NULL THEN jsonb_build_object('datos_anteriores', datos_anteriores::jsonb)::text
+                ELSE jsonb_build_object('datos_nuevos', datos_nuevos::jsonb,
+                                        'datos_anteriores', datos_anteriores::jsonb)::text
+            END"""
+
+    op.execute("ALTER TABLE trazabilidad RENAME TO trazabilidad_legacy")
+    op.execute("ALTER SEQUENCE IF EXISTS trazabilidad_id_seq RENAME TO trazabilidad_legacy_id_seq")
+
+    op.execute("""
+        CREATE TABLE trazabilidad (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            expediente_id INTEGER NOT NULL REFERENCES expedientes(id) ON DELETE CASCADE,
+            user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+            accion VARCHAR(255) NOT NULL,
+            descripcion TEXT,
+            metadata_json TEXT,
+            timestamp TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    # Matches the hot query: WHERE expediente_id = ? ORDER BY timestamp DESC
+    op.execute(
+        "CREATE INDEX ix_trazabilidad_expediente_timestamp "
+        "ON trazabilidad (expediente_id, timestamp DESC)"
+    )
+    op.create_index('ix_trazabilidad_user_id', 'trazabilidad', ['user_id'], unique=False)
+    # Catches rows outside any monthly partition; the maintenance command moves them out
+    op.execute("CREATE TABLE trazabilidad_default PARTITION OF trazabilidad DEFAULT")
+
+    row = bind.execute(sa.text(
+        "SELECT COALESCE(MIN(timestamp), now()), now() FROM trazabilidad_legacy"
+    )).one()
+    first, current = row[0], row[1]
+    last_year, last_month = _add_months(current.year, current.month, MONTHS_AHEAD)
+    _create_month_partitions(first.year, first.month, last_year, last_month)
+
+    op.execute(f"""
+        INSERT INTO trazabilidad (id, expediente_id, user_id, accion, descripcion, metadata_json, timestamp)
+        SELECT id, expediente_id, {user_column}, accion, descripcion, {metadata_expr},
+               COALESCE(timestamp, now())
+        FROM trazabilidad_legacy
+    """)
+    op.execute(
+        "SELECT setval(pg_get_serial_sequence('trazabilidad', 'id'), "
+        "COALESCE((SELECT MAX(id) FROM trazabilidad), 0) + 1, false)"
+    )
+    op.execute("DROP TABLE trazabilidad_legacy")
+
+
+def downgrade() -> None:
+    """Fold all partitions back into a single trazabilidad table."""
+    op.execute("ALTER TABLE trazabilidad RENAME TO trazabilidad_partitioned")
+    op.create_table(
+        'trazabilidad',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('expediente_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('accion', sa.String(length=255), nullable=False),
+        sa.Column('descripcion', sa.Text(), nullable=True),
+        sa.Column('metadata_json', sa.Text(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['expediente_id'], ['expedientes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("""
+        INSERT INTO trazabilidad (id, expediente_id, user_id, accion, descripcion, metadata_json, timestamp)
+        SELECT id, expediente_id, user_id, accion, descripcion, metadata_json, timestamp
+        FROM trazabilidad_partitioned
+    """)
+    op.execute(
+        "SELECT setval(pg_get_serial_sequence('trazabilidad', 'id'), "
+        "COALESCE((SELECT MAX(id) FROM trazabilidad), 0) + 1, false)"
+    )
+    op.execute("DROP TABLE trazabilidad_partitioned CASCADE")
+    op.create_index(op.f('ix_trazabilidad_expediente_id'), 'trazabilidad', ['expediente_id'], unique=False)
+    op.create_index(op.f('ix_trazabilidad_user_id'), 'trazabilidad', ['user_id'], unique=False)
+    op.create_index(op.f('ix_trazabilidad_timestamp'), 'trazabilidad', ['timestamp'], unique=False)
@@ -0,0 +1,42 @@
+"""Add tamper-evident hash chain to trazabilidad
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 01:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add chain columns to trazabilidad and the per-expediente chain head table."""
+    # Added on the partitioned parent, so every partition gets them
+    op.add_column('trazabilidad', sa.Column('secuencia', sa.Integer(), nullable=True))
+    op.add_column('trazabilidad', sa.Column('hash_anterior', sa.String(length=64), nullable=True))
+    op.add_column('trazabilidad', sa.Column('hash', sa.String(length=64), nullable=True))
+
+    op.create_table(
+        'trazabilidad_cadena',
+        sa.Column('expediente_id', sa.Integer(), nullable=False),
+        sa.Column('ultimo_hash', sa.String(length=64), nullable=False),
+        sa.Column('ultima_secuencia', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['expediente_id'], ['expedientes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('expediente_id')
+    )
+    # Existing rows stay unsealed until `python -m app.services.audit_chain seal` runs
+
+
+def downgrade() -> None:
+    """Remove the hash chain."""
+    op.drop_table('trazabilidad_cadena')
+    op.drop_column('trazabilidad', 'hash')
+    op.drop_column('trazabilidad', 'hash_anterior')
+    op.drop_column('trazabilidad', 'secuencia')
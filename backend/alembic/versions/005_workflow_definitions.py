@@ -0,0 +1,55 @@
+"""Add declarative workflow definitions
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 02:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create definiciones_flujo and link expedientes and pasos to it."""
+    op.create_table(
+        'definiciones_flujo',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('codigo', sa.String(length=100), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('nombre', sa.String(length=255), nullable=False),
+        sa.Column('definicion', sa.JSON(), nullable=False),
+        sa.Column('activa', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('codigo', 'version', name='uq_definiciones_flujo_codigo_version')
+    )
+    op.create_index(op.f('ix_definiciones_flujo_id'), 'definiciones_flujo', ['id'], unique=False)
+    op.create_index(op.f('ix_definiciones_flujo_codigo'), 'definiciones_flujo', ['codigo'], unique=False)
+
+    op.add_column('expedientes', sa.Column('definicion_flujo_id', sa.Integer(), nullable=True))
+    op.add_column('expedientes', sa.Column('estado_flujo', sa.JSON(), nullable=True))
+    op.create_foreign_key(
+        'fk_expedientes_definicion_flujo_id', 'expedientes', 'definiciones_flujo',
+        ['definicion_flujo_id'], ['id']
+    )
+    op.create_index(op.f('ix_expedientes_definicion_flujo_id'), 'expedientes', ['definicion_flujo_id'], unique=False)
+
+    op.add_column('pasos_tramitacion', sa.Column('nodo_id', sa.String(length=100), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop workflow definitions."""
+    op.drop_column('pasos_tramitacion', 'nodo_id')
+    op.drop_index(op.f('ix_expedientes_definicion_flujo_id'), table_name='expedientes')
+    op.drop_constraint('fk_expedientes_definicion_flujo_id', 'expedientes', type_='foreignkey')
+    op.drop_column('expedientes', 'estado_flujo')
+    op.drop_column('expedientes', 'definicion_flujo_id')
+    op.drop_index(op.f('ix_definiciones_flujo_codigo'), table_name='definiciones_flujo')
+    op.drop_index(op.f('ix_definiciones_flujo_id'), table_name='definiciones_flujo')
+    op.drop_table('definiciones_flujo')
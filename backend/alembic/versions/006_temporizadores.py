@@ -0,0 +1,49 @@
+"""Add durable timers and paso deadlines
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18 03:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create temporizadores and add pasos_tramitacion.fecha_limite."""
+    op.create_table(
+        'temporizadores',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('expediente_id', sa.Integer(), nullable=False),
+        sa.Column('paso_id', sa.Integer(), nullable=True),
+        sa.Column('due_at', sa.DateTime(), nullable=False),
+        sa.Column('fired_at', sa.DateTime(), nullable=True),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['expediente_id'], ['expedientes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['paso_id'], ['pasos_tramitacion.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_temporizadores_paso_id'), 'temporizadores', ['paso_id'], unique=False)
+    # Pending timers only: fired rows drop out of the index the scheduler probes
+    op.create_index(
+        'ix_temporizadores_pendientes_due_at', 'temporizadores', ['due_at'], unique=False,
+        postgresql_where=sa.text('fired_at IS NULL')
+    )
+
+    op.add_column('pasos_tramitacion', sa.Column('fecha_limite', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop timers and paso deadlines."""
+    op.drop_column('pasos_tramitacion', 'fecha_limite')
+    op.drop_index('ix_temporizadores_pendientes_due_at', table_name='temporizadores')
+    op.drop_index(op.f('ix_temporizadores_paso_id'), table_name='temporizadores')
+    op.drop_table('temporizadores')
@@ -0,0 +1,40 @@
+"""Add bulk operation jobs
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 04:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create operaciones_masivas."""
+    op.create_table(
+        'operaciones_masivas',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('operacion', sa.String(length=30), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('parametros', sa.JSON(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('procesados', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('afectados', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Drop operaciones_masivas."""
+    op.drop_table('operaciones_masivas')
@@ -0,0 +1,26 @@
+"""Add documentos.updated_at for ETags
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 05:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add documentos.updated_at, backfilled from the latest known change."""
+    op.add_column('documentos', sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True))
+    op.execute("UPDATE documentos SET updated_at = COALESCE(fecha_firma, fecha_carga, updated_at)")
+
+
+def downgrade() -> None:
+    """Drop documentos.updated_at."""
+    op.drop_column('documentos', 'updated_at')
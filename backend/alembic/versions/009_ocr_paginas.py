@@ -0,0 +1,31 @@
+"""Add the per-page OCR cache
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 06:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create ocr_paginas."""
+    op.create_table(
+        'ocr_paginas',
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('texto', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('hash')
+    )
+
+
+def downgrade() -> None:
+    """Drop ocr_paginas."""
+    op.drop_table('ocr_paginas')
@@ -0,0 +1,37 @@
+"""Add the LLM extraction cache
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create llm_extracciones."""
+    op.create_table(
+        'llm_extracciones',
+        sa.Column('clave', sa.String(length=64), nullable=False),
+        sa.Column('modelo', sa.String(length=100), nullable=False),
+        sa.Column('prompt_version', sa.String(length=20), nullable=False),
+        sa.Column('metadatos', sa.JSON(), nullable=False),
+        sa.Column('hits', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('clave')
+    )
+    op.create_index(op.f('ix_llm_extracciones_last_used_at'), 'llm_extracciones', ['last_used_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop llm_extracciones."""
+    op.drop_index(op.f('ix_llm_extracciones_last_used_at'), table_name='llm_extracciones')
+    op.drop_table('llm_extracciones')
@@ -0,0 +1,37 @@
+"""Add typed IA extraction columns to documentos
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18 08:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add tipo_extraido, fecha_documento, emisor, receptor and importe to documentos."""
+    op.add_column('documentos', sa.Column('tipo_extraido', sa.String(length=50), nullable=True))
+    op.add_column('documentos', sa.Column('fecha_documento', sa.Date(), nullable=True))
+    op.add_column('documentos', sa.Column('emisor', sa.String(length=255), nullable=True))
+    op.add_column('documentos', sa.Column('receptor', sa.String(length=255), nullable=True))
+    op.add_column('documentos', sa.Column('importe', sa.Numeric(precision=14, scale=2), nullable=True))
+    op.create_index(op.f('ix_documentos_tipo_extraido'), 'documentos', ['tipo_extraido'], unique=False)
+    op.create_index(op.f('ix_documentos_fecha_documento'), 'documentos', ['fecha_documento'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop the typed IA extraction columns."""
+    op.drop_index(op.f('ix_documentos_fecha_documento'), table_name='documentos')
+    op.drop_index(op.f('ix_documentos_tipo_extraido'), table_name='documentos')
+    op.drop_column('documentos', 'importe')
+    op.drop_column('documentos', 'receptor')
+    op.drop_column('documentos', 'emisor')
+    op.drop_column('documentos', 'fecha_documento')
+    op.drop_column('documentos', 'tipo_extraido')
@@ -0,0 +1,72 @@
+"""Store documentos.metadatos_extraidos as JSONB with GIN and expression indexes
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Convert metadatos_extraidos to JSONB, index it and backfill the typed columns."""
+    # Rows that are not a JSON object (truncated at 2000 characters, or an array or scalar the
+    # model returned) are kept as raw_response, so the column always holds objects
+    op.execute("""
+        CREATE FUNCTION pg_temp.try_jsonb(value text) RETURNS jsonb AS $$
+        DECLARE
+            parsed jsonb;
+        BEGIN
+            parsed := value::jsonb;
+            IF jsonb_typeof(parsed) <> 'object' THEN
+                RETURN jsonb_build_object('raw_response', value);
+            END IF;
+            RETURN parsed;
+        EXCEPTION WHEN others THEN
+            RETURN jsonb_build_object('raw_response', value);
+        END
+        $$ LANGUAGE plpgsql IMMUTABLE
+    """)
+    op.alter_column('documentos', 'metadatos_extraidos',
+                    existing_type=sa.Text(),
+                    type_=postgresql.JSONB(),
+                    existing_nullable=True,
+                    postgresql_using='pg_temp.try_jsonb(metadatos_extraidos)')
+
+    op.create_index('ix_documentos_metadatos_extraidos', 'documentos', ['metadatos_extraidos'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'metadatos_extraidos': 'jsonb_path_ops'})
+    op.create_index('ix_documentos_emisor_lower', 'documentos', [sa.text('lower(emisor) text_pattern_ops')],
+                    unique=False)
+    op.create_index('ix_documentos_nif_emisor', 'documentos',
+                    [sa.text("(CAST(metadatos_extraidos ->> 'nif_emisor' AS VARCHAR))")], unique=False)
+
+    # Documents analyzed before the typed columns existed
+    op.execute("""
+        UPDATE documentos SET
+            tipo_extraido = left(metadatos_extraidos ->> 'tipo_documento', 50),
+            emisor = left(metadatos_extraidos ->> 'emisor', 255),
+            receptor = left(metadatos_extraidos ->> 'receptor', 255),
+            importe = CASE WHEN metadatos_extraidos ->> 'monto' ~ '^[0-9]{1,12}(\\.[0-9]+)?$'
+                           THEN round((metadatos_extraidos ->> 'monto')::numeric, 2) END
+        WHERE tipo_extraido IS NULL AND metadatos_extraidos ? 'tipo_documento'
+    """)
+
+
+def downgrade() -> None:
+    """Convert metadatos_extraidos back to text."""
+    op.drop_index('ix_documentos_nif_emisor', table_name='documentos')
+    op.drop_index('ix_documentos_emisor_lower', table_name='documentos')
+    op.drop_index('ix_documentos_metadatos_extraidos', table_name='documentos')
+    op.alter_column('documentos', 'metadatos_extraidos',
+                    existing_type=postgresql.JSONB(),
+                    type_=sa.Text(),
+                    existing_nullable=True,
+                    postgresql_using='metadatos_extraidos::text')
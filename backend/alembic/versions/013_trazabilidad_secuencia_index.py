@@ -0,0 +1,26 @@
+"""Index trazabilidad by expediente and chain position
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create ix_trazabilidad_expediente_secuencia (chain verification reads chains in this order)."""
+    op.create_index('ix_trazabilidad_expediente_secuencia', 'trazabilidad', ['expediente_id', 'secuencia'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    """Drop ix_trazabilidad_expediente_secuencia."""
+    op.drop_index('ix_trazabilidad_expediente_secuencia', table_name='trazabilidad')
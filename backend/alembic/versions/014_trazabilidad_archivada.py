@@ -0,0 +1,34 @@
+"""Record the chain entries removed by archiving trazabilidad partitions
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create trazabilidad_archivada: last archived chain entry per partition and expediente."""
+    op.create_table(
+        'trazabilidad_archivada',
+        sa.Column('particion', sa.String(length=64), nullable=False),
+        sa.Column('expediente_id', sa.Integer(), nullable=False),
+        sa.Column('secuencia', sa.Integer(), nullable=False),
+        sa.Column('hash', sa.String(length=64), nullable=False),
+        sa.Column('archivado_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['expediente_id'], ['expedientes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('particion', 'expediente_id')
+    )
+
+
+def downgrade() -> None:
+    """Drop trazabilidad_archivada."""
+    op.drop_table('trazabilidad_archivada')
@@ -0,0 +1,25 @@
+"""Record per-expediente failures of bulk operations
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add operaciones_masivas.errores."""
+    op.add_column('operaciones_masivas', sa.Column('errores', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop operaciones_masivas.errores."""
+    op.drop_column('operaciones_masivas', 'errores')
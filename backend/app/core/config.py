@@ -22,6 +22,34 @@ class Settings:
     # Ollama
     OLLAMA_HOST: str = os.getenv("OLLAMA_HOST", "http://ollama:11434")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "llama2")
+    OLLAMA_EMBEDDING_MODEL: str = os.getenv("OLLAMA_EMBEDDING_MODEL", os.getenv("OLLAMA_MODEL", "llama2"))
+    # How long Ollama keeps a model loaded after a call, by operation (Ollama durations: 30s, 10m, 1h)
+    OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "5m")
+    OLLAMA_KEEP_ALIVE_BY_OPERATION: str = os.getenv("OLLAMA_KEEP_ALIVE_BY_OPERATION", "rag_answer=30m,embedding=30m")
+    # Load the models at startup and keep them resident during working hours (empty hours: warm-up only)
+    OLLAMA_WARMUP_ON_STARTUP: bool = os.getenv("OLLAMA_WARMUP_ON_STARTUP", "true").lower() == "true"
+    OLLAMA_KEEP_WARM_HOURS: str = os.getenv("OLLAMA_KEEP_WARM_HOURS", "08:00-15:00")
+    OLLAMA_KEEP_WARM_DAYS: str = os.getenv("OLLAMA_KEEP_WARM_DAYS", "1-5")  # ISO weekdays, Monday = 1
+    OLLAMA_KEEP_WARM_TIMEZONE: str = os.getenv("OLLAMA_KEEP_WARM_TIMEZONE", "Europe/Madrid")  # Of hours and days
+    OLLAMA_KEEP_WARM_INTERVAL_SECONDS: float = float(os.getenv("OLLAMA_KEEP_WARM_INTERVAL_SECONDS", "240"))
+    # Concurrent calls per model, or per "model:operation" (e.g. "llama2=2,llama2:embedding=4")
+    LLM_CONCURRENCY: str = os.getenv("LLM_CONCURRENCY", "")
+    LLM_DEFAULT_CONCURRENCY: int = int(os.getenv("LLM_DEFAULT_CONCURRENCY", "2"))
+    # Longest wait for a slot before a call is dropped, by priority class
+    LLM_INTERACTIVE_MAX_WAIT_SECONDS: float = float(os.getenv("LLM_INTERACTIVE_MAX_WAIT_SECONDS", "30"))
+    LLM_BACKGROUND_MAX_WAIT_SECONDS: float = float(os.getenv("LLM_BACKGROUND_MAX_WAIT_SECONDS", "600"))
+    # AIMD: limits above become maxima; a call slower than tolerance x fastest latency halves the limit
+    LLM_ADAPTIVE_CONCURRENCY: bool = os.getenv("LLM_ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+    LLM_LATENCY_TOLERANCE: float = float(os.getenv("LLM_LATENCY_TOLERANCE", "2.0"))
+    # Circuit breaker: fail fast after N consecutive failures, probe again after the reset time
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    LLM_CIRCUIT_RESET_SECONDS: float = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+    # Extraction results cached by (text hash, model, prompt version)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_AGE_DAYS: int = int(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "180"))  # Since last use
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+    # Size of the document excerpt sent for metadata extraction (~4 characters per token)
+    LLM_EXCERPT_MAX_TOKENS: int = int(os.getenv("LLM_EXCERPT_MAX_TOKENS", "1000"))
 
     # JWT
     SECRET_KEY: str = os.getenv("SECRET_KEY", "")
@@ -36,6 +64,48 @@ class Settings:
     PROJECT_NAME: str = os.getenv("PROJECT_NAME", "Olympus Smart Gov")
     PROJECT_VERSION: str = os.getenv("PROJECT_VERSION", "1.0.0")
 
+    # Audit trail
+    AUDIT_ASYNC_ENABLED: bool = os.getenv("AUDIT_ASYNC_ENABLED", "true").lower() == "true"
+    AUDIT_QUEUE_MAX_SIZE: int = int(os.getenv("AUDIT_QUEUE_MAX_SIZE", "10000"))
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    AUDIT_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+    AUDIT_PARTITION_MONTHS_AHEAD: int = int(os.getenv("AUDIT_PARTITION_MONTHS_AHEAD", "3"))
+    AUDIT_RETENTION_MONTHS: int = int(os.getenv("AUDIT_RETENTION_MONTHS", "24"))
+    AUDIT_ARCHIVE_DIR: str = os.getenv("AUDIT_ARCHIVE_DIR", "/app/archive/trazabilidad")
+
+    # Timers (deadlines)
+    TIMERS_ENABLED: bool = os.getenv("TIMERS_ENABLED", "true").lower() == "true"
+    TIMER_BATCH_SIZE: int = int(os.getenv("TIMER_BATCH_SIZE", "500"))
+    TIMER_MAX_SLEEP_SECONDS: float = float(os.getenv("TIMER_MAX_SLEEP_SECONDS", "60"))
+
+    # Bulk operations
+    BULK_CHUNK_SIZE: int = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+    # HTTP caching (per-process list cache; 0 disables it, ETags stay on)
+    RESPONSE_CACHE_TTL_SECONDS: float = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "5"))
+
+    # Health checks (probes run in the background; endpoints return the last snapshot)
+    HEALTH_CHECK_INTERVAL_SECONDS: float = float(os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "10"))
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "2"))
+    REDIS_URL: str = os.getenv("REDIS_URL", "")  # Probed only when set
+
+    # Tracing (OpenTelemetry): none, otlp (OTEL_EXPORTER_OTLP_ENDPOINT) or file
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "none")
+    TRACING_FILE_PATH: str = os.getenv("TRACING_FILE_PATH", "/app/traces/spans.jsonl")
+    TRACING_SERVICE_NAME: str = os.getenv("TRACING_SERVICE_NAME", "olympus-backend")
+    TRACING_SAMPLE_RATIO: float = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+
+    # OCR fallback for pages without a text layer and image uploads
+    OCR_ENABLED: bool = os.getenv("OCR_ENABLED", "true").lower() == "true"
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", "2"))  # Worker processes (0 = one per CPU)
+    OCR_LANG: str = os.getenv("OCR_LANG", "spa+eng")
+    OCR_DPI: int = int(os.getenv("OCR_DPI", "200"))
+    OCR_MIN_TEXT_CHARS: int = int(os.getenv("OCR_MIN_TEXT_CHARS", "20"))  # Below this a page scores 0
+    # Pages scoring below this (0-1) are re-OCR'd and left out of LLM extraction
+    OCR_MIN_QUALITY_SCORE: float = float(os.getenv("OCR_MIN_QUALITY_SCORE", "0.35"))
+    # Installed dictionaries added to the bundled wordlists (comma-separated)
+    OCR_WORDLIST_PATH: str = os.getenv("OCR_WORDLIST_PATH", "/usr/share/dict/spanish,/usr/share/dict/american-english")
+
     # App
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
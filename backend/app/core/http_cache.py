@@ -0,0 +1,178 @@
+"""Conditional GET (ETag / If-None-Match) and a short-TTL response cache.
+
+Detail endpoints derive a weak ETag from row timestamps fetched with one
+small indexed query, and answer ``304 Not Modified`` before loading or
+serializing anything when the client already has that version.
+
+List endpoints can keep their serialized body in :data:`response_cache`.
+Entries are tagged with the tables they were built from and are dropped
+when a session commits changes to any of those tables (ORM flushes and
+ORM-enabled UPDATE/DELETE statements are both tracked). The cache is per
+process, so other workers may serve an entry for at most the TTL.
+"""
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .serialization import dumps
+
+_CHANGED_TABLES_KEY = "changed_tables"
+
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag over the given version components."""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when the request's If-None-Match covers `etag` (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
+def conditional_response(request: Request, etag: str) -> Optional[Response]:
+    """The 304 response if the client's copy is current, else None."""
+    return not_modified(etag) if etag_matches(request, etag) else None
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    # Clients must revalidate, which is now a cheap 304
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+class ResponseCache:
+    """Thread-safe TTL cache of serialized list responses, invalidated by table."""
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, FrozenSet[str], bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """(body, etag) if a fresh entry exists."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[2], entry[3]
+
+    def set(self, key: str, tables: Iterable[str], body: bytes, etag: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict()
+            self._entries[key] = (time.monotonic() + self.ttl, frozenset(tables), body, etag)
+
+    def invalidate(self, tables: Iterable[str]):
+        """Drops every entry built from any of `tables`."""
+        tables = set(tables)
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[1] & tables]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [k for k, entry in self._entries.items() if entry[0] < now]
+        for key in expired:
+            del self._entries[key]
+        if len(self._entries) >= self.max_entries:
+            # Still full: drop the entry closest to expiry
+            del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+
+
+response_cache = ResponseCache(ttl=settings.RESPONSE_CACHE_TTL_SECONDS)
+
+
+def cached_json_response(
+    request: Request,
+    tables: Iterable[str],
+    build: Callable[[], Any],
+) -> Response:
+    """
+    Serves a list endpoint from the cache, building and storing it on a miss.
+
+    `build` returns JSON-ready data (see app.core.serialization); the key is
+    the request path and query string.
+    """
+    key = f"{request.url.path}?{request.url.query}"
+    cached = response_cache.get(key)
+    if cached is None:
+        body = dumps(build())
+        etag = make_etag(hashlib.sha1(body).hexdigest())
+        response_cache.set(key, tables, body, etag)
+    else:
+        body, etag = cached
+
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response = Response(content=body, media_type="application/json")
+    set_etag(response, etag)
+    return response
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_tables(session: Session, flush_context):
+    changed = session.info.setdefault(_CHANGED_TABLES_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            changed.add(table)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_statements(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            orm_execute_state.session.info.setdefault(_CHANGED_TABLES_KEY, set()).add(mapper.local_table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_cached_responses(session: Session):
+    changed = session.info.pop(_CHANGED_TABLES_KEY, None)
+    if changed:
+        response_cache.invalidate(changed)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changed_tables(session: Session, previous_transaction):
+    session.info.pop(_CHANGED_TABLES_KEY, None)
@@ -0,0 +1,186 @@
+"""Prometheus metrics for the backend, exposed at ``GET /metrics``.
+
+- HTTP: per-route latency histogram (route template, not the raw path, so
+  label cardinality stays bounded) and in-flight requests.
+- Database: connection pool gauges read from ``engine.pool`` at scrape time,
+  latency of every SQL statement, and queries/SQL time per request, collected
+  with SQLAlchemy cursor events.
+- Ollama: call latency and generation speed (tokens/s) per operation, and
+  time spent waiting in the LLM scheduler's priority queues.
+- Document pipeline: duration of each processing stage.
+- Background queues register their depth as gauges (see ``audit_writer``).
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+
+from .database import engine
+from .tracing import span
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "olympus_http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge("olympus_http_requests_in_progress", "HTTP requests being served")
+
+DB_QUERY_DURATION = Histogram(
+    "olympus_db_query_duration_seconds", "Latency of individual SQL statements",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "olympus_db_queries_per_request", "SQL statements executed per HTTP request",
+    ["route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "olympus_db_seconds_per_request", "Time spent in SQL per HTTP request",
+    ["route"], buckets=_LATENCY_BUCKETS,
+)
+
+OLLAMA_REQUEST_DURATION = Histogram(
+    "olympus_ollama_request_duration_seconds", "Ollama call latency by operation",
+    ["operation", "status"], buckets=_LLM_BUCKETS,
+)
+OLLAMA_TOKENS_PER_SECOND = Histogram(
+    "olympus_ollama_tokens_per_second", "Ollama generation speed by operation",
+    ["operation"], buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 200),
+)
+OLLAMA_TOKENS = Counter("olympus_ollama_tokens_total", "Tokens generated by Ollama", ["operation"])
+
+LLM_QUEUE_WAIT = Histogram(
+    "olympus_llm_queue_wait_seconds", "Time waiting for an Ollama slot by operation and priority",
+    ["operation", "priority"], buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+LLM_QUEUE_DEPTH = Gauge("olympus_llm_queue_depth", "Calls waiting for an Ollama slot", ["priority"])
+LLM_QUEUE_REJECTED = Counter(
+    "olympus_llm_queue_rejected_total", "Calls not sent to Ollama (deadline passed or circuit open)",
+    ["operation", "priority", "reason"],
+)
+LLM_CACHE_REQUESTS = Counter(
+    "olympus_llm_extraction_cache_total", "Metadata extraction cache lookups (hit rate = hit / total)", ["result"],
+)
+LLM_EXTRACTIONS = Counter(
+    "olympus_llm_extractions_total", "Metadata extractions by outcome (valid, repaired, invalid)", ["result"],
+)
+LLM_CONCURRENCY_LIMIT = Gauge("olympus_llm_concurrency_limit", "Current adaptive concurrency limit", ["lane"])
+LLM_CIRCUIT_STATE = Gauge("olympus_llm_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["name"])
+
+PIPELINE_STAGE_DURATION = Histogram(
+    "olympus_document_pipeline_stage_seconds", "Document processing time by stage",
+    ["stage"], buckets=_LLM_BUCKETS,
+)
+
+AUDIT_QUEUE_DEPTH = Gauge("olympus_audit_queue_depth", "Audit events waiting for the background writer")
+
+
+class PoolCollector:
+    """Connection pool saturation, read from the engine's QueuePool on every scrape."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def collect(self):
+        pool = self.pool
+        for name, doc, value in (
+            ("olympus_db_pool_size", "Configured pool size", pool.size()),
+            ("olympus_db_pool_checked_out", "Connections in use", pool.checkedout()),
+            ("olympus_db_pool_checked_in", "Idle connections in the pool", pool.checkedin()),
+            # Negative until the pool is full, then the number of overflow connections open
+            ("olympus_db_pool_overflow", "Overflow connections beyond pool_size", pool.overflow()),
+        ):
+            yield GaugeMetricFamily(name, doc, value=value)
+
+
+if hasattr(engine.pool, "checkedout"):
+    REGISTRY.register(PoolCollector(engine.pool))
+
+
+# [statement count, SQL seconds] of the request being served, set by the middleware
+_request_sql: ContextVar[Optional[list]] = ContextVar("request_sql", default=None)
+
+
+# The start time lives on the statement's execution context, so a failed statement leaves nothing behind
+@event.listens_for(engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_start", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    DB_QUERY_DURATION.observe(elapsed)
+    stats = _request_sql.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL usage per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = _request_sql.set(stats)
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            _request_sql.reset(token)
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_DURATION.labels(scope["method"], route, str(status["code"])).observe(elapsed)
+            DB_QUERIES_PER_REQUEST.labels(route).observe(stats[0])
+            DB_TIME_PER_REQUEST.labels(route).observe(stats[1])
+
+
+def record_ollama_call(operation: str, seconds: float, status: str, payload: Optional[Dict[str, Any]] = None):
+    """Records one Ollama call; `payload` is the response body, with eval_count/eval_duration when generating."""
+    OLLAMA_REQUEST_DURATION.labels(operation, status).observe(seconds)
+    if payload and payload.get("eval_count") and payload.get("eval_duration"):
+        OLLAMA_TOKENS.labels(operation).inc(payload["eval_count"])
+        # eval_duration is in nanoseconds
+        OLLAMA_TOKENS_PER_SECOND.labels(operation).observe(payload["eval_count"] / (payload["eval_duration"] / 1e9))
+
+
+@contextmanager
+def pipeline_stage(stage: str):
+    """Times one stage of the document pipeline (histogram and trace span)."""
+    start = time.perf_counter()
+    try:
+        with span(f"pipeline.{stage}"):
+            yield
+    finally:
+        PIPELINE_STAGE_DURATION.labels(stage).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> tuple:
+    """(body, content type) of the Prometheus exposition."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
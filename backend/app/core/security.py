@@ -87,19 +87,24 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             # We can accept both the client_id and 'account' which is Keycloak default
             expected_audiences = [JWT_AUDIENCE, "account", "olympus-frontend", "olympus-backend"]
             
-            # python-jose automatically finds the key in jwks matching the 'kid' in header
+            # python-jose automatically finds the key in jwks matching the 'kid' in header.
+            # It only accepts a single expected audience, so the list is checked below.
             payload = jwt.decode(
                 token,
                 jwks,
                 algorithms=ALGORITHMS,
-                audience=expected_audiences,
                 options={
-                    "verify_aud": True,
+                    "verify_aud": False,
                     "verify_iss": False, 
                     "verify_at_hash": False,
                     "verify_sub": True
                 }
             )
+            token_audiences = payload.get("aud") or []
+            if isinstance(token_audiences, str):
+                token_audiences = [token_audiences]
+            if not set(token_audiences) & set(expected_audiences):
+                raise JWTError(f"Invalid audience: {token_audiences}")
         except JWTError as e:
             logger.error(f"JWT Verification Error Details: {str(e)}")
             # Try to decode without verification just to log what's inside (DEBUG ONLY)
@@ -0,0 +1,104 @@
+"""Fast JSON serialization for API responses.
+
+:class:`ORJSONResponse` is the application's default response class, so any
+route that returns plain data is rendered by orjson instead of ``json``.
+
+Routes that return ORM rows through a ``response_model`` still pay for
+building and validating one Pydantic object per row (and per nested
+document/paso). Rows loaded from our own database are already trusted, so
+hot read endpoints use :func:`get_serializer` instead: it compiles a
+schema once into a function that reads the schema's fields straight off
+the ORM object, and the result goes to orjson as is. The output matches
+``schema.model_validate(row).model_dump(mode="json")``.
+"""
+from decimal import Decimal
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Type, Union, get_args, get_origin
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+Serializer = Callable[[Any], Dict[str, Any]]
+
+
+def _default(value: Any) -> Any:
+    # Same representation Pydantic uses in JSON mode
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Serializes to JSON bytes with orjson."""
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (datetimes, enums and Decimals handled natively)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _nested_schema(annotation: Any) -> Optional[tuple]:
+    """(schema, is_list) when the annotation is a model, Optional[model] or List[model]."""
+    origin = get_origin(annotation)
+    if origin is Union:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        return _nested_schema(args[0]) if len(args) == 1 else None
+    if origin in (list, List):
+        inner = _nested_schema(get_args(annotation)[0])
+        return (inner[0], True) if inner and not inner[1] else None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    return None
+
+
+def _field_getter(name: str, annotation: Any, default: Any) -> Callable[[Any], Any]:
+    nested = _nested_schema(annotation)
+    if nested is None:
+        # Required fields are always mapped columns; optional ones may not exist on the row
+        return attrgetter(name) if default is ... else (lambda obj: getattr(obj, name, default))
+
+    schema, is_list = nested
+    serialize = get_serializer(schema)
+    if is_list:
+        return lambda obj: [serialize(item) for item in (getattr(obj, name, None) or ())]
+    return lambda obj: None if (value := getattr(obj, name, None)) is None else serialize(value)
+
+
+@lru_cache(maxsize=None)
+def get_serializer(schema: Type[BaseModel]) -> Serializer:
+    """
+    Compiles `schema` into a function dumping a trusted ORM row to JSON-ready data.
+
+    Nothing is validated, so only use it for rows loaded from the database.
+    """
+    getters = tuple(
+        (name, _field_getter(name, field.annotation, field.get_default() if not field.is_required() else ...))
+        for name, field in schema.model_fields.items()
+    )
+
+    def serialize(obj: Any) -> Dict[str, Any]:
+        return {name: get(obj) for name, get in getters}
+
+    return serialize
+
+
+def serialize_many(schema: Type[BaseModel], rows) -> List[Dict[str, Any]]:
+    """Serializes a list of ORM rows with the compiled serializer of `schema`."""
+    serialize = get_serializer(schema)
+    return [serialize(row) for row in rows]
+
+
+def orm_response(schema: Type[BaseModel], content: Any, status_code: int = 200) -> ORJSONResponse:
+    """ORJSONResponse for an ORM row or list of rows, skipping response_model validation."""
+    if isinstance(content, (list, tuple)):
+        return ORJSONResponse(serialize_many(schema, content), status_code=status_code)
+    return ORJSONResponse(get_serializer(schema)(content), status_code=status_code)
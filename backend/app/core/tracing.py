@@ -0,0 +1,140 @@
+"""Optional OpenTelemetry tracing.
+
+Enabled with ``TRACING_EXPORTER``:
+
+- ``otlp``: batches spans to an OTLP/HTTP collector
+  (``OTEL_EXPORTER_OTLP_ENDPOINT``, default ``http://localhost:4318``).
+- ``file``: appends one JSON span per line to ``TRACING_FILE_PATH`` for
+  offline analysis.
+- ``none`` (default): tracing is off and :func:`span` costs nothing.
+
+:func:`setup_tracing` instruments FastAPI requests, SQLAlchemy queries on
+the app engine and outgoing ``requests`` calls (Ollama, Keycloak). Code adds
+its own spans with :func:`span`, and :func:`traced` carries the current
+trace into work that runs later (background tasks, bulk jobs), so a
+document upload and its processing appear in the same trace.
+
+The OpenTelemetry packages are imported only when tracing is enabled::
+
+    pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-http \\
+        opentelemetry-instrumentation-fastapi opentelemetry-instrumentation-sqlalchemy \\
+        opentelemetry-instrumentation-requests
+"""
+import functools
+import logging
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_tracer = None
+
+
+@contextmanager
+def _span(name: str, attributes: dict):
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def span(name: str, **attributes: Any):
+    """Context manager for a child span of the current trace (no-op when tracing is off)."""
+    if _tracer is None:
+        return nullcontext()
+    return _span(name, {k: v for k, v in attributes.items() if v is not None})
+
+
+def traced(fn: Callable, name: Optional[str] = None) -> Callable:
+    """
+    Binds `fn` to the current trace context.
+
+    When the returned callable runs later (e.g. as a background task) its
+    work is recorded in a span parented to the span that scheduled it.
+    """
+    if _tracer is None:
+        return fn
+
+    from opentelemetry import context
+
+    parent = context.get_current()
+    span_name = name or getattr(fn, "__qualname__", "background")
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = context.attach(parent)
+        try:
+            with _tracer.start_as_current_span(span_name):
+                return fn(*args, **kwargs)
+        finally:
+            context.detach(token)
+
+    return wrapper
+
+
+def _file_exporter(path: str):
+    from pathlib import Path
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    out = open(path, "a", encoding="utf-8")
+    return ConsoleSpanExporter(out=out, formatter=lambda s: s.to_json(indent=None) + "\n")
+
+
+def setup_tracing(app, engine) -> bool:
+    """Configures the tracer provider and instrumentations; returns whether tracing is on."""
+    global _tracer
+    exporter_name = settings.TRACING_EXPORTER.lower()
+    if exporter_name in ("", "none") or _tracer is not None:
+        return _tracer is not None
+
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        from opentelemetry.instrumentation.requests import RequestsInstrumentor
+        from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+    except ImportError as e:
+        logger.warning(f"TRACING_EXPORTER={exporter_name} but OpenTelemetry is not installed ({e}); tracing disabled")
+        return False
+
+    if exporter_name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    elif exporter_name == "file":
+        exporter = _file_exporter(settings.TRACING_FILE_PATH)
+    else:
+        logger.warning(f"Unknown TRACING_EXPORTER '{exporter_name}'; tracing disabled")
+        return False
+
+    provider = TracerProvider(
+        resource=Resource.create({
+            "service.name": settings.TRACING_SERVICE_NAME,
+            "service.version": settings.PROJECT_VERSION,
+            "deployment.environment": settings.ENVIRONMENT,
+        }),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    FastAPIInstrumentor.instrument_app(app, tracer_provider=provider, excluded_urls="metrics,health")
+    SQLAlchemyInstrumentor().instrument(engine=engine, tracer_provider=provider)
+    RequestsInstrumentor().instrument(tracer_provider=provider)
+
+    _tracer = trace.get_tracer("olympus.backend")
+    logger.info(f"Tracing enabled ({exporter_name} exporter)")
+    return True
+
+
+def shutdown_tracing():
+    """Flushes pending spans."""
+    if _tracer is None:
+        return
+    from opentelemetry import trace
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
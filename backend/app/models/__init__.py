@@ -1,6 +1,11 @@
 from .user import User
 from .expediente import Expediente, Documento, PasoTramitacion
 from .financiero import PartidaPresupuestaria, Factura
+from .flujo import DefinicionFlujo
+from .temporizador import Temporizador
+from .operacion_masiva import OperacionMasiva
+from .ocr import PaginaOCR
+from .extraccion import ExtraccionLLM
 
 __all__ = [
     "User",
@@ -9,4 +14,9 @@ __all__ = [
     "PasoTramitacion",
     "PartidaPresupuestaria",
     "Factura",
+    "DefinicionFlujo",
+    "Temporizador",
+    "OperacionMasiva",
+    "PaginaOCR",
+    "ExtraccionLLM",
 ]
@@ -1,5 +1,6 @@
 """Expediente (case management) models."""
-from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, ForeignKey, LargeBinary
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, DateTime, Enum, ForeignKey, LargeBinary, Index, JSON, Numeric
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
@@ -48,6 +49,10 @@ class Expediente(Base):
     fecha_actualizacion = Column(DateTime, server_default=func.now(), onupdate=func.now())
     fecha_cierre = Column(DateTime, nullable=True)
 
+    # Declarative workflow (optional): definition version and runtime state
+    definicion_flujo_id = Column(Integer, ForeignKey("definiciones_flujo.id"), nullable=True, index=True)
+    estado_flujo = Column(JSON, nullable=True)  # {"active": [...], "joins": {...}, "variables": {...}}
+
     # Relationships
     documentos = relationship("Documento", back_populates="expediente", cascade="all, delete-orphan")
     pasos = relationship("PasoTramitacion", back_populates="expediente", cascade="all, delete-orphan")
@@ -68,8 +73,15 @@ class Documento(Base):
     contenido_blob = Column(LargeBinary, nullable=True)  # For small files; use S3 for large files
     tipo = Column(Enum(TipoDocumento), default=TipoDocumento.ADJUNTO)
     ruta_archivo = Column(String(500), nullable=True)  # Path to file if stored externally
-    metadatos_extraidos = Column(String(2000), nullable=True)  # JSON string with OCR/IA metadata
+    metadatos_extraidos = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)  # OCR/IA metadata
+    # Validated fields of the IA extraction (app/schemas/extraccion.py), for filtering and sorting
+    tipo_extraido = Column(String(50), nullable=True, index=True)
+    fecha_documento = Column(Date, nullable=True, index=True)
+    emisor = Column(String(255), nullable=True)
+    receptor = Column(String(255), nullable=True)
+    importe = Column(Numeric(14, 2), nullable=True)
     fecha_carga = Column(DateTime, server_default=func.now(), index=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     # Phase 5: Semantic Search
     embedding = Column(Vector(4096), nullable=True) # Vector from Ollama (llama2 has 4096)
@@ -79,6 +91,15 @@ class Documento(Base):
     firmado_por = Column(String(255), nullable=True)  # User identifier who signed the document
     fecha_firma = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        # Containment filters (metadatos_extraidos @> '{"clave": valor}')
+        Index("ix_documentos_metadatos_extraidos", metadatos_extraidos,
+              postgresql_using="gin", postgresql_ops={"metadatos_extraidos": "jsonb_path_ops"}),
+        Index("ix_documentos_emisor_lower", func.lower(emisor).label("emisor_lower"),
+              postgresql_ops={"emisor_lower": "text_pattern_ops"}),  # Prefix search on emisor
+        Index("ix_documentos_nif_emisor", metadatos_extraidos["nif_emisor"].as_string()),
+    )
+
     # Relationships
     expediente = relationship("Expediente", back_populates="documentos")
 
@@ -101,6 +122,8 @@ class PasoTramitacion(Base):
     datetime_fin = Column(DateTime, nullable=True)
     responsable_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     comentarios = Column(Text, nullable=True)
+    nodo_id = Column(String(100), nullable=True)  # Task node in the expediente's workflow definition
+    fecha_limite = Column(DateTime, nullable=True)  # Legal response deadline, enforced by a Temporizador
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
@@ -112,17 +135,33 @@ class PasoTramitacion(Base):
 
 
 class Trazabilidad(Base):
-    """Audit trail for all actions on expedientes (Fase 3)."""
+    """
+    Audit trail for all actions on expedientes (Fase 3).
+
+    In PostgreSQL the table is range-partitioned by month on ``timestamp``
+    (migration 003, primary key ``(id, timestamp)``); partitions are managed
+    by ``app.services.audit_partitions``.
+    """
 
     __tablename__ = "trazabilidad"
 
-    id = Column(Integer, primary_key=True, index=True)
-    expediente_id = Column(Integer, ForeignKey("expedientes.id"), nullable=False, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    expediente_id = Column(Integer, ForeignKey("expedientes.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     accion = Column(String(255), nullable=False)  # e.g., "CAMBIO_ESTADO", "FIRMA_DOCUMENTO"
     descripcion = Column(Text, nullable=True)
     metadata_json = Column(Text, nullable=True)  # JSON with extra details
-    timestamp = Column(DateTime, server_default=func.now(), index=True)
+    timestamp = Column(DateTime, server_default=func.now(), nullable=False)
+
+    # Tamper-evident chain per expediente (see app.services.audit_chain)
+    secuencia = Column(Integer, nullable=True)  # Position in the expediente's chain, from 1
+    hash_anterior = Column(String(64), nullable=True)
+    hash = Column(String(64), nullable=True)
+
+    __table_args__ = (
+        Index("ix_trazabilidad_expediente_timestamp", expediente_id, timestamp.desc()),
+        Index("ix_trazabilidad_expediente_secuencia", expediente_id, secuencia),  # Chain order (verification)
+    )
 
     # Relationships
     expediente = relationship("Expediente")
@@ -130,3 +169,32 @@ class Trazabilidad(Base):
 
     def __repr__(self):
         return f"<Trazabilidad {self.expediente_id} - {self.accion}>"
+
+
+class TrazabilidadCadena(Base):
+    """Head of each expediente's audit hash chain: last hash and sequence written."""
+
+    __tablename__ = "trazabilidad_cadena"
+
+    expediente_id = Column(Integer, ForeignKey("expedientes.id", ondelete="CASCADE"), primary_key=True)
+    ultimo_hash = Column(String(64), nullable=False)
+    ultima_secuencia = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<TrazabilidadCadena {self.expediente_id} #{self.ultima_secuencia}>"
+
+
+class TrazabilidadArchivada(Base):
+    """Last chain entry of an expediente in an archived trazabilidad partition."""
+
+    __tablename__ = "trazabilidad_archivada"
+
+    particion = Column(String(64), primary_key=True)
+    expediente_id = Column(Integer, ForeignKey("expedientes.id", ondelete="CASCADE"), primary_key=True)
+    secuencia = Column(Integer, nullable=False)
+    hash = Column(String(64), nullable=False)
+    archivado_at = Column(DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"<TrazabilidadArchivada {self.particion} {self.expediente_id} #{self.secuencia}>"
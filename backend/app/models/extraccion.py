@@ -0,0 +1,30 @@
+"""Cache of LLM metadata extraction results."""
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy.sql import func
+from ..core.database import Base
+
+
+class ExtraccionLLM(Base):
+    """
+    Parsed metadata the LLM extracted from a text, keyed by a hash of the
+    normalized text, the model and the prompt version.
+
+    Identical documents (the same circular attached to hundreds of
+    expedientes, re-uploads) are analyzed once; changing the model or
+    ``PROMPT_VERSION`` yields new keys. Rows unused for
+    ``LLM_CACHE_MAX_AGE_DAYS`` or beyond ``LLM_CACHE_MAX_ENTRIES`` are evicted
+    by ``last_used_at``.
+    """
+
+    __tablename__ = "llm_extracciones"
+
+    clave = Column(String(64), primary_key=True)  # SHA-256 hex
+    modelo = Column(String(100), nullable=False)
+    prompt_version = Column(String(20), nullable=False)
+    metadatos = Column(JSON, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+    last_used_at = Column(DateTime, server_default=func.now(), index=True)
+
+    def __repr__(self):
+        return f"<ExtraccionLLM {self.clave[:12]} {self.modelo}>"
@@ -0,0 +1,30 @@
+"""Workflow definition models (declarative BPMN-like flows)."""
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, JSON, UniqueConstraint
+from sqlalchemy.sql import func
+from ..core.database import Base
+
+
+class DefinicionFlujo(Base):
+    """
+    Versioned workflow definition.
+
+    Rows are immutable: editing a flow stores a new version under the same
+    codigo, so expedientes already running keep the version they started with.
+    """
+
+    __tablename__ = "definiciones_flujo"
+
+    id = Column(Integer, primary_key=True, index=True)
+    codigo = Column(String(100), nullable=False, index=True)
+    version = Column(Integer, nullable=False)
+    nombre = Column(String(255), nullable=False)
+    definicion = Column(JSON, nullable=False)  # Nodes and transitions, see services.workflow_definitions
+    activa = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("codigo", "version", name="uq_definiciones_flujo_codigo_version"),
+    )
+
+    def __repr__(self):
+        return f"<DefinicionFlujo {self.codigo} v{self.version}>"
@@ -0,0 +1,22 @@
+"""Cache of OCR results per page image."""
+from sqlalchemy import Column, String, Text, DateTime
+from sqlalchemy.sql import func
+from ..core.database import Base
+
+
+class PaginaOCR(Base):
+    """
+    OCR text of one page, keyed by a hash of the page content and OCR settings.
+
+    Reprocessing a document (or uploading the same scan again) only OCRs pages
+    that are not in this table.
+    """
+
+    __tablename__ = "ocr_paginas"
+
+    hash = Column(String(64), primary_key=True)  # SHA-256 hex
+    texto = Column(Text, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+    def __repr__(self):
+        return f"<PaginaOCR {self.hash[:12]}>"
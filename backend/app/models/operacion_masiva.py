@@ -0,0 +1,30 @@
+"""Bulk operation jobs over many expedientes."""
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy.sql import func
+from ..core.database import Base
+
+
+class OperacionMasiva(Base):
+    """
+    Job handle for a bulk operation (cierre, reasignación, inicio de tramitación).
+
+    Progress is committed with every chunk, so any API worker can report it.
+    """
+
+    __tablename__ = "operaciones_masivas"
+
+    id = Column(String(36), primary_key=True)  # uuid4
+    operacion = Column(String(30), nullable=False)  # CERRAR, REASIGNAR, INICIAR
+    estado = Column(String(20), nullable=False, default="PENDIENTE")  # PENDIENTE, EN_CURSO, COMPLETADA, FALLIDA
+    parametros = Column(JSON, nullable=False)  # Selection and operation arguments
+    total = Column(Integer, nullable=False, default=0)
+    procesados = Column(Integer, nullable=False, default=0)
+    afectados = Column(Integer, nullable=False, default=0)  # Expedientes actually changed
+    error = Column(Text, nullable=True)
+    errores = Column(JSON, nullable=True)  # Per-expediente failures: [{"expediente_id", "error"}]
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<OperacionMasiva {self.operacion} {self.id}>"
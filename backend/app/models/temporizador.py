@@ -0,0 +1,36 @@
+"""Durable timers (legal deadlines and delayed workflow actions)."""
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index, JSON
+from sqlalchemy.sql import func
+from ..core.database import Base
+
+
+class Temporizador(Base):
+    """
+    Timer fired by ``app.services.timers.TimerScheduler`` once ``due_at`` passes.
+
+    Only pending timers (``fired_at IS NULL``) are indexed, so the scheduler's
+    "next due" lookup stays a single index probe with millions of rows.
+    """
+
+    __tablename__ = "temporizadores"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    tipo = Column(String(50), nullable=False)  # Handler key, e.g. PLAZO_PASO
+    expediente_id = Column(Integer, ForeignKey("expedientes.id", ondelete="CASCADE"), nullable=False)
+    paso_id = Column(Integer, ForeignKey("pasos_tramitacion.id", ondelete="CASCADE"), nullable=True, index=True)
+    due_at = Column(DateTime, nullable=False)
+    fired_at = Column(DateTime, nullable=True)
+    payload = Column(JSON, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index(
+            "ix_temporizadores_pendientes_due_at",
+            due_at,
+            postgresql_where=fired_at.is_(None),
+            sqlite_where=fired_at.is_(None),
+        ),
+    )
+
+    def __repr__(self):
+        return f"<Temporizador {self.tipo} {self.due_at}>"
@@ -5,12 +5,20 @@ from typing import List, Dict, Any
 from ..core.database import get_db
 from ..core.security import get_current_user
 from ..models.user import User
+from ..services.llm_scheduler import LLMUnavailable
 from ..services.semantic_search import SemanticSearchService
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
+
+def _busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="LLM is busy, retry later",
+                         headers={"Retry-After": "10"})
+
+
+# Plain def: waiting for an Ollama slot blocks a thread-pool worker, not the event loop
 @router.post("/search/semantic")
-async def semantic_search(
+def semantic_search(
     query: str = Query(..., min_length=3),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -19,11 +27,13 @@ async def semantic_search(
     Search for documents/expedientes semantically based on meanings.
     """
     service = SemanticSearchService(db)
-    results = service.search_documents(query)
-    return results
+    try:
+        return service.search_documents(query)
+    except LLMUnavailable:
+        raise _busy()
 
 @router.post("/ask")
-async def ask_assistant(
+def ask_assistant(
     question: str = Query(..., min_length=3),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -32,5 +42,7 @@ async def ask_assistant(
     Ask the Olympus Smart Gov assistant about documents using RAG.
     """
     service = SemanticSearchService(db)
-    response = service.ask_assistant(question)
-    return response
+    try:
+        return service.ask_assistant(question)
+    except LLMUnavailable:
+        raise _busy()
@@ -0,0 +1,102 @@
+"""Bulk expediente operation endpoints."""
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from sqlalchemy.orm import Session
+
+from ..core.database import get_db
+from ..core.security import get_current_user
+from ..core.tracing import traced
+from ..models.operacion_masiva import OperacionMasiva
+from ..models.user import User
+from ..schemas.bulk import (
+    BulkCerrarRequest,
+    BulkReasignarRequest,
+    BulkIniciarRequest,
+    BulkAvanzarRequest,
+    OperacionMasivaRead,
+)
+from ..services.bulk_operations import (
+    BulkOperationService, CERRAR, REASIGNAR, INICIAR, AVANZAR, run_bulk_job,
+)
+
+# Registered before the expedientes router so /expedientes/bulk/... is not taken for an expediente_id
+router = APIRouter(prefix="/expedientes/bulk", tags=["expedientes"])
+
+
+def _submit(db: Session, background_tasks: BackgroundTasks, operacion: str, seleccion: dict,
+            argumentos: dict, user_id: int) -> OperacionMasiva:
+    service = BulkOperationService(db)
+    try:
+        job = service.create_job(operacion, seleccion, argumentos, user_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    background_tasks.add_task(traced(run_bulk_job, "bulk_job"), job.id)
+    return job
+
+
+@router.post("/cerrar", response_model=OperacionMasivaRead, status_code=202)
+async def cerrar_expedientes(
+    request: BulkCerrarRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Close many expedientes; returns a job handle to poll."""
+    return _submit(db, background_tasks, CERRAR, request.seleccion.model_dump(mode="json"), {}, current_user.id)
+
+
+@router.post("/reasignar", response_model=OperacionMasivaRead, status_code=202)
+async def reasignar_expedientes(
+    request: BulkReasignarRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Reassign many expedientes to another responsable; returns a job handle to poll."""
+    return _submit(
+        db, background_tasks, REASIGNAR, request.seleccion.model_dump(mode="json"),
+        {"responsable_id": request.responsable_id}, current_user.id,
+    )
+
+
+@router.post("/iniciar", response_model=OperacionMasivaRead, status_code=202)
+async def iniciar_expedientes(
+    request: BulkIniciarRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Start tramitación of many expedientes; returns a job handle to poll."""
+    return _submit(
+        db, background_tasks, INICIAR, request.seleccion.model_dump(mode="json"),
+        {"definicion": request.definicion, "variables": request.variables}, current_user.id,
+    )
+
+
+@router.post("/avanzar", response_model=OperacionMasivaRead, status_code=202)
+async def avanzar_expedientes(
+    request: BulkAvanzarRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Complete a pending step of many expedientes; returns a job handle to poll."""
+    return _submit(
+        db, background_tasks, AVANZAR, request.seleccion.model_dump(mode="json"),
+        {"nodo_id": request.nodo_id, "comentarios": request.comentarios, "variables": request.variables},
+        current_user.id,
+    )
+
+
+@router.get("/{job_id}", response_model=OperacionMasivaRead)
+async def get_operacion(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Progress of a bulk operation."""
+    job = db.get(OperacionMasiva, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Bulk operation not found")
+    return job
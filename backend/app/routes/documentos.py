@@ -0,0 +1,47 @@
+"""Document search by extracted metadata."""
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from ..core.database import get_db
+from ..core.security import get_current_user
+from ..core.serialization import orm_response
+from ..models.user import User
+from ..schemas.expediente import DocumentoRead
+from ..services.document_filters import DocumentFilterService, parse_metadata_filters
+
+router = APIRouter(prefix="/documentos", tags=["documentos"])
+
+
+@router.get("", response_model=List[DocumentoRead])
+async def filter_documentos(
+    expediente_id: Optional[int] = Query(None),
+    tipo: Optional[str] = Query(None, max_length=50, description="Tipo de documento extraído (Factura, Informe...)"),
+    emisor: Optional[str] = Query(None, min_length=2, max_length=255, description="Comienzo del emisor"),
+    nif: Optional[str] = Query(None, max_length=20, description="NIF/CIF del emisor"),
+    fecha_desde: Optional[date] = Query(None),
+    fecha_hasta: Optional[date] = Query(None),
+    importe_min: Optional[Decimal] = Query(None, ge=0),
+    importe_max: Optional[Decimal] = Query(None, ge=0),
+    meta: List[str] = Query([], description="Otros campos extraídos, como clave:valor"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Filter documents by the metadata extracted by the AI analysis."""
+    try:
+        metadata = parse_metadata_filters(meta)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    documentos = DocumentFilterService(db).filter_documents(
+        expediente_id=expediente_id, tipo=tipo, emisor=emisor, nif=nif,
+        fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+        importe_min=importe_min, importe_max=importe_max,
+        metadata=metadata, skip=skip, limit=limit,
+    )
+    return orm_response(DocumentoRead, documentos)
@@ -1,11 +1,14 @@
 """Expediente CRUD endpoints."""
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, UploadFile, File, BackgroundTasks, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List, Optional
+from sqlalchemy import desc, func, select
+from typing import Any, Dict, List, Optional
 
 from ..core.database import get_db
 from ..core.security import get_current_user
+from ..core.http_cache import cached_json_response, conditional_response, make_etag, set_etag
+from ..core.serialization import orm_response, serialize_many
+from ..core.tracing import traced
 from ..models.expediente import Expediente, EstadoExpediente, PasoTramitacion, EstadoPaso, Trazabilidad, Documento
 from ..models.user import User
 from ..schemas.expediente import (
@@ -15,17 +18,22 @@ from ..schemas.expediente import (
     ExpedientePaginatedResponse,
     PasoTramitacionCreate,
     PasoTramitacionRead,
+    PasoPlazoSet,
     TrazabilidadRead,
     DocumentoSign,
     DocumentoRead,
 )
 from ..services.workflow import WorkflowService
+from ..services.workflow_definitions import WorkflowDefinitionError
 from ..services.signing import SigningService
 from ..services.document_processing import DocumentProcessingService
 
 
 router = APIRouter(prefix="/expedientes", tags=["expedientes"])
 
+# Tables an expediente response is built from (list cache invalidation)
+EXPEDIENTE_TABLES = ("expedientes", "pasos_tramitacion", "documentos")
+
 # Constants for file validation
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 ALLOWED_CONTENT_TYPES = ["application/pdf", "image/jpeg", "image/png", "application/msword",
@@ -74,7 +82,7 @@ async def upload_documento(
     # Trigger background analysis
     doc_service = DocumentProcessingService(db)
     background_tasks.add_task(
-        doc_service.process_pdf_content, db_documento.id, current_user.id
+        traced(doc_service.process_pdf_content, "process_pdf_content"), db_documento.id, current_user.id
     )
 
     return db_documento
@@ -105,6 +113,7 @@ async def create_expediente(
 
 @router.get("", response_model=ExpedientePaginatedResponse)
 async def list_expedientes(
+    request: Request,
     split: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
     estado: str = Query(None),
@@ -122,31 +131,53 @@ async def list_expedientes(
         except ValueError:
             raise HTTPException(status_code=400, detail=f"Invalid estado: {estado}")
 
-    # Get total count before pagination
-    total = query.count()
+    def build():
+        # Get total count before pagination
+        total = query.count()
+
+        # Apply pagination
+        items = query.order_by(desc(Expediente.fecha_creacion)).offset(split).limit(limit).all()
+
+        return {"items": serialize_many(ExpedienteRead, items), "total": total, "skip": split, "limit": limit}
+
+    return cached_json_response(request, EXPEDIENTE_TABLES, build)
 
-    # Apply pagination
-    items = query.order_by(desc(Expediente.fecha_creacion)).offset(split).limit(limit).all()
 
-    return {
-        "items": items,
-        "total": total,
-        "skip": split,
-        "limit": limit,
-    }
+def _expediente_etag(db: Session, expediente_id: int) -> Optional[str]:
+    """ETag of an expediente and its pasos/documentos, from one indexed lookup (None if missing)."""
+    of_pasos = PasoTramitacion.expediente_id == Expediente.id
+    of_documentos = Documento.expediente_id == Expediente.id
+    row = db.execute(
+        select(
+            Expediente.fecha_actualizacion,
+            select(func.max(PasoTramitacion.updated_at)).where(of_pasos).scalar_subquery(),
+            select(func.count(PasoTramitacion.id)).where(of_pasos).scalar_subquery(),
+            select(func.max(Documento.updated_at)).where(of_documentos).scalar_subquery(),
+            select(func.count(Documento.id)).where(of_documentos).scalar_subquery(),
+        ).where(Expediente.id == expediente_id)
+    ).first()
+    return make_etag("expediente", expediente_id, *row) if row else None
 
 
 @router.get("/{expediente_id}", response_model=ExpedienteRead)
 async def get_expediente(
     expediente_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Get a specific expediente by ID."""
-    expediente = db.query(Expediente).filter(Expediente.id == expediente_id).first()
-    if not expediente:
+    etag = _expediente_etag(db, expediente_id)
+    if not etag:
         raise HTTPException(status_code=404, detail="Expediente not found")
-    return expediente
+    not_modified = conditional_response(request, etag)
+    if not_modified:
+        return not_modified
+
+    expediente = db.query(Expediente).filter(Expediente.id == expediente_id).first()
+    response = orm_response(ExpedienteRead, expediente)
+    set_etag(response, etag)
+    return response
 
 
 @router.put("/{expediente_id}", response_model=ExpedienteRead)
@@ -195,30 +226,50 @@ async def create_paso(
 @router.get("/{expediente_id}/pasos", response_model=List[PasoTramitacionRead])
 async def list_pasos(
     expediente_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """List all steps (pasos) for an expediente."""
-    expediente = db.query(Expediente).filter(Expediente.id == expediente_id).first()
-    if not expediente:
+    version = db.execute(
+        select(
+            Expediente.id,
+            select(func.max(PasoTramitacion.updated_at))
+            .where(PasoTramitacion.expediente_id == Expediente.id).scalar_subquery(),
+            select(func.count(PasoTramitacion.id))
+            .where(PasoTramitacion.expediente_id == Expediente.id).scalar_subquery(),
+        ).where(Expediente.id == expediente_id)
+    ).first()
+    if not version:
         raise HTTPException(status_code=404, detail="Expediente not found")
+    etag = make_etag("pasos", *version)
+    not_modified = conditional_response(request, etag)
+    if not_modified:
+        return not_modified
 
     pasos = db.query(PasoTramitacion).filter(
         PasoTramitacion.expediente_id == expediente_id
     ).order_by(PasoTramitacion.numero_paso).all()
 
-    return pasos
+    response = orm_response(PasoTramitacionRead, pasos)
+    set_etag(response, etag)
+    return response
 
 
 @router.post("/{expediente_id}/start", response_model=ExpedienteRead)
 async def start_workflow(
     expediente_id: int,
+    definicion: Optional[str] = Query(None, description="Código de la definición de flujo a aplicar"),
+    variables: Optional[Dict[str, Any]] = Body(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Start the workflow for an expediente."""
     service = WorkflowService(db)
-    service.start_workflow(expediente_id, current_user.id)
+    try:
+        service.start_workflow(expediente_id, current_user.id, definicion, variables)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     
     expediente = db.query(Expediente).filter(Expediente.id == expediente_id).first()
     return expediente
@@ -229,13 +280,32 @@ async def complete_paso(
     expediente_id: int,
     paso_id: int,
     comentarios: Optional[str] = Query(None),
+    variables: Optional[Dict[str, Any]] = Body(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Complete a workflow step; `variables` feed the conditions of the following gateways."""
+    service = WorkflowService(db)
+    try:
+        return service.complete_step(expediente_id, paso_id, current_user.id, comentarios, variables)
+    except WorkflowDefinitionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post("/{expediente_id}/pasos/{paso_id}/plazo", response_model=PasoTramitacionRead)
+async def set_plazo_paso(
+    expediente_id: int,
+    paso_id: int,
+    plazo: PasoPlazoSet,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Complete a workflow step."""
+    """Set the legal response deadline of a workflow step."""
     service = WorkflowService(db)
     try:
-        return service.complete_step(expediente_id, paso_id, current_user.id, comentarios)
+        return service.set_deadline(expediente_id, paso_id, plazo.fecha_limite, current_user.id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -264,6 +334,7 @@ async def list_trazabilidad(
     current_user: User = Depends(get_current_user),
 ):
     """Get audit trail for an expediente."""
-    return db.query(Trazabilidad).filter(
+    trazas = db.query(Trazabilidad).filter(
         Trazabilidad.expediente_id == expediente_id
     ).order_by(desc(Trazabilidad.timestamp)).all()
+    return orm_response(TrazabilidadRead, trazas)
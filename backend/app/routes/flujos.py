@@ -0,0 +1,48 @@
+"""Workflow definition endpoints."""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+
+from ..core.database import get_db
+from ..core.security import get_current_user
+from ..models.flujo import DefinicionFlujo
+from ..models.user import User
+from ..schemas.flujo import DefinicionFlujoCreate, DefinicionFlujoRead
+from ..services.workflow_definitions import WorkflowDefinitionError, create_definition, latest_definition
+
+router = APIRouter(prefix="/flujos", tags=["flujos"])
+
+
+@router.post("/definiciones", response_model=DefinicionFlujoRead, status_code=201)
+async def create_definicion(
+    definicion: DefinicionFlujoCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Validate and store a new version of a workflow definition."""
+    try:
+        return create_definition(db, definicion.codigo, definicion.nombre, definicion.definicion)
+    except WorkflowDefinitionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/definiciones", response_model=List[DefinicionFlujoRead])
+async def list_definiciones(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """List all workflow definition versions."""
+    return db.query(DefinicionFlujo).order_by(DefinicionFlujo.codigo, DefinicionFlujo.version).all()
+
+
+@router.get("/definiciones/{codigo}", response_model=DefinicionFlujoRead)
+async def get_definicion(
+    codigo: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get the latest active version of a workflow definition."""
+    definicion = latest_definition(db, codigo)
+    if not definicion:
+        raise HTTPException(status_code=404, detail="Workflow definition not found")
+    return definicion
@@ -1,45 +1,36 @@
-"""Health check endpoint."""
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-import requests
+"""Health check endpoints."""
+from fastapi import APIRouter
 
-from ..core.database import get_db
-from ..core.config import settings
+from ..core.serialization import ORJSONResponse
+from ..services.health import health_monitor
 
 router = APIRouter(tags=["health"])
 
 
 @router.get("/health")
-async def health_check(db: Session = Depends(get_db)):
-    """Check API health and dependencies."""
-    health_status = {
-        "status": "healthy",
-        "database": "unknown",
-        "ollama": "unknown",
+async def health_check():
+    """Check API health and dependencies (last background snapshot)."""
+    snapshot = await health_monitor.current()
+    return {
+        "status": snapshot["status"],
+        **{name: check["detail"] for name, check in snapshot["checks"].items()},
+        "checked_at": snapshot["checked_at"],
+        "checks": snapshot["checks"],
     }
 
-    # Check database
-    try:
-        db.execute(text("SELECT 1"))
-        health_status["database"] = "connected"
-    except Exception as e:
-        health_status["database"] = f"error: {str(e)}"
-        health_status["status"] = "degraded"
-
-    # Check Ollama
-    try:
-        response = requests.get(
-            f"{settings.OLLAMA_HOST}/api/tags",
-            timeout=5.0,
-        )
-        if response.status_code == 200:
-            health_status["ollama"] = "connected"
-        else:
-            health_status["ollama"] = f"error: status {response.status_code}"
-            health_status["status"] = "degraded"
-    except Exception as e:
-        health_status["ollama"] = f"error: {str(e)}"
-        health_status["status"] = "degraded"
-
-    return health_status
+
+@router.get("/health/live")
+async def liveness():
+    """Liveness: the process is up and serving requests (no dependency checks)."""
+    return {"status": "alive"}
+
+
+@router.get("/health/ready")
+async def readiness():
+    """Readiness: every critical dependency was up in the last snapshot."""
+    snapshot = await health_monitor.current()
+    ready = health_monitor.is_ready()
+    return ORJSONResponse(
+        {"status": "ready" if ready else "not_ready", "checked_at": snapshot["checked_at"], "checks": snapshot["checks"]},
+        status_code=200 if ready else 503,
+    )
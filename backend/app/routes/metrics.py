@@ -0,0 +1,13 @@
+"""Prometheus metrics endpoint."""
+from fastapi import APIRouter, Response
+
+from ..core.metrics import render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus exposition of the backend metrics."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -1,11 +1,13 @@
 """Financial (budget & invoices) endpoints."""
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from decimal import Decimal
 from typing import List
 
 from ..core.database import get_db
 from ..core.security import get_current_user
+from ..core.http_cache import cached_json_response, conditional_response, make_etag, set_etag
+from ..core.serialization import orm_response, serialize_many
 from ..models.user import User
 from ..models.financiero import PartidaPresupuestaria, Factura
 from ..schemas.financiero import (
@@ -44,26 +46,40 @@ async def create_partida(
 
 @router.get("/presupuestos", response_model=List[PartidaPresupuestariaRead])
 async def list_partidas(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """List all budget lines."""
-    return db.query(PartidaPresupuestaria).all()
+    return cached_json_response(
+        request,
+        ("partidas_presupuestarias",),
+        lambda: serialize_many(PartidaPresupuestariaRead, db.query(PartidaPresupuestaria).all()),
+    )
 
 
 @router.get("/presupuestos/{codigo}", response_model=PartidaPresupuestariaRead)
 async def get_partida(
     codigo: str,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """Get a specific budget line."""
-    partida = db.query(PartidaPresupuestaria).filter(
+    version = db.query(PartidaPresupuestaria.id, PartidaPresupuestaria.updated_at).filter(
         PartidaPresupuestaria.codigo_contable == codigo
     ).first()
-    if not partida:
+    if not version:
         raise HTTPException(status_code=404, detail="Partida not found")
-    return partida
+    etag = make_etag("partida", *version)
+    not_modified = conditional_response(request, etag)
+    if not_modified:
+        return not_modified
+
+    partida = db.query(PartidaPresupuestaria).filter(PartidaPresupuestaria.id == version.id).first()
+    response = orm_response(PartidaPresupuestariaRead, partida)
+    set_etag(response, etag)
+    return response
 
 
 @router.post("/presupuestos/{id}/comprometer")
@@ -109,4 +125,4 @@ async def list_facturas(
     query = db.query(Factura)
     if expediente_id:
         query = query.filter(Factura.expediente_id == expediente_id)
-    return query.offset(skip).limit(limit).all()
+    return orm_response(FacturaRead, query.offset(skip).limit(limit).all())
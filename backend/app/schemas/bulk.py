@@ -0,0 +1,61 @@
+"""Pydantic schemas for bulk expediente operations."""
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+
+
+class SeleccionExpedientes(BaseModel):
+    """Which expedientes a bulk operation applies to: explicit IDs and/or filters (combined with AND)."""
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=100000)
+    estado: Optional[str] = None
+    responsable_id: Optional[int] = None
+    creado_antes: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def require_criteria(self):
+        if self.ids is None and self.estado is None and self.responsable_id is None and self.creado_antes is None:
+            raise ValueError("At least one selection criterion is required")
+        return self
+
+
+class BulkCerrarRequest(BaseModel):
+    """Close every selected expediente that is not already closed or annulled."""
+    seleccion: SeleccionExpedientes
+
+
+class BulkReasignarRequest(BaseModel):
+    """Assign the selected expedientes to another responsable."""
+    seleccion: SeleccionExpedientes
+    responsable_id: int
+
+
+class BulkIniciarRequest(BaseModel):
+    """Start tramitación of the selected ABIERTO expedientes, optionally with a workflow definition."""
+    seleccion: SeleccionExpedientes
+    definicion: Optional[str] = None
+    variables: Optional[Dict[str, Any]] = None
+
+
+class BulkAvanzarRequest(BaseModel):
+    """Complete a pending step of the selected expedientes in process: `nodo_id`, or the first pending one."""
+    seleccion: SeleccionExpedientes
+    nodo_id: Optional[str] = None
+    comentarios: Optional[str] = None
+    variables: Optional[Dict[str, Any]] = None
+
+
+class OperacionMasivaRead(BaseModel):
+    """Bulk operation job handle and progress."""
+    id: str
+    operacion: str
+    estado: str
+    total: int
+    procesados: int
+    afectados: int
+    error: Optional[str] = None
+    errores: Optional[List[Dict[str, Any]]] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,7 +1,8 @@
 """Pydantic schemas for Expediente models."""
 from typing import List, Optional
-from pydantic import BaseModel, Field
-from datetime import datetime
+from pydantic import BaseModel, Field, field_validator
+from datetime import date, datetime
+from decimal import Decimal
 
 
 class DocumentoBase(BaseModel):
@@ -20,7 +21,12 @@ class DocumentoRead(DocumentoBase):
     id: int
     expediente_id: int
     fecha_carga: datetime
-    metadatos_extraidos: Optional[str] = None
+    metadatos_extraidos: Optional[dict] = None
+    tipo_extraido: Optional[str] = None
+    fecha_documento: Optional[date] = None
+    emisor: Optional[str] = None
+    receptor: Optional[str] = None
+    importe: Optional[Decimal] = None
     
     # Phase 3: Digital signing
     hash_firma: Optional[str] = None
@@ -46,6 +52,9 @@ class TrazabilidadRead(BaseModel):
     datos_anteriores: Optional[dict] = None
     datos_nuevos: Optional[dict] = None
     timestamp: datetime
+    secuencia: Optional[int] = None
+    hash_anterior: Optional[str] = None
+    hash: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -73,6 +82,8 @@ class PasoTramitacionRead(PasoTramitacionBase):
     datetime_fin: Optional[datetime] = None
     responsable_id: Optional[int] = None
     comentarios: Optional[str] = None
+    nodo_id: Optional[str] = None
+    fecha_limite: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
@@ -80,6 +91,19 @@ class PasoTramitacionRead(PasoTramitacionBase):
         from_attributes = True
 
 
+class PasoPlazoSet(BaseModel):
+    """Schema for setting the legal deadline of a paso."""
+    fecha_limite: datetime
+
+    @field_validator("fecha_limite")
+    @classmethod
+    def to_naive_local(cls, value: datetime) -> datetime:
+        # Deadlines are stored as naive local time; clients usually send UTC ("...Z")
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return value
+
+
 class ExpedienteBase(BaseModel):
     """Base expediente schema."""
     numero: str = Field(..., min_length=3, max_length=50, description="Número único del expediente")
@@ -108,6 +132,7 @@ class ExpedienteRead(ExpedienteBase):
     fecha_creacion: datetime
     fecha_actualizacion: datetime
     fecha_cierre: Optional[datetime] = None
+    definicion_flujo_id: Optional[int] = None
     documentos: List[DocumentoRead] = []
     pasos: List[PasoTramitacionRead] = []
 
@@ -0,0 +1,161 @@
+"""Pydantic schemas for metadata extracted by the LLM, one per document type."""
+import json
+import re
+import unicodedata
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Optional, Type
+
+from pydantic import BaseModel, Field, ValidationError, field_serializer, field_validator
+
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y")
+_THOUSANDS = re.compile(r"^\d{1,3}(?:\.\d{3})+$")
+_NIF = r"^(?:\d{8}[A-HJ-NP-TV-Z]|[XYZ]\d{7}[A-HJ-NP-TV-Z]|[ABCDEFGHJNPQRSUVW]\d{7}[0-9A-J])$"
+
+
+def _blank_to_none(value: Any) -> Any:
+    if isinstance(value, str) and value.strip().lower() in ("", "null", "none", "n/a", "no consta", "desconocido"):
+        return None
+    return value
+
+
+class ExtraccionDocumento(BaseModel):
+    """Fields extracted from any document."""
+    tipo_documento: str = Field(..., min_length=1, max_length=50)
+    fecha: Optional[date] = None
+    emisor: Optional[str] = Field(None, max_length=255)
+    receptor: Optional[str] = Field(None, max_length=255)
+    monto: Optional[Decimal] = Field(None, ge=0, lt=Decimal("1e12"))
+    resumen: Optional[str] = Field(None, max_length=500)
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def blank_to_none(cls, value: Any) -> Any:
+        return _blank_to_none(value)
+
+    @field_validator("fecha", mode="before")
+    @classmethod
+    def parse_fecha(cls, value: Any) -> Any:
+        """Accepts the Spanish formats models often return (12/03/2024)."""
+        if isinstance(value, str):
+            for fmt in _DATE_FORMATS:
+                try:
+                    return datetime.strptime(value.strip(), fmt).date()
+                except ValueError:
+                    continue
+        return value
+
+    @field_validator("monto", mode="before")
+    @classmethod
+    def parse_monto(cls, value: Any) -> Any:
+        """Accepts amounts written the Spanish way ("1.250,00 €")."""
+        if not isinstance(value, str):
+            return value
+        amount = re.sub(r"(?i)\s|€|eur(?:os?)?", "", value)
+        if "," in amount:
+            amount = amount.replace(".", "").replace(",", ".")
+        elif _THOUSANDS.match(amount):
+            amount = amount.replace(".", "")
+        try:
+            return Decimal(amount)
+        except InvalidOperation:
+            return value
+
+    @field_validator("monto")
+    @classmethod
+    def cents(cls, value: Optional[Decimal]) -> Optional[Decimal]:
+        return value.quantize(Decimal("0.01")) if value is not None else None
+
+    @field_serializer("monto", when_used="json")
+    def monto_as_number(self, value: Optional[Decimal]) -> Optional[float]:
+        return float(value) if value is not None else None
+
+
+class ExtraccionFactura(ExtraccionDocumento):
+    """Invoice: the amount is required."""
+    monto: Decimal = Field(..., ge=0, lt=Decimal("1e12"))
+    numero_factura: Optional[str] = Field(None, max_length=50)
+    nif_emisor: Optional[str] = Field(None, pattern=_NIF)
+
+    @field_validator("nif_emisor", mode="before")
+    @classmethod
+    def normalize_nif(cls, value: Any) -> Any:
+        return re.sub(r"[\s.-]", "", value).upper() if isinstance(value, str) else value
+
+
+class ExtraccionResolucion(ExtraccionDocumento):
+    """Resolution or decree."""
+    numero_resolucion: Optional[str] = Field(None, max_length=50)
+    organo: Optional[str] = Field(None, max_length=255)
+
+
+class ExtraccionSolicitud(ExtraccionDocumento):
+    """Application filed by a citizen or company."""
+    solicitante: Optional[str] = Field(None, max_length=255)
+    objeto: Optional[str] = Field(None, max_length=500)
+
+
+class ExtraccionInforme(ExtraccionDocumento):
+    """Technical or legal report."""
+    sentido: Optional[str] = Field(None, pattern=r"^(favorable|desfavorable|condicionado)$")
+
+    @field_validator("sentido", mode="before")
+    @classmethod
+    def lower(cls, value: Any) -> Any:
+        return value.strip().lower() if isinstance(value, str) else value
+
+
+SCHEMAS: Dict[str, Type[ExtraccionDocumento]] = {
+    "factura": ExtraccionFactura,
+    "resolucion": ExtraccionResolucion,
+    "decreto": ExtraccionResolucion,
+    "solicitud": ExtraccionSolicitud,
+    "informe": ExtraccionInforme,
+}
+
+
+def schema_for(tipo_documento: Any) -> Type[ExtraccionDocumento]:
+    """Schema of a document type ("Resolución" -> ExtraccionResolucion); the base schema if unknown."""
+    if not isinstance(tipo_documento, str):
+        return ExtraccionDocumento
+    key = unicodedata.normalize("NFKD", tipo_documento).encode("ascii", "ignore").decode().strip().lower()
+    return SCHEMAS.get(key, ExtraccionDocumento)
+
+
+def validate_extraction(data: Dict[str, Any]) -> ExtraccionDocumento:
+    """Validates metadata against the schema of its tipo_documento; raises pydantic.ValidationError."""
+    return schema_for(data.get("tipo_documento")).model_validate(data)
+
+
+def parse_extraction(response_text: str) -> ExtraccionDocumento:
+    """Parses and validates an LLM response; raises ValueError (invalid JSON or schema errors)."""
+    data = json.loads(response_text)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    return validate_extraction(data)
+
+
+def response_format(schema: Type[ExtraccionDocumento]) -> Dict[str, Any]:
+    """
+    JSON schema for Ollama's ``format`` (constrained decoding), flattened to
+    one type per field; optional fields stay nullable (``["number", "null"]``).
+    Only tipo_documento is required, so the model is never forced to invent
+    a value the text does not contain; validation still decides afterwards.
+    """
+    full = schema.model_json_schema()
+    properties = {}
+    for name, prop in full["properties"].items():
+        options = prop.get("anyOf", [prop])
+        non_null = [option for option in options if option.get("type") != "null"]
+        field = {key: value for key, value in non_null[0].items() if key in ("type", "format", "pattern")}
+        if len(non_null) < len(options):
+            field["type"] = [field["type"], "null"]
+        properties[name] = field
+    return {"type": "object", "properties": properties, "required": ["tipo_documento"]}
+
+
+def describe_errors(error: ValueError) -> str:
+    """Short description of a parse/validation error, for the repair prompt."""
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'objeto'}: {e['msg']}" for e in error.errors())
+    return str(error)
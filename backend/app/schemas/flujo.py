@@ -0,0 +1,25 @@
+"""Pydantic schemas for workflow definitions."""
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+
+class DefinicionFlujoCreate(BaseModel):
+    """Schema for storing a new workflow definition version."""
+    codigo: str = Field(..., min_length=1, max_length=100)
+    nombre: str = Field(..., min_length=1, max_length=255)
+    definicion: Dict[str, Any]
+
+
+class DefinicionFlujoRead(BaseModel):
+    """Schema for reading a workflow definition."""
+    id: int
+    codigo: str
+    version: int
+    nombre: str
+    definicion: Dict[str, Any]
+    activa: bool
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
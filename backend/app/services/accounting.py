@@ -4,13 +4,15 @@ from decimal import Decimal
 from typing import Optional
 
 from ..models.financiero import PartidaPresupuestaria, Factura, EstadoFactura
-from ..models.expediente import Expediente, Trazabilidad
+from ..models.expediente import Expediente
+from .audit import AuditTrail
 
 class AccountingService:
     """Handles financial logic: budget checks, commitments, and invoicing."""
 
     def __init__(self, db: Session):
         self.db = db
+        self.audit = AuditTrail(db)
 
     def create_partida(self, codigo: str, descripcion: str, monto: Decimal):
         """Creates a new budget line."""
@@ -96,10 +98,4 @@ class AccountingService:
 
     def _log_financial_event(self, expediente_id: int, user_id: int, action: str, description: str):
         """Helper to log to Trazabilidad table."""
-        log = Trazabilidad(
-            expediente_id=expediente_id,
-            usuario_id=user_id,
-            accion=action,
-            descripcion=description
-        )
-        self.db.add(log)
+        self.audit.record(expediente_id, action, description, user_id=user_id)
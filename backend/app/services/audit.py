@@ -0,0 +1,207 @@
+"""Central audit-trail sink for Trazabilidad events.
+
+Services record audit events through :class:`AuditTrail` instead of adding
+``Trazabilidad`` rows themselves. Events are buffered on the SQLAlchemy
+session and written with a single multi-row INSERT right before the session
+commits, so a workflow operation costs one round-trip for its audit rows no
+matter how many events it produces. Rolling back the session discards the
+buffered events together with the rest of the transaction; blocks run through
+:meth:`AuditTrail.savepoint` discard only their own events when they fail.
+
+Non-critical events (``critical=False``, e.g. the results of the IA
+analysis) go to :data:`audit_writer` instead, a background queue that
+batches events from every request and writes them on its own connection.
+
+Every batch is hash-chained per expediente before it is inserted (see
+:mod:`app.services.audit_chain`).
+"""
+import json
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..core.metrics import AUDIT_QUEUE_DEPTH
+from ..models.expediente import Trazabilidad
+from .audit_chain import chain_events
+
+logger = logging.getLogger(__name__)
+
+_BUFFER_KEY = "audit_buffer"
+
+
+def _build_event(
+    expediente_id: int,
+    action: str,
+    description: Optional[str] = None,
+    user_id: Optional[int] = None,
+    metadata: Optional[dict] = None,
+) -> Dict[str, Any]:
+    """Build the row dict inserted into the trazabilidad table."""
+    return {
+        "expediente_id": expediente_id,
+        "user_id": user_id,
+        "accion": action,
+        "descripcion": description,
+        "metadata_json": json.dumps(metadata, default=str) if metadata else None,
+        # Stamped at record time: rows are written later, at commit.
+        "timestamp": datetime.now(),
+    }
+
+
+def write_events(db: Session, events: List[Dict[str, Any]]):
+    """Chain and insert a batch of audit events with one multi-row INSERT."""
+    if not events:
+        return
+    chain_events(db, events)
+    db.execute(insert(Trazabilidad).values(events))
+
+
+class AuditTrail:
+    """Per-session audit sink; buffered events are flushed at commit."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record(
+        self,
+        expediente_id: int,
+        action: str,
+        description: Optional[str] = None,
+        user_id: Optional[int] = None,
+        metadata: Optional[dict] = None,
+        critical: bool = True,
+    ):
+        """
+        Records an audit event.
+
+        Critical events are part of the caller's transaction and are written
+        when the session commits. Non-critical events go to the background
+        writer when it is running and are written independently.
+        """
+        entry = _build_event(expediente_id, action, description, user_id, metadata)
+        if not critical and audit_writer.enqueue(entry):
+            return
+        self.db.info.setdefault(_BUFFER_KEY, []).append(entry)
+
+    def pending(self) -> int:
+        """Number of events buffered on the session and not yet written."""
+        return len(self.db.info.get(_BUFFER_KEY, []))
+
+    @contextmanager
+    def savepoint(self):
+        """Runs a block in a SAVEPOINT; if it raises, the events it recorded are dropped with it."""
+        mark = self.pending()
+        try:
+            with self.db.begin_nested():
+                yield
+        except Exception:
+            del self.db.info.get(_BUFFER_KEY, [])[mark:]
+            raise
+
+
+@event.listens_for(Session, "before_commit")
+def _flush_audit_buffer(session: Session):
+    """Write the session's buffered audit events inside the committing transaction."""
+    events = session.info.pop(_BUFFER_KEY, None)
+    if events:
+        write_events(session, events)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_audit_buffer(session: Session, previous_transaction):
+    """Drop buffered events when the transaction they belong to is rolled back."""
+    if previous_transaction.nested:
+        return  # A SAVEPOINT: AuditTrail.savepoint drops just the events recorded inside it
+    session.info.pop(_BUFFER_KEY, None)
+
+
+class AsyncAuditWriter:
+    """Background writer that batches non-critical audit events across requests."""
+
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def qsize(self) -> int:
+        """Number of events waiting to be written."""
+        return self._queue.qsize()
+
+    def enqueue(self, entry: Dict[str, Any]) -> bool:
+        """Queues an event; returns False when the caller must write it inline."""
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            logger.warning("Audit queue full, writing event inline.")
+            return False
+
+    def start(self):
+        """Starts the writer thread."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stops the writer thread after draining the queue."""
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        """Blocks until an event arrives, then collects up to batch_size events."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        db = SessionLocal()
+        try:
+            write_events(db, batch)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to write {len(batch)} audit events: {e}")
+        finally:
+            db.close()
+
+
+audit_writer = AsyncAuditWriter(
+    max_queue=settings.AUDIT_QUEUE_MAX_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL_SECONDS,
+)
+AUDIT_QUEUE_DEPTH.set_function(audit_writer.qsize)
@@ -0,0 +1,349 @@
+"""Tamper-evident hash chain for the trazabilidad audit trail.
+
+Every audit entry stores its position in its expediente's chain
+(``secuencia``), the hash of the previous entry (``hash_anterior``) and its
+own hash over both plus the entry content. The latest hash of each chain is
+kept in ``trazabilidad_cadena``. Writers only lock the expedientes they
+append to (a transaction-scoped advisory lock per expediente), so writes to
+different expedientes never wait on each other.
+
+Usage:
+    python -m app.services.audit_chain verify [--workers 4] [--batch-size 5000]
+    python -m app.services.audit_chain seal
+"""
+import argparse
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, create_engine, func, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from ..core.config import settings
+from ..models.expediente import Trazabilidad, TrazabilidadArchivada, TrazabilidadCadena
+
+logger = logging.getLogger(__name__)
+
+GENESIS_HASH = "0" * 64
+
+# Namespace for pg_advisory_xact_lock(int, int) so chain locks never collide with other advisory locks
+_LOCK_NAMESPACE = 0x7A0D
+
+# Failures kept per report; the rest are only counted
+MAX_REPORTED_FAILURES = 1000
+
+_CHAIN_COLUMNS = (
+    Trazabilidad.expediente_id,
+    Trazabilidad.secuencia,
+    Trazabilidad.user_id,
+    Trazabilidad.accion,
+    Trazabilidad.descripcion,
+    Trazabilidad.metadata_json,
+    Trazabilidad.timestamp,
+    Trazabilidad.hash_anterior,
+    Trazabilidad.hash,
+)
+
+
+def compute_entry_hash(previous_hash: str, entry: Dict[str, Any]) -> str:
+    """SHA-256 over the previous hash and the entry's canonical JSON content."""
+    timestamp = entry["timestamp"]
+    payload = json.dumps(
+        [
+            previous_hash,
+            entry["expediente_id"],
+            entry["secuencia"],
+            entry["user_id"],
+            entry["accion"],
+            entry["descripcion"],
+            entry["metadata_json"],
+            timestamp.isoformat() if timestamp is not None else None,
+        ],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def chain_events(db: Session, events: List[Dict[str, Any]]):
+    """
+    Assigns secuencia, hash_anterior and hash to a batch of events about to be inserted.
+
+    Must run inside the inserting transaction: it locks the affected chains
+    until commit and advances their heads.
+    """
+    by_expediente: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+    for entry in events:
+        by_expediente.setdefault(entry["expediente_id"], []).append(entry)
+    expediente_ids = sorted(by_expediente)
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        # Locks taken in id order so concurrent batches cannot deadlock
+        db.execute(
+            text(
+                "SELECT pg_advisory_xact_lock(:ns, e) "
+                "FROM (SELECT unnest(CAST(:ids AS integer[])) AS e ORDER BY 1) AS ids"
+            ),
+            {"ns": _LOCK_NAMESPACE, "ids": expediente_ids},
+        )
+
+    heads = {
+        row.expediente_id: (row.ultimo_hash, row.ultima_secuencia)
+        for row in db.execute(
+            select(
+                TrazabilidadCadena.expediente_id,
+                TrazabilidadCadena.ultimo_hash,
+                TrazabilidadCadena.ultima_secuencia,
+            ).where(TrazabilidadCadena.expediente_id.in_(expediente_ids))
+        )
+    }
+
+    new_heads = []
+    for expediente_id in expediente_ids:
+        previous_hash, sequence = heads.get(expediente_id, (GENESIS_HASH, 0))
+        for entry in by_expediente[expediente_id]:
+            sequence += 1
+            entry["secuencia"] = sequence
+            entry["hash_anterior"] = previous_hash
+            entry["hash"] = previous_hash = compute_entry_hash(previous_hash, entry)
+        new_heads.append({
+            "expediente_id": expediente_id,
+            "ultimo_hash": previous_hash,
+            "ultima_secuencia": sequence,
+        })
+
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    upsert = dialect_insert(TrazabilidadCadena).values(new_heads)
+    db.execute(upsert.on_conflict_do_update(
+        index_elements=[TrazabilidadCadena.expediente_id],
+        set_={
+            "ultimo_hash": upsert.excluded.ultimo_hash,
+            "ultima_secuencia": upsert.excluded.ultima_secuencia,
+            "updated_at": func.now(),
+        },
+    ))
+
+
+@dataclass
+class ChainReport:
+    """Outcome of verifying (part of) the audit trail."""
+    entries_checked: int = 0
+    chains_checked: int = 0
+    chains_resumed: int = 0  # Chains whose first entries were archived (see audit_partitions)
+    unsealed_entries: int = 0
+    failure_count: int = 0
+    failures: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.failure_count == 0
+
+    def add_failure(self, expediente_id: int, secuencia: Optional[int], reason: str):
+        self.failure_count += 1
+        if len(self.failures) < MAX_REPORTED_FAILURES:
+            self.failures.append({"expediente_id": expediente_id, "secuencia": secuencia, "reason": reason})
+
+    def merge(self, other: "ChainReport"):
+        self.entries_checked += other.entries_checked
+        self.chains_checked += other.chains_checked
+        self.chains_resumed += other.chains_resumed
+        self.unsealed_entries += other.unsealed_entries
+        self.failure_count += other.failure_count
+        self.failures.extend(other.failures[:MAX_REPORTED_FAILURES - len(self.failures)])
+
+
+def verify_shard(database_url: str, shard: int, shards: int, batch_size: int = 5000) -> ChainReport:
+    """
+    Verifies every chain whose expediente_id falls in this shard.
+
+    Rows are streamed through a server-side cursor in chain order, so memory
+    stays flat regardless of table size. Runs in its own process with its own
+    connection.
+
+    Archiving old partitions removes the start of long chains, so a chain may
+    be verified from its first remaining entry: when that entry is not
+    secuencia 1, it must follow an entry recorded in ``trazabilidad_archivada``
+    when its partition was archived. The chain is then counted in
+    ``chains_resumed``; otherwise its first entries were deleted.
+    """
+    engine = create_engine(database_url, poolclass=NullPool)
+    report = ChainReport()
+    try:
+        with engine.connect() as conn:
+            in_shard = Trazabilidad.expediente_id % shards == shard
+            heads = {
+                row.expediente_id: (row.ultimo_hash, row.ultima_secuencia)
+                for row in conn.execute(
+                    select(
+                        TrazabilidadCadena.expediente_id,
+                        TrazabilidadCadena.ultimo_hash,
+                        TrazabilidadCadena.ultima_secuencia,
+                    ).where(TrazabilidadCadena.expediente_id % shards == shard)
+                )
+            }
+            archived = {
+                (row.expediente_id, row.secuencia, row.hash)
+                for row in conn.execute(
+                    select(
+                        TrazabilidadArchivada.expediente_id,
+                        TrazabilidadArchivada.secuencia,
+                        TrazabilidadArchivada.hash,
+                    ).where(TrazabilidadArchivada.expediente_id % shards == shard)
+                )
+            }
+            report.unsealed_entries = conn.execute(
+                select(func.count()).select_from(Trazabilidad).where(in_shard, Trazabilidad.hash.is_(None))
+            ).scalar()
+
+            rows = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+                select(*_CHAIN_COLUMNS)
+                .where(in_shard, Trazabilidad.hash.isnot(None))
+                .order_by(Trazabilidad.expediente_id, Trazabilidad.secuencia)
+            )
+
+            current: Optional[int] = None
+            previous_hash, expected_sequence = GENESIS_HASH, 1
+            for row in rows:
+                entry = row._asdict()
+                if entry["expediente_id"] != current:
+                    if current is not None:
+                        _check_head(report, current, previous_hash, expected_sequence - 1, heads.pop(current, None))
+                    current = entry["expediente_id"]
+                    previous_hash, expected_sequence = GENESIS_HASH, 1
+                    if entry["secuencia"] is not None and entry["secuencia"] > 1:
+                        start = (entry["expediente_id"], entry["secuencia"] - 1, entry["hash_anterior"])
+                        if start in archived:
+                            report.chains_resumed += 1
+                        else:
+                            report.add_failure(entry["expediente_id"], entry["secuencia"],
+                                               "chain starts after entries that were not archived")
+                        previous_hash, expected_sequence = entry["hash_anterior"], entry["secuencia"]
+                    report.chains_checked += 1
+
+                expediente_id, secuencia = entry["expediente_id"], entry["secuencia"]
+                if secuencia != expected_sequence:
+                    report.add_failure(expediente_id, secuencia, f"expected secuencia {expected_sequence}")
+                if entry["hash_anterior"] != previous_hash:
+                    report.add_failure(expediente_id, secuencia, "hash_anterior does not match previous entry")
+                if compute_entry_hash(entry["hash_anterior"], entry) != entry["hash"]:
+                    report.add_failure(expediente_id, secuencia, "entry content does not match its hash")
+
+                previous_hash, expected_sequence = entry["hash"], entry["secuencia"] + 1
+                report.entries_checked += 1
+
+            if current is not None:
+                _check_head(report, current, previous_hash, expected_sequence - 1, heads.pop(current, None))
+            for expediente_id in heads:
+                report.add_failure(expediente_id, None, "chain head exists but no entries found")
+    finally:
+        engine.dispose()
+    return report
+
+
+def _check_head(report: ChainReport, expediente_id: int, last_hash: str, last_sequence: int, head):
+    if head is None:
+        report.add_failure(expediente_id, None, "missing chain head")
+    elif head != (last_hash, last_sequence):
+        report.add_failure(expediente_id, last_sequence, f"chain ends before head (head secuencia {head[1]})")
+
+
+def verify_audit_trail(database_url: str = settings.DATABASE_URL, workers: int = 4,
+                       batch_size: int = 5000) -> ChainReport:
+    """Verifies all chains, splitting expedientes across `workers` processes."""
+    report = ChainReport()
+    if workers <= 1:
+        report.merge(verify_shard(database_url, 0, 1, batch_size))
+        return report
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(verify_shard, database_url, shard, workers, batch_size) for shard in range(workers)]
+        for future in futures:
+            report.merge(future.result())
+    return report
+
+
+def seal_unchained_entries(db: Session, batch_size: int = 5000) -> int:
+    """
+    Chains entries written before the hash chain existed.
+
+    Unsealed entries are appended to their expediente's chain, oldest first:
+    after its current head when the expediente already has chained entries
+    (it had history before the chain and new events after), from the genesis
+    hash otherwise. Sealed entries are never rewritten, so re-running it is
+    harmless.
+    """
+    sealed = 0
+    while True:
+        expediente_ids = db.execute(
+            select(Trazabilidad.expediente_id).where(Trazabilidad.hash.is_(None)).distinct().limit(100)
+        ).scalars().all()
+        if not expediente_ids:
+            return sealed
+
+        for expediente_id in expediente_ids:
+            rows = db.execute(
+                select(
+                    Trazabilidad.id,
+                    Trazabilidad.expediente_id,
+                    Trazabilidad.user_id,
+                    Trazabilidad.accion,
+                    Trazabilidad.descripcion,
+                    Trazabilidad.metadata_json,
+                    Trazabilidad.timestamp,
+                )
+                .where(Trazabilidad.expediente_id == expediente_id, Trazabilidad.hash.is_(None))
+                .order_by(Trazabilidad.timestamp, Trazabilidad.id)
+            ).mappings().all()
+            entries = [dict(row) for row in rows]
+            chain_events(db, entries)
+            for start in range(0, len(entries), batch_size):
+                table = Trazabilidad.__table__
+                db.connection().execute(
+                    update(table)
+                    .where(table.c.id == bindparam("entry_id"), table.c.timestamp == bindparam("entry_ts"))
+                    .values(secuencia=bindparam("secuencia"), hash_anterior=bindparam("hash_anterior"),
+                            hash=bindparam("hash")),
+                    [{"entry_id": e["id"], "entry_ts": e["timestamp"], "secuencia": e["secuencia"],
+                      "hash_anterior": e["hash_anterior"], "hash": e["hash"]} for e in entries[start:start + batch_size]],
+                )
+            sealed += len(entries)
+        db.commit()
+        logger.info(f"Sealed {sealed} audit entries so far")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trazabilidad hash chain tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    verify = subparsers.add_parser("verify", help="Verify every audit chain")
+    verify.add_argument("--workers", type=int, default=4)
+    verify.add_argument("--batch-size", type=int, default=5000)
+    subparsers.add_parser("seal", help="Chain entries written before the hash chain existed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "verify":
+        report = verify_audit_trail(workers=args.workers, batch_size=args.batch_size)
+        print(f"chains={report.chains_checked} resumed={report.chains_resumed} entries={report.entries_checked} "
+              f"unsealed={report.unsealed_entries} failures={report.failure_count}")
+        for failure in report.failures[:100]:
+            print(f"  expediente {failure['expediente_id']} #{failure['secuencia']}: {failure['reason']}")
+        raise SystemExit(0 if report.ok else 1)
+    elif args.command == "seal":
+        from ..core.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            print(f"sealed {seal_unchained_entries(db)} entries")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""Partition maintenance for the trazabilidad audit table.
+
+The table is range-partitioned by month (see migration 003). This module
+creates partitions ahead of time, detaches partitions older than the
+retention window and exports them to gzip-compressed CSV archives, and
+re-attaches an archive when old history is needed for an audit. Restored
+partitions are left out of archiving until the operator drops them. Archiving
+records the last chain entry of each expediente in the partition
+(``trazabilidad_archivada``) so chain verification can resume after it.
+
+Usage:
+    python -m app.services.audit_partitions list
+    python -m app.services.audit_partitions ensure [--months-ahead 3]
+    python -m app.services.audit_partitions archive [--retention-months 24] [--archive-dir DIR]
+    python -m app.services.audit_partitions attach ARCHIVE_FILE
+    python -m app.services.audit_partitions drop PARTITION
+"""
+import argparse
+import gzip
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "trazabilidad"
+DEFAULT_PARTITION = "trazabilidad_default"
+CHECKPOINT_TABLE = "trazabilidad_archivada"
+COLUMNS = (
+    "id, expediente_id, user_id, accion, descripcion, metadata_json, timestamp, "
+    "secuencia, hash_anterior, hash"
+)
+
+# Table comment marking a partition re-attached from an archive
+RESTORED_COMMENT = "restored from archive"
+
+# pg_advisory_xact_lock key serializing partition creation across workers
+_PARTITION_LOCK = (0x7A0E, 0)
+
+_PARTITION_NAME = re.compile(r"^trazabilidad_p(\d{4})(\d{2})$")
+_ARCHIVE_NAME = re.compile(r"^(trazabilidad_p\d{6})\.csv\.gz$")
+
+
+def add_months(day: date, months: int) -> date:
+    """First day of the month that is `months` away from `day`'s month."""
+    index = day.year * 12 + (day.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month_start: date) -> str:
+    return f"trazabilidad_p{month_start.year:04d}{month_start.month:02d}"
+
+
+@dataclass
+class PartitionInfo:
+    """A monthly partition attached to trazabilidad."""
+    name: str
+    start: date
+    restored: bool = False  # Re-attached from an archive; never re-archived
+
+    @property
+    def end(self) -> date:
+        return add_months(self.start, 1)
+
+
+class AuditPartitionManager:
+    """Creates, archives and restores monthly trazabilidad partitions."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        archive_dir: str = settings.AUDIT_ARCHIVE_DIR,
+        retention_months: int = settings.AUDIT_RETENTION_MONTHS,
+        months_ahead: int = settings.AUDIT_PARTITION_MONTHS_AHEAD,
+    ):
+        self.engine = engine
+        self.archive_dir = Path(archive_dir)
+        self.retention_months = retention_months
+        self.months_ahead = months_ahead
+
+    def is_partitioned(self) -> bool:
+        """True when trazabilidad is a partitioned table (i.e. migration 003 ran)."""
+        if self.engine.dialect.name != "postgresql":
+            return False
+        with self.engine.connect() as conn:
+            return bool(conn.execute(text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :name)"
+            ), {"name": PARENT_TABLE}).scalar())
+
+    def list_partitions(self) -> List[PartitionInfo]:
+        """Monthly partitions currently attached, oldest first."""
+        with self.engine.connect() as conn:
+            return self._partitions(conn)
+
+    @staticmethod
+    def _partitions(conn) -> List[PartitionInfo]:
+        rows = conn.execute(text(
+            "SELECT c.relname, obj_description(c.oid, 'pg_class') AS comment FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :name"
+        ), {"name": PARENT_TABLE}).all()
+
+        partitions = []
+        for name, comment in rows:
+            match = _PARTITION_NAME.match(name)
+            if match:
+                partitions.append(PartitionInfo(name, date(int(match[1]), int(match[2]), 1),
+                                                restored=comment == RESTORED_COMMENT))
+        return sorted(partitions, key=lambda p: p.start)
+
+    def ensure_future_partitions(self, months_ahead: Optional[int] = None) -> List[str]:
+        """Creates any missing partitions from the current month to `months_ahead` months out."""
+        months_ahead = self.months_ahead if months_ahead is None else months_ahead
+        this_month = date.today().replace(day=1)
+
+        created = []
+        with self.engine.begin() as conn:
+            # Every uvicorn worker runs this at startup: the first one creates, the rest find them
+            conn.execute(text("SELECT pg_advisory_xact_lock(:ns, :key)"),
+                         {"ns": _PARTITION_LOCK[0], "key": _PARTITION_LOCK[1]})
+            existing = {p.name for p in self._partitions(conn)}
+            for offset in range(months_ahead + 1):
+                month_start = add_months(this_month, offset)
+                name = partition_name(month_start)
+                if name not in existing:
+                    self._attach_month(conn, month_start)
+                    created.append(name)
+        for name in created:
+            logger.info(f"Created audit partition {name}")
+        return created
+
+    def archive_old_partitions(self, retention_months: Optional[int] = None) -> List[Path]:
+        """Detaches partitions older than the retention window and exports them to archives."""
+        retention_months = self.retention_months if retention_months is None else retention_months
+        cutoff = add_months(date.today().replace(day=1), -retention_months)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+
+        archived = []
+        for partition in self.list_partitions():
+            if partition.end > cutoff:
+                continue
+            if partition.restored:
+                # Its archive already exists; it stays until the operator drops it
+                logger.info(f"Skipping restored audit partition {partition.name}")
+                continue
+            archived.append(self._archive_partition(partition))
+        return archived
+
+    def attach_archive(self, archive_path: str) -> str:
+        """Restores an exported partition and attaches it for audit queries."""
+        path = Path(archive_path)
+        match = _ARCHIVE_NAME.match(path.name)
+        if not match:
+            raise ValueError(f"Not a trazabilidad archive: {path.name}")
+        name = match[1]
+        partition_match = _PARTITION_NAME.match(name)
+        month_start = date(int(partition_match[1]), int(partition_match[2]), 1)
+
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.execute(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            with gzip.open(path, "rt", encoding="utf-8") as archive:
+                cursor.copy_expert(f"COPY {name} ({COLUMNS}) FROM STDIN WITH (FORMAT csv, HEADER)", archive)
+            cursor.execute(self._attach_sql(name, month_start))
+            cursor.execute(f"COMMENT ON TABLE {name} IS '{RESTORED_COMMENT}'")
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+
+        logger.info(f"Re-attached audit partition {name} from {path}")
+        return name
+
+    def drop_restored(self, name: str):
+        """Detaches and drops a partition restored by attach_archive once it is no longer needed."""
+        partition = next((p for p in self.list_partitions() if p.name == name), None)
+        if partition is None:
+            raise ValueError(f"Not an attached audit partition: {name}")
+        if not partition.restored:
+            raise ValueError(f"Partition {name} was not restored from an archive; use archive instead")
+
+        with self.engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+        logger.info(f"Dropped restored audit partition {name}")
+
+    def _archive_partition(self, partition: PartitionInfo) -> Path:
+        """
+        Exports, detaches and drops a partition in one transaction: if the
+        export fails, the partition stays attached and nothing is lost.
+        """
+        path = self.archive_dir / f"{partition.name}.csv.gz"
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            # No late writes to the month between the export and the detach
+            cursor.execute(f"LOCK TABLE {partition.name} IN SHARE MODE")
+            with gzip.open(path, "wt", encoding="utf-8") as archive:
+                cursor.copy_expert(
+                    f"COPY (SELECT {COLUMNS} FROM {partition.name} ORDER BY id) "
+                    f"TO STDOUT WITH (FORMAT csv, HEADER)",
+                    archive,
+                )
+            # Where each chain continues, so verification can tell archived entries from deleted ones
+            cursor.execute(
+                f"INSERT INTO {CHECKPOINT_TABLE} (particion, expediente_id, secuencia, hash) "
+                f"SELECT DISTINCT ON (expediente_id) %s, expediente_id, secuencia, hash FROM {partition.name} "
+                f"WHERE hash IS NOT NULL ORDER BY expediente_id, secuencia DESC "
+                f"ON CONFLICT (particion, expediente_id) DO UPDATE "
+                f"SET secuencia = EXCLUDED.secuencia, hash = EXCLUDED.hash",
+                (partition.name,),
+            )
+            cursor.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {partition.name}")
+            cursor.execute(f"DROP TABLE {partition.name}")
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            path.unlink(missing_ok=True)
+            raise
+        finally:
+            raw.close()
+
+        logger.info(f"Archived audit partition {partition.name} to {path}")
+        return path
+
+    def _attach_month(self, conn, month_start: date):
+        """Creates a month table, moves matching rows out of the default partition and attaches it."""
+        name = partition_name(month_start)
+        start, end = month_start.isoformat(), add_months(month_start, 1).isoformat()
+        conn.execute(text(
+            f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        ))
+        conn.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            f"WHERE timestamp >= :start AND timestamp < :end RETURNING {COLUMNS}) "
+            f"INSERT INTO {name} ({COLUMNS}) SELECT {COLUMNS} FROM moved"
+        ), {"start": start, "end": end})
+        conn.execute(text(self._attach_sql(name, month_start)))
+
+    @staticmethod
+    def _attach_sql(name: str, month_start: date) -> str:
+        start, end = month_start.isoformat(), add_months(month_start, 1).isoformat()
+        return f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+
+
+def main():
+    from ..core.database import engine
+
+    parser = argparse.ArgumentParser(description="Trazabilidad partition maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List attached monthly partitions")
+    ensure = subparsers.add_parser("ensure", help="Create upcoming monthly partitions")
+    ensure.add_argument("--months-ahead", type=int, default=settings.AUDIT_PARTITION_MONTHS_AHEAD)
+    archive = subparsers.add_parser("archive", help="Detach and export partitions past retention")
+    archive.add_argument("--retention-months", type=int, default=settings.AUDIT_RETENTION_MONTHS)
+    archive.add_argument("--archive-dir", default=settings.AUDIT_ARCHIVE_DIR)
+    attach = subparsers.add_parser("attach", help="Re-attach an exported partition")
+    attach.add_argument("archive_file")
+    drop = subparsers.add_parser("drop", help="Detach and drop a partition restored with attach")
+    drop.add_argument("partition")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    manager = AuditPartitionManager(engine, archive_dir=getattr(args, "archive_dir", settings.AUDIT_ARCHIVE_DIR))
+    if not manager.is_partitioned():
+        raise SystemExit("trazabilidad is not partitioned; run `alembic upgrade head` first.")
+
+    if args.command == "list":
+        for partition in manager.list_partitions():
+            marker = "\trestored" if partition.restored else ""
+            print(f"{partition.name}\t{partition.start}\t{partition.end}{marker}")
+    elif args.command == "ensure":
+        for name in manager.ensure_future_partitions(args.months_ahead):
+            print(f"created {name}")
+    elif args.command == "archive":
+        for path in manager.archive_old_partitions(args.retention_months):
+            print(f"archived {path}")
+    elif args.command == "attach":
+        print(f"attached {manager.attach_archive(args.archive_file)}")
+    elif args.command == "drop":
+        manager.drop_restored(args.partition)
+        print(f"dropped {args.partition}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Bulk operations over many expedientes (yearly closures, reassignments).
+
+A job is created with its selection (explicit IDs and/or filters) and then
+run in the background. The selection is walked in primary-key order in
+chunks; each chunk is one set-based UPDATE ... RETURNING, one multi-row audit
+INSERT and one progress update, committed together. Closing also deletes the
+pending deadline timers of the closed expedientes in the same chunk. Advancing
+completes one pending step per expediente through the workflow engine (the
+same path as completing it by hand), still committing once per chunk; each
+expediente runs in its own SAVEPOINT, so one that fails is rolled back alone
+and recorded in the job's ``errores`` while the rest of the chunk goes on.
+"""
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.expediente import Expediente, EstadoExpediente, PasoTramitacion, EstadoPaso
+from ..models.operacion_masiva import OperacionMasiva
+from ..models.temporizador import Temporizador
+from ..models.user import User
+from .audit import AuditTrail
+from .timers import TIPO_PLAZO_PASO
+from .workflow import WorkflowService
+from .workflow_definitions import get_compiled_workflow, latest_definition
+
+logger = logging.getLogger(__name__)
+
+CERRAR = "CERRAR"
+REASIGNAR = "REASIGNAR"
+INICIAR = "INICIAR"
+AVANZAR = "AVANZAR"
+
+# Per-expediente failures kept on a job; the rest are only logged
+MAX_JOB_ERRORS = 1000
+
+
+def _selection_filters(seleccion: Dict[str, Any]) -> list:
+    filters = []
+    if seleccion.get("ids"):
+        filters.append(Expediente.id.in_(seleccion["ids"]))
+    if seleccion.get("estado"):
+        filters.append(Expediente.estado == EstadoExpediente(seleccion["estado"]))
+    if seleccion.get("responsable_id") is not None:
+        filters.append(Expediente.responsable_id == seleccion["responsable_id"])
+    if seleccion.get("creado_antes"):
+        filters.append(Expediente.fecha_creacion < datetime.fromisoformat(seleccion["creado_antes"]))
+    return filters
+
+
+class BulkOperationService:
+    """Creates and runs bulk operation jobs."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.audit = AuditTrail(db)
+        self.workflow = WorkflowService(db)
+
+    def create_job(self, operacion: str, seleccion: Dict[str, Any], argumentos: Dict[str, Any],
+                   user_id: Optional[int]) -> OperacionMasiva:
+        """Validates the request and stores a pending job; `seleccion` must be JSON-serializable."""
+        try:
+            filters = _selection_filters(seleccion)
+        except ValueError:
+            raise ValueError(f"Invalid estado: {seleccion.get('estado')}")
+
+        if operacion == REASIGNAR:
+            if not self.db.query(User.id).filter(User.id == argumentos["responsable_id"]).first():
+                raise LookupError("Responsable not found")
+        elif operacion == INICIAR and argumentos.get("definicion"):
+            if not latest_definition(self.db, argumentos["definicion"]):
+                raise LookupError(f"Workflow definition '{argumentos['definicion']}' not found")
+
+        job = OperacionMasiva(
+            id=str(uuid.uuid4()),
+            operacion=operacion,
+            estado="PENDIENTE",
+            parametros={"seleccion": seleccion, "argumentos": argumentos},
+            total=self.db.query(func.count(Expediente.id)).filter(*filters).scalar(),
+            user_id=user_id,
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def run_job(self, job_id: str, chunk_size: int = settings.BULK_CHUNK_SIZE) -> OperacionMasiva:
+        """Runs a pending job to completion, committing progress after every chunk."""
+        job = self.db.get(OperacionMasiva, job_id)
+        if job is None:
+            raise ValueError(f"Bulk job {job_id} not found")
+        job.estado = "EN_CURSO"
+        self.db.commit()
+
+        last_id = 0
+        errors: List[Dict[str, Any]] = []
+        try:
+            apply_chunk = self._operation(job, errors)
+            for ids in self._chunks(job.parametros["seleccion"], chunk_size):
+                reported = len(errors)
+                affected = apply_chunk(ids) if ids else []
+                progress: Dict[str, Any] = {
+                    "procesados": OperacionMasiva.procesados + len(ids),
+                    "afectados": OperacionMasiva.afectados + len(affected),
+                }
+                if len(errors) > reported:
+                    progress["errores"] = list(errors)
+                self.db.execute(
+                    update(OperacionMasiva)
+                    .where(OperacionMasiva.id == job_id)
+                    .values(**progress)
+                    .execution_options(synchronize_session=False)
+                )
+                self.db.commit()
+                last_id = ids[-1] if ids else last_id
+            estado, error = "COMPLETADA", None
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Bulk job {job_id} ({job.operacion}) failed after id {last_id}: {e}")
+            estado, error = "FALLIDA", str(e)
+
+        job = self.db.get(OperacionMasiva, job_id, populate_existing=True)
+        job.estado = estado
+        job.error = error
+        job.finished_at = datetime.now()
+        self.db.commit()
+        self.db.refresh(job)
+        logger.info(f"Bulk job {job_id} {estado}: {job.afectados}/{job.total} expedientes changed")
+        return job
+
+    def _chunks(self, seleccion: Dict[str, Any], chunk_size: int) -> Iterator[List[int]]:
+        """
+        Selected ids in primary-key order, `chunk_size` at a time.
+
+        Explicit ids are split in Python, so each query binds only its own
+        chunk (a chunk may come back shorter, or empty, when other criteria
+        exclude some of them); filter-only selections are walked by keyset.
+        """
+        filters = _selection_filters({**seleccion, "ids": None})
+        if seleccion.get("ids"):
+            explicit = sorted(set(seleccion["ids"]))
+            for start in range(0, len(explicit), chunk_size):
+                yield self.db.execute(
+                    select(Expediente.id)
+                    .where(*filters, Expediente.id.in_(explicit[start:start + chunk_size]))
+                    .order_by(Expediente.id)
+                ).scalars().all()
+            return
+
+        last_id = 0
+        while True:
+            ids = self.db.execute(
+                select(Expediente.id)
+                .where(*filters, Expediente.id > last_id)
+                .order_by(Expediente.id)
+                .limit(chunk_size)
+            ).scalars().all()
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+
+    def _operation(self, job: OperacionMasiva, errors: List[Dict[str, Any]]) -> Callable[[List[int]], List[int]]:
+        argumentos = job.parametros["argumentos"]
+        if job.operacion == CERRAR:
+            return lambda ids: self._cerrar(ids, job)
+        if job.operacion == REASIGNAR:
+            return lambda ids: self._reasignar(ids, argumentos["responsable_id"], job)
+        if job.operacion == INICIAR:
+            return self._iniciar_factory(argumentos.get("definicion"), argumentos.get("variables"), job)
+        if job.operacion == AVANZAR:
+            return lambda ids: self._avanzar(ids, argumentos.get("nodo_id"), argumentos.get("comentarios"),
+                                             argumentos.get("variables"), job, errors)
+        raise ValueError(f"Unknown bulk operation: {job.operacion}")
+
+    def _update_returning_ids(self, ids: List[int], guard, values: Dict[str, Any]) -> List[int]:
+        return self.db.execute(
+            update(Expediente)
+            .where(Expediente.id.in_(ids), guard)
+            .values(**values)
+            .returning(Expediente.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+
+    def _record(self, ids: List[int], action: str, description: str, job: OperacionMasiva,
+                metadata: Optional[dict] = None):
+        # Buffered and written with one INSERT when the chunk commits
+        for expediente_id in ids:
+            self.audit.record(
+                expediente_id,
+                action,
+                description,
+                user_id=job.user_id,
+                metadata={"operacion_masiva": job.id, **(metadata or {})},
+            )
+
+    def _cerrar(self, ids: List[int], job: OperacionMasiva) -> List[int]:
+        closed = self._update_returning_ids(
+            ids,
+            Expediente.estado.notin_([EstadoExpediente.CERRADO, EstadoExpediente.ANULADO]),
+            {"estado": EstadoExpediente.CERRADO, "fecha_cierre": datetime.now()},
+        )
+        if closed:
+            # Deadlines of steps left pending must not fire PLAZO_VENCIDO on a closed expediente
+            self.db.execute(
+                delete(Temporizador)
+                .where(Temporizador.expediente_id.in_(closed), Temporizador.tipo == TIPO_PLAZO_PASO,
+                       Temporizador.fired_at.is_(None))
+                .execution_options(synchronize_session=False)
+            )
+        self._record(closed, "EXPEDIENTE_CERRADO", "Cierre masivo.", job)
+        return closed
+
+    def _reasignar(self, ids: List[int], responsable_id: int, job: OperacionMasiva) -> List[int]:
+        reassigned = self._update_returning_ids(
+            ids,
+            or_(Expediente.responsable_id.is_(None), Expediente.responsable_id != responsable_id),
+            {"responsable_id": responsable_id},
+        )
+        self._record(reassigned, "RESPONSABLE_REASIGNADO", "Reasignación masiva.", job,
+                     {"responsable_id": responsable_id})
+        return reassigned
+
+    def _avanzar(self, ids: List[int], nodo_id: Optional[str], comentarios: Optional[str],
+                 variables: Optional[Dict[str, Any]], job: OperacionMasiva,
+                 errors: List[Dict[str, Any]]) -> List[int]:
+        """Completes the pending step `nodo_id` (or the first pending step) of each expediente in process."""
+        query = (
+            select(PasoTramitacion.expediente_id, PasoTramitacion.id)
+            .join(Expediente, Expediente.id == PasoTramitacion.expediente_id)
+            .where(PasoTramitacion.expediente_id.in_(ids), PasoTramitacion.estado != EstadoPaso.COMPLETADO,
+                   Expediente.estado == EstadoExpediente.EN_PROCESO)
+            .order_by(PasoTramitacion.expediente_id, PasoTramitacion.numero_paso, PasoTramitacion.id)
+        )
+        if nodo_id:
+            query = query.where(PasoTramitacion.nodo_id == nodo_id)
+        pasos: Dict[int, int] = {}
+        for expediente_id, paso_id in self.db.execute(query):
+            pasos.setdefault(expediente_id, paso_id)
+
+        advanced = []
+        for expediente_id, paso_id in pasos.items():
+            try:
+                with self.audit.savepoint():
+                    self.workflow._complete(expediente_id, paso_id, job.user_id, comentarios, variables)
+            except Exception as e:
+                logger.warning(f"Bulk job {job.id}: expediente {expediente_id} not advanced: {e}")
+                if len(errors) < MAX_JOB_ERRORS:
+                    errors.append({"expediente_id": expediente_id, "error": str(e)})
+                continue
+            advanced.append(expediente_id)
+        return advanced
+
+    def _iniciar_factory(self, codigo: Optional[str], variables: Optional[Dict[str, Any]],
+                         job: OperacionMasiva) -> Callable[[List[int]], List[int]]:
+        values: Dict[str, Any] = {"estado": EstadoExpediente.EN_PROCESO}
+        activated, metadata = [], None
+        if codigo:
+            definicion = latest_definition(self.db, codigo)
+            if not definicion:
+                raise ValueError(f"Workflow definition '{codigo}' not found")
+            # Same definition and variables for every expediente: compute the start state once
+            advance = get_compiled_workflow(self.db, definicion.id).start(variables)
+            values.update(definicion_flujo_id=definicion.id, estado_flujo=advance.state)
+            activated = advance.activated
+            metadata = {"definicion": definicion.codigo, "version": definicion.version}
+
+        def iniciar(ids: List[int]) -> List[int]:
+            started = self._update_returning_ids(ids, Expediente.estado == EstadoExpediente.ABIERTO, values)
+            if started and activated:
+                now = datetime.now()
+                self.db.execute(insert(PasoTramitacion).values([
+                    {
+                        "expediente_id": expediente_id,
+                        "numero_paso": task.numero_paso,
+                        "titulo": task.titulo,
+                        "descripcion": task.descripcion,
+                        "nodo_id": task.node_id,
+                        "estado": EstadoPaso.PENDIENTE,
+                        "datetime_inicio": now,
+                    }
+                    for expediente_id in started
+                    for task in activated
+                ]))
+            self._record(started, "WORKFLOW_INICIADO", "Tramitación iniciada (operación masiva).", job, metadata)
+            return started
+
+        return iniciar
+
+
+def run_bulk_job(job_id: str):
+    """Background entry point: runs a job on its own session."""
+    db = SessionLocal()
+    try:
+        BulkOperationService(db).run_job(job_id)
+    finally:
+        db.close()
@@ -0,0 +1,109 @@
+"""
+Filtering documents by the metadata the LLM extracted, entirely in SQL.
+
+- Type, date and amount use the typed columns filled from validated
+  extractions (``tipo_extraido``, ``fecha_documento``, ``importe``).
+- ``emisor`` is a case-insensitive prefix match on ``lower(emisor)``.
+- ``nif`` uses the expression index on ``metadatos_extraidos ->> 'nif_emisor'``.
+- Any other extracted key (``numero_factura``, ``sentido``,
+  ``revision_manual``...) is matched by containment
+  (``metadatos_extraidos @> '{"clave": valor}'``) on PostgreSQL, which the
+  GIN index serves; other databases compare the extracted value as text.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy import String, bindparam, func, nulls_last, or_, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+
+from ..models.expediente import Documento
+
+
+def parse_metadata_filters(items: List[str]) -> Dict[str, str]:
+    """``["sentido:favorable", "numero_factura:F-12"]`` -> {"sentido": "favorable", ...}; raises ValueError."""
+    filters = {}
+    for item in items:
+        key, sep, value = item.partition(":")
+        if not sep or not key.strip():
+            raise ValueError(f"Invalid metadata filter: {item} (expected clave:valor)")
+        filters[key.strip()] = value.strip()
+    return filters
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class DocumentFilterService:
+    """Builds and runs document queries on extracted metadata."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _metadata_text(self, key: str):
+        """``metadatos_extraidos ->> key``, with the key inlined on PostgreSQL so expression indexes match."""
+        if self.db.get_bind().dialect.name == "postgresql":
+            key = bindparam(f"key_{key}", key, type_=String, literal_execute=True)
+        return Documento.metadatos_extraidos[key].as_string()
+
+    def _metadata_equals(self, key: str, value: str):
+        # "true" or "12" may be stored as JSON booleans/numbers or as strings
+        try:
+            typed = json.loads(value)
+        except ValueError:
+            typed = value
+        if isinstance(typed, (dict, list)):
+            typed = value
+        if self.db.get_bind().dialect.name == "postgresql":
+            metadata = type_coerce(Documento.metadatos_extraidos, JSONB)
+            if typed == value:
+                return metadata.contains({key: value})
+            return or_(metadata.contains({key: typed}), metadata.contains({key: value}))
+        if isinstance(typed, bool):
+            return Documento.metadatos_extraidos[key].as_boolean() == typed
+        return self._metadata_text(key) == value
+
+    def filter_documents(
+        self,
+        expediente_id: Optional[int] = None,
+        tipo: Optional[str] = None,
+        emisor: Optional[str] = None,
+        nif: Optional[str] = None,
+        fecha_desde: Optional[date] = None,
+        fecha_hasta: Optional[date] = None,
+        importe_min: Optional[Decimal] = None,
+        importe_max: Optional[Decimal] = None,
+        metadata: Optional[Dict[str, str]] = None,
+        skip: int = 0,
+        limit: int = 50,
+    ) -> List[Documento]:
+        """Documents matching every given filter, most recent document date first."""
+        query = self.db.query(Documento)
+        if expediente_id is not None:
+            query = query.filter(Documento.expediente_id == expediente_id)
+        if tipo:
+            query = query.filter(Documento.tipo_extraido == tipo)
+        if emisor:
+            query = query.filter(func.lower(Documento.emisor).like(f"{_escape_like(emisor.lower())}%", escape="\\"))
+        if nif:
+            query = query.filter(self._metadata_text("nif_emisor") == nif.upper())
+        if fecha_desde:
+            query = query.filter(Documento.fecha_documento >= fecha_desde)
+        if fecha_hasta:
+            query = query.filter(Documento.fecha_documento <= fecha_hasta)
+        if importe_min is not None:
+            query = query.filter(Documento.importe >= importe_min)
+        if importe_max is not None:
+            query = query.filter(Documento.importe <= importe_max)
+        for key, value in (metadata or {}).items():
+            query = query.filter(self._metadata_equals(key, value))
+
+        return (
+            query.order_by(nulls_last(Documento.fecha_documento.desc()), Documento.id.desc())
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
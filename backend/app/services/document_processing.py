@@ -1,13 +1,22 @@
 import io
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Set, Tuple
 from pypdf import PdfReader
 from sqlalchemy.orm import Session
 from datetime import datetime
-import json
 
-from ..models.expediente import Documento, Trazabilidad, Expediente
-from .ollama_service import OllamaService
+from ..core.config import settings
+from ..core.metrics import pipeline_stage
+from ..core.tracing import span
+from ..models.expediente import Documento
+from ..schemas.extraccion import validate_extraction
+from .audit import AuditTrail
+from .ocr import OCRService
+from .ocr_quality import score_pages
+from .excerpt import PAGE_BREAK
+from .extraction_cache import ExtractionCache
+from .llm_scheduler import LLMUnavailable
+from .ollama_service import PROMPT_VERSION, OllamaService
 
 logger = logging.getLogger(__name__)
 
@@ -17,12 +26,19 @@ class DocumentProcessingService:
     def __init__(self, db: Session):
         self.db = db
         self.ollama = OllamaService()
+        self.audit = AuditTrail(db)
+        self.ocr = OCRService(db)
+        self.extraction_cache = ExtractionCache(db)
 
     def process_pdf_content(self, document_id: int, user_id: int) -> Dict[str, Any]:
         """
-        Extracts text from a PDF document and runs LLM analysis.
+        Extracts text from a PDF or image document and runs LLM analysis.
         Updates the document record with metadata.
         """
+        with span("document.process", **{"documento.id": document_id}):
+            return self._process_pdf_content(document_id, user_id)
+
+    def _process_pdf_content(self, document_id: int, user_id: int) -> Dict[str, Any]:
         doc = self.db.query(Documento).filter(Documento.id == document_id).first()
         if not doc:
             raise ValueError("Document not found")
@@ -32,58 +48,136 @@ class DocumentProcessingService:
             return {"error": "No content to process"}
 
         try:
-            # 1. Extract text from PDF
+            # 1. Extract text (text layer, OCR for scanned pages and images)
             logger.info(f"Extracting text from document {document_id} ({doc.nombre})...")
-            text = self._extract_text_from_pdf(doc.contenido_blob)
+            with pipeline_stage("extract_text"):
+                pages, ocr_pages = self._extract_pages(doc.contenido_blob)
             
-            if not text:
+            if not any(pages):
                 logger.warning(f"No text extracted from document {document_id}.")
                 return {"error": "Failed to extract text"}
 
-            # 2. Analyze text via Ollama
+            # 1b. Only legible pages go to the LLM; if none is, leave it for manual review.
+            # Dictionary hits only judge OCR output: a native text layer is dropped only if illegible
+            scores = score_pages(pages, dictionary=[i in ocr_pages for i in range(len(pages))])
+            low_quality = [i + 1 for i, score in enumerate(scores) if score < settings.OCR_MIN_QUALITY_SCORE]
+            text = PAGE_BREAK.join(p for p, score in zip(pages, scores) if score >= settings.OCR_MIN_QUALITY_SCORE).strip()
+            if not text:
+                logger.warning(f"OCR quality too low for LLM analysis of document {document_id}.")
+                review = {"revision_manual": True, "calidad_ocr": round(float(scores.max()), 2)}
+                doc.metadatos_extraidos = review
+                self._log_action(doc.expediente_id, user_id, "IA_ANALYSIS_SKIPPED",
+                                f"Calidad OCR insuficiente en '{doc.nombre}'; requiere revisión manual.",
+                                {"paginas_baja_calidad": low_quality})
+                self.db.commit()
+                return {"error": "OCR quality too low", **review}
+
+            # 2. Analyze text via Ollama (identical texts are analyzed once)
             logger.info(f"Analyzing text with LLM for document {document_id}...")
-            metadata = self.ollama.analyze_document_text(text)
+            with pipeline_stage("llm_analysis"):
+                metadata = self.extraction_cache.get_or_compute(
+                    text, self.ollama.model, PROMPT_VERSION, lambda: self.ollama.analyze_document_text(text)
+                )
             
             # 2b. Generate Embedding for Phase 5
             logger.info(f"Generating embedding for document {document_id}...")
-            embedding = self.ollama.generate_embedding(text)
+            with pipeline_stage("embedding"):
+                embedding = self.ollama.generate_embedding(text)
             if embedding:
                 doc.embedding = embedding
 
             # 3. Update document metadata
-            doc.metadatos_extraidos = json.dumps(metadata)
+            doc.metadatos_extraidos = metadata
+            self._apply_extraction(doc, metadata)
             
             # Log action in Audit Trail
             self._log_action(doc.expediente_id, user_id, "IA_ANALYSIS_COMPLETED", 
                             f"Análisis IA completado para '{doc.nombre}'.", 
-                            {"metadata": metadata})
+                            {"metadata": metadata, "paginas_baja_calidad": low_quality})
 
-            self.db.commit()
+            with pipeline_stage("persist"):
+                self.db.commit()
             return metadata
 
+        except LLMUnavailable as e:
+            # Ollama overloaded or failing: mark the document so its analysis can be run again later
+            logger.warning(f"LLM unavailable, analysis of document {document_id} deferred: {e!r}")
+            pending = {"pendiente_ia": True, "motivo": type(e).__name__}
+            doc.metadatos_extraidos = pending
+            self._log_action(doc.expediente_id, user_id, "IA_ANALYSIS_DEFERRED",
+                            f"Análisis IA de '{doc.nombre}' pendiente: servicio de IA no disponible.", pending)
+            self.db.commit()
+            return {"error": "LLM unavailable", **pending}
+
         except Exception as e:
             logger.error(f"Error processing document {document_id}: {e}")
             return {"error": str(e)}
 
-    def _extract_text_from_pdf(self, content_blob: bytes) -> str:
-        """Helper to extract text from PDF using pypdf."""
+    def _extract_pages(self, content_blob: bytes) -> Tuple[List[str], Set[int]]:
+        """
+        Text of each page of a PDF, or OCR text of a JPEG/PNG image (one page),
+        and the indices of the pages whose text comes from OCR.
+        """
+        if b"%PDF" in content_blob[:1024]:  # The header may follow a few junk bytes
+            return self._extract_pages_from_pdf(content_blob)
+        if content_blob.startswith((b"\xff\xd8\xff", b"\x89PNG")):
+            if not self.ocr.enabled:
+                return [], set()
+            try:
+                with pipeline_stage("ocr"):
+                    return [self.ocr.ocr_image(content_blob)], {0}
+            except Exception as e:
+                logger.error(f"Image OCR error: {e}")
+                return [], set()
+        logger.warning("Unsupported document format for text extraction")
+        return [], set()
+
+    def _extract_pages_from_pdf(self, content_blob: bytes) -> Tuple[List[str], Set[int]]:
+        """
+        Helper to extract page texts from PDF using pypdf.
+
+        Pages whose text layer is missing or illegible (scored without the
+        dictionary factor, which would penalize clean text in other languages)
+        are OCR'd; the OCR text replaces it when it scores higher.
+        """
         try:
             reader = PdfReader(io.BytesIO(content_blob))
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+            texts = [(page.extract_text() or "").strip() for page in reader.pages]
         except Exception as e:
             logger.error(f"PDF extraction error: {e}")
-            return ""
+            return [], set()
+
+        scores = score_pages(texts, dictionary=[False] * len(texts))
+        ocr_pages = set()
+        retry = {i: reader.pages[i] for i, score in enumerate(scores) if score < settings.OCR_MIN_QUALITY_SCORE}
+        if retry and self.ocr.enabled:
+            logger.info(f"{len(retry)} of {len(texts)} pages have no usable text layer, running OCR")
+            try:
+                with pipeline_stage("ocr"):
+                    ocr_texts = self.ocr.ocr_pdf_pages(content_blob, retry)
+                indices = list(ocr_texts)
+                for index, score in zip(indices, score_pages([ocr_texts[i] for i in indices])):
+                    # Ties (e.g. two illegible versions) keep the longer text for manual review
+                    if (score, len(ocr_texts[index])) > (scores[index], len(texts[index])):
+                        texts[index] = ocr_texts[index]
+                        ocr_pages.add(index)
+            except Exception as e:
+                logger.error(f"OCR error: {e}")
+
+        return texts, ocr_pages
+
+    def _apply_extraction(self, doc: Documento, metadata: Dict[str, Any]):
+        """Fills the typed columns from validated metadata; failed extractions leave them empty."""
+        try:
+            extraction = validate_extraction(metadata)
+        except ValueError:
+            return
+        doc.tipo_extraido = extraction.tipo_documento
+        doc.fecha_documento = extraction.fecha
+        doc.emisor = extraction.emisor
+        doc.receptor = extraction.receptor
+        doc.importe = extraction.monto
 
     def _log_action(self, expediente_id: int, user_id: int, action: str, description: str, metadata: dict):
-        """Log event to audit trail."""
-        log = Trazabilidad(
-            expediente_id=expediente_id,
-            user_id=user_id,
-            accion=action,
-            descripcion=description,
-            metadata_json=json.dumps(metadata)
-        )
-        self.db.add(log)
+        """Log event to audit trail (informational: written by the background writer when it runs)."""
+        self.audit.record(expediente_id, action, description, user_id=user_id, metadata=metadata, critical=False)
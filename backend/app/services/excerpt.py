@@ -0,0 +1,109 @@
+"""
+Excerpts of document text for LLM metadata extraction.
+
+Sending a whole document makes generation slow, and sending only its first
+characters misses what usually comes at the end (totals, signature block).
+:func:`build_excerpt` picks lines within a token budget
+(``LLM_EXCERPT_MAX_TOKENS``), in this order:
+
+1. The start of the first page (type of document, sender, recipient).
+2. The end of the last page (totals, place and date, signature).
+3. Lines anywhere with currency amounts, dates or NIF/CIF numbers, those
+   with more kinds of data first.
+4. Remaining budget: further lines from the start.
+
+Lines longer than 400 characters, or than the tail's share of a small
+budget, are split into chunks at spaces: text layers often have no line
+breaks at all, and the end of such a page and its chunks with data must
+still be selectable. Chosen lines are returned in document order, with
+``[...]`` where lines were skipped. Selection is deterministic, so the same
+text always yields the same prompt (and the same extraction cache key).
+"""
+import re
+from typing import Iterator, List, Optional, Sequence
+
+from ..core.config import settings
+
+PAGE_BREAK = "\f"
+CHARS_PER_TOKEN = 4  # Rough average for Spanish text with llama-family tokenizers
+GAP = "[...]"
+
+_HEAD_SHARE = 0.4
+_TAIL_SHARE = 0.2
+_MAX_LINE_CHARS = 400
+
+_MONTHS = "enero|febrero|marzo|abril|mayo|junio|julio|agosto|se?ptiembre|octubre|noviembre|diciembre"
+_SIGNALS = re.compile(
+    r"(?P<amount>(?i:(?:€|eur\b|euros?\b)\s*\d|\d(?:[\d.,]*\d)?\s*(?:€|eur\b|euros?\b))|\b\d{1,3}(?:\.\d{3})+,\d{2}\b)"
+    r"|(?P<date>\b\d{1,2}[/.-]\d{1,2}[/.-](?:\d{4}|\d{2})\b|\b\d{4}-\d{2}-\d{2}\b"
+    rf"|(?i:\b\d{{1,2}}\s+de\s+(?:{_MONTHS})\b))"
+    r"|(?P<nif>\b(?:\d{8}-?[A-HJ-NP-TV-Z]|[XYZ]-?\d{7}-?[A-HJ-NP-TV-Z]|[ABCDEFGHJNPQRSUVW]-?\d{7}[0-9A-J])\b)"
+)
+
+
+def signal_kinds(line: str) -> int:
+    """Number of distinct kinds of data (amount, date, NIF/CIF) in a line."""
+    return len({match.lastgroup for match in _SIGNALS.finditer(line)})
+
+
+def _chunks(line: str, size: int) -> Iterator[str]:
+    """`line` in pieces of at most `size` characters, cut at a space where there is one."""
+    while len(line) > size:
+        cut = line.rfind(" ", 0, size + 1)
+        if cut <= 0:
+            cut = size
+        yield line[:cut].rstrip()
+        line = line[cut:].lstrip()
+    if line:
+        yield line
+
+
+def build_excerpt(pages: Sequence[str], max_tokens: Optional[int] = None) -> str:
+    """Highest-value lines of the pages within `max_tokens` (whole text if it fits)."""
+    budget = (max_tokens or settings.LLM_EXCERPT_MAX_TOKENS) * CHARS_PER_TOKEN
+    pages = [page.strip() for page in pages if page.strip()]
+    full = "\n".join(pages)
+    if len(full) <= budget:
+        return full
+
+    chunk_size = max(1, min(_MAX_LINE_CHARS, int(budget * _TAIL_SHARE)))  # Head and tail get a chunk or more
+    lines: List[str] = []
+    first_page_end = last_page_start = 0
+    for number, page in enumerate(pages):
+        last_page_start = len(lines)
+        lines.extend(chunk for line in page.splitlines() for chunk in _chunks(line.strip(), chunk_size))
+        if number == 0:
+            first_page_end = len(lines)
+
+    chosen = set()
+    used = 0
+
+    def take(indices, limit: float, contiguous: bool):
+        nonlocal used
+        for i in indices:
+            if i in chosen:
+                continue
+            cost = len(lines[i]) + 1
+            if used + cost > limit:
+                if contiguous:
+                    return
+                continue
+            chosen.add(i)
+            used += cost
+
+    take(range(first_page_end), budget * _HEAD_SHARE, contiguous=True)
+    take(range(len(lines) - 1, last_page_start - 1, -1), used + budget * _TAIL_SHARE, contiguous=True)
+    scored = [(kinds, i) for i, kinds in enumerate(map(signal_kinds, lines)) if kinds]
+    take((i for _, i in sorted(scored, key=lambda item: (-item[0], item[1]))), budget, contiguous=False)
+    take(range(len(lines)), budget, contiguous=True)
+
+    excerpt = []
+    previous = -1
+    for i in sorted(chosen):
+        if i != previous + 1:
+            excerpt.append(GAP)
+        excerpt.append(lines[i])
+        previous = i
+    if previous != len(lines) - 1:
+        excerpt.append(GAP)
+    return "\n".join(excerpt)
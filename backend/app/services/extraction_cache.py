@@ -0,0 +1,149 @@
+"""
+Persistent cache of LLM metadata extraction, keyed by content.
+
+The key is a SHA-256 of the whitespace-normalized text, the model and the
+prompt version (``PROMPT_VERSION`` in ``ollama_service``), so the same
+document uploaded to many expedientes is analyzed once, and changing the
+prompt or the model starts a fresh cache.
+
+Concurrent misses for the same key within a process wait for the first one
+(single flight) instead of generating in parallel. Only usable results are
+stored: empty answers, errors and unparsable responses are retried next
+time. Storing, eviction and hit counting (one ``UPDATE ... SET hits =
+hits + 1``) each run in their own short transaction, so concurrent hits
+neither lose counts nor keep the hot row locked, and the document's session
+is never committed by the cache. Every ``_EVICT_EVERY`` writes, rows unused for
+``LLM_CACHE_MAX_AGE_DAYS`` and the least recently used rows beyond
+``LLM_CACHE_MAX_ENTRIES`` are deleted.
+"""
+import hashlib
+import itertools
+import logging
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.metrics import LLM_CACHE_REQUESTS
+from ..models.extraccion import ExtraccionLLM
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_EVICT_EVERY = 500
+_writes = itertools.count(1)
+
+# Keys being generated in this process -> set when the result is stored
+_inflight: Dict[str, threading.Event] = {}
+_inflight_lock = threading.Lock()
+
+
+def cache_key(text: str, model: str, prompt_version: str) -> str:
+    normalized = _WHITESPACE.sub(" ", text).strip()
+    return hashlib.sha256(f"{model}\0{prompt_version}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def is_cacheable(metadata: Dict[str, Any]) -> bool:
+    return bool(metadata) and not ({"error", "raw_response"} & metadata.keys())
+
+
+class ExtractionCache:
+    """Looks up extraction results by content before calling the LLM."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_or_compute(
+        self, text: str, model: str, prompt_version: str, compute: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Cached metadata for `text`, or the result of `compute()` (stored when usable)."""
+        if not settings.LLM_CACHE_ENABLED:
+            return compute()
+
+        key = cache_key(text, model, prompt_version)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        with _inflight_lock:
+            event = _inflight.get(key)
+            leader = event is None
+            if leader:
+                event = _inflight[key] = threading.Event()
+
+        if not leader:
+            # Same text being analyzed by another request: wait for its result
+            event.wait(settings.LLM_BACKGROUND_MAX_WAIT_SECONDS)
+            cached = self._lookup(key)
+            if cached is not None:
+                return cached
+
+        LLM_CACHE_REQUESTS.labels("miss").inc()
+        try:
+            metadata = compute()
+            if is_cacheable(metadata):
+                self._store(key, model, prompt_version, metadata)
+            return metadata
+        finally:
+            if leader:
+                with _inflight_lock:
+                    _inflight.pop(key, None)
+                event.set()
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self.db.get(ExtraccionLLM, key)
+        if row is None:
+            return None
+        LLM_CACHE_REQUESTS.labels("hit").inc()
+        self._count_hit(key)
+        return dict(row.metadatos)
+
+    def _count_hit(self, key: str):
+        # Own connection and transaction: the caller's session may stay open for the whole document
+        try:
+            with self.db.get_bind().engine.begin() as conn:
+                conn.execute(
+                    update(ExtraccionLLM)
+                    .where(ExtraccionLLM.clave == key)
+                    .values(hits=ExtraccionLLM.hits + 1, last_used_at=datetime.now())
+                )
+        except SQLAlchemyError as e:
+            # Only eviction order depends on it
+            logger.warning(f"Could not record LLM extraction cache hit: {e}")
+
+    def _store(self, key: str, model: str, prompt_version: str, metadata: Dict[str, Any]):
+        # Own connection and transaction, like _count_hit: the document's session is left untouched
+        try:
+            with self.db.get_bind().engine.begin() as conn:
+                conn.execute(insert(ExtraccionLLM).values(
+                    clave=key, modelo=model, prompt_version=prompt_version, metadatos=metadata,
+                    hits=0, last_used_at=datetime.now(),
+                ))
+        except IntegrityError:
+            # Stored meanwhile by another process
+            return
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not store LLM extraction cache entry: {e}")
+            return
+        if next(_writes) % _EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """Deletes entries unused for LLM_CACHE_MAX_AGE_DAYS and the oldest beyond LLM_CACHE_MAX_ENTRIES."""
+        cutoff = datetime.now() - timedelta(days=settings.LLM_CACHE_MAX_AGE_DAYS)
+        with self.db.get_bind().engine.begin() as conn:
+            deleted = conn.execute(delete(ExtraccionLLM).where(ExtraccionLLM.last_used_at < cutoff)).rowcount
+            excess = conn.scalar(select(func.count()).select_from(ExtraccionLLM)) - settings.LLM_CACHE_MAX_ENTRIES
+            if excess > 0:
+                oldest = select(ExtraccionLLM.clave).order_by(ExtraccionLLM.last_used_at).limit(excess)
+                deleted += conn.execute(
+                    delete(ExtraccionLLM).where(ExtraccionLLM.clave.in_(oldest.scalar_subquery()))
+                ).rowcount
+        if deleted:
+            logger.info(f"Evicted {deleted} LLM extraction cache entries")
+        return deleted
@@ -0,0 +1,235 @@
+"""Background dependency health checks.
+
+Load balancers poll the health endpoints every few seconds, so they must
+never wait on a dependency. :class:`HealthMonitor` runs every probe (database,
+Ollama and its resident models, Keycloak JWKS and Redis when configured)
+concurrently, each under its own timeout, on a fixed interval in a background
+task, and keeps the last result as an immutable snapshot. The endpoints only
+read that snapshot.
+"""
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+from ..core.config import settings
+from ..core.database import engine
+from ..core.security import JWKS_URL
+from .model_keeper import model_keeper
+
+logger = logging.getLogger(__name__)
+
+# A probe returns a short detail string on success and raises on failure
+Probe = Callable[[], Awaitable[str]]
+
+
+@dataclass(frozen=True)
+class ProbeSpec:
+    name: str
+    probe: Probe
+    critical: bool  # Readiness fails when a critical dependency is down
+
+
+class HealthMonitor:
+    """Runs dependency probes concurrently in the background and caches the result."""
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self._probes: Dict[str, ProbeSpec] = {}
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def register(self, name: str, probe: Probe, critical: bool = False):
+        """Adds a dependency probe."""
+        self._probes[name] = ProbeSpec(name, probe, critical)
+
+    @property
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """Result of the last completed round of probes (None before the first one)."""
+        return self._snapshot
+
+    def is_ready(self) -> bool:
+        """True when the last round found every critical dependency up."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return False
+        return all(
+            check["ok"] for name, check in snapshot["checks"].items()
+            if name in self._probes and self._probes[name].critical
+        )
+
+    async def current(self) -> Dict[str, Any]:
+        """The cached snapshot, probing once if no round has completed yet."""
+        if self._snapshot is None:
+            if self._refresh_lock is None:
+                self._refresh_lock = asyncio.Lock()
+            async with self._refresh_lock:
+                if self._snapshot is None:
+                    await self.refresh()
+        return self._snapshot
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Runs every probe concurrently and replaces the snapshot."""
+        specs = list(self._probes.values())
+        results = await asyncio.gather(*(self._run_probe(spec) for spec in specs))
+        checks = {spec.name: result for spec, result in zip(specs, results)}
+        degraded = any(not check["ok"] for check in checks.values())
+        self._snapshot = {
+            "status": "degraded" if degraded else "healthy",
+            "checked_at": datetime.now().isoformat(timespec="seconds"),
+            "checks": checks,
+        }
+        return self._snapshot
+
+    async def _run_probe(self, spec: ProbeSpec) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(spec.probe(), self.timeout)
+            ok = True
+        except asyncio.TimeoutError:
+            ok, detail = False, f"error: timeout after {self.timeout:g}s"
+        except Exception as e:
+            ok, detail = False, f"error: {e}"
+        return {
+            "ok": ok,
+            "detail": detail,
+            "critical": spec.critical,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def start(self):
+        """Starts the probe loop on the running event loop."""
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="health-monitor")
+
+    async def stop(self):
+        """Cancels the probe loop."""
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                snapshot = await self.refresh()
+                if snapshot["status"] != "healthy":
+                    failing = [n for n, c in snapshot["checks"].items() if not c["ok"]]
+                    logger.warning(f"Health check degraded: {', '.join(failing)}")
+            except Exception as e:
+                logger.error(f"Health check round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+# Shared client for HTTP probes (connections are reused between rounds)
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(verify=settings.VERIFY_SSL)
+    return _http_client
+
+
+async def _http_ok(url: str) -> str:
+    response = await _client().get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"status {response.status_code}")
+    return "connected"
+
+
+# Unpooled engine for the database probe, created on first use
+_probe_engine: Optional[Engine] = None
+
+
+def _database_probe_engine() -> Engine:
+    """
+    The probe opens its own connection each round instead of borrowing one
+    from the application pool, and bounds it on the server side (connect
+    timeout and statement_timeout), so a probe abandoned by ``wait_for``
+    finishes on its own instead of holding a thread and a connection.
+    """
+    global _probe_engine
+    if _probe_engine is None:
+        connect_args = {}
+        if engine.dialect.name == "postgresql":
+            timeout = settings.HEALTH_PROBE_TIMEOUT_SECONDS
+            connect_args = {
+                "connect_timeout": max(1, math.ceil(timeout)),
+                "options": f"-c statement_timeout={int(timeout * 1000)}",
+            }
+        _probe_engine = create_engine(engine.url, poolclass=NullPool, connect_args=connect_args)
+    return _probe_engine
+
+
+def _select_one():
+    with _database_probe_engine().connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+async def check_database() -> str:
+    # The engine is synchronous: keep the event loop free
+    await asyncio.to_thread(_select_one)
+    return "connected"
+
+
+async def check_ollama() -> str:
+    return await _http_ok(f"{settings.OLLAMA_HOST}/api/tags")
+
+
+async def check_ollama_models() -> str:
+    return await model_keeper.status()
+
+
+async def check_keycloak() -> str:
+    return await _http_ok(JWKS_URL)
+
+
+async def check_redis() -> str:
+    url = urlparse(settings.REDIS_URL)
+    reader, writer = await asyncio.open_connection(url.hostname or "localhost", url.port or 6379)
+    try:
+        if url.password:
+            writer.write(f"AUTH {url.password}\r\n".encode())
+            await reader.readline()
+        writer.write(b"PING\r\n")
+        await writer.drain()
+        reply = await reader.readline()
+    finally:
+        writer.close()
+    if not reply.startswith(b"+PONG"):
+        raise RuntimeError(reply.decode(errors="replace").strip() or "no reply")
+    return "connected"
+
+
+health_monitor = HealthMonitor(
+    interval=settings.HEALTH_CHECK_INTERVAL_SECONDS,
+    timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS,
+)
+health_monitor.register("database", check_database, critical=True)
+health_monitor.register("ollama", check_ollama)
+health_monitor.register("ollama_models", check_ollama_models)
+health_monitor.register("keycloak", check_keycloak)
+if settings.REDIS_URL:
+    health_monitor.register("redis", check_redis)
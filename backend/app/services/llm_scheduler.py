@@ -0,0 +1,306 @@
+"""
+In-process scheduler for Ollama calls.
+
+Every call to Ollama takes a slot in a lane. A lane is a model, or a
+``model:operation`` pair when that pair has its own limit in
+``LLM_CONCURRENCY``; each lane allows a fixed number of concurrent calls.
+When a lane is full, callers queue by priority: interactive requests (the
+assistant, semantic search) go before background work (document analysis,
+embeddings of uploads), and FIFO within a class.
+
+Each waiter has a deadline (``LLM_INTERACTIVE_MAX_WAIT_SECONDS`` or
+``LLM_BACKGROUND_MAX_WAIT_SECONDS``). A waiter whose deadline passes leaves
+the queue with :class:`LLMQueueTimeout`, so a backlog of stale background
+jobs never holds a slot a user is waiting for.
+
+With ``LLM_ADAPTIVE_CONCURRENCY`` the configured limits are maxima and each
+lane adjusts its limit AIMD-style: +1 per window of calls that finish within
+``LLM_LATENCY_TOLERANCE`` times the fastest latency seen for the operation,
+halved (down to 1) when a call is slower, fails or times out. Latency is
+compared per processed token (prompt plus generated, as counted by Ollama)
+when the response reports them, so a long document is not mistaken for an
+overloaded server. When Ollama saturates, the backlog waits here instead of
+inside Ollama.
+
+:class:`CircuitBreaker` fails calls fast (:class:`LLMCircuitOpen`) after
+``LLM_CIRCUIT_FAILURE_THRESHOLD`` consecutive failures, and lets a single
+probe call through every ``LLM_CIRCUIT_RESET_SECONDS`` until one succeeds.
+
+Callers are synchronous (routes and background tasks run in the thread
+pool), so waiting blocks the calling thread and not the event loop.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from ..core.config import settings
+from ..core.metrics import LLM_CIRCUIT_STATE, LLM_CONCURRENCY_LIMIT, LLM_QUEUE_DEPTH, LLM_QUEUE_REJECTED, LLM_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class LLMUnavailable(Exception):
+    """The call was not sent to Ollama (overloaded or failing); callers should fail fast."""
+
+
+class LLMQueueTimeout(LLMUnavailable):
+    """The call waited for a slot past its deadline and was not sent."""
+
+
+class LLMCircuitOpen(LLMUnavailable):
+    """Ollama is failing and the circuit breaker is open."""
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """``"llama2=2,llama2:embedding=4"`` -> {"llama2": 2, "llama2:embedding": 4}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, value = item.rpartition("=")
+        limits[key.strip()] = int(value)
+    return limits
+
+
+class _Waiter:
+    __slots__ = ("priority", "deadline", "granted")
+
+    def __init__(self, priority: int, deadline: float):
+        self.priority = priority
+        self.deadline = deadline
+        self.granted = False
+
+
+class _Lane:
+    def __init__(self, name: str, max_limit: int):
+        self.name = name
+        self.max_limit = max_limit
+        self.limit = float(max_limit)  # AIMD-adjusted; admits int(limit) concurrent calls
+        self.active = 0
+        self.queue: List[tuple] = []  # (priority, seq, waiter)
+        self.baseline: Dict[str, float] = {}  # Fastest recent latency per operation
+        self.last_decrease = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return max(1, int(self.limit))
+
+
+class Slot:
+    """
+    Handle of a granted slot; mark it failed when the call errored or timed
+    out, and set `tokens` to the tokens Ollama processed when it reports them.
+    """
+
+    __slots__ = ("failed", "tokens")
+
+    def __init__(self):
+        self.failed = False
+        self.tokens: Optional[int] = None
+
+
+class LLMScheduler:
+    """Priority queues with a concurrency limit per model (or model and operation)."""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, int]] = None,
+        default_limit: int = 1,
+        adaptive: bool = False,
+        latency_tolerance: float = 2.0,
+    ):
+        self.limits = limits or {}
+        self.default_limit = default_limit
+        self.adaptive = adaptive
+        self.latency_tolerance = latency_tolerance
+        self._lanes: Dict[str, _Lane] = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    def lane_for(self, model: str, operation: str) -> str:
+        """Lane name for a call: "model:operation" if it has its own limit, else the model."""
+        model = model or "default"
+        base = model.split(":")[0]  # "llama2:latest" shares the "llama2" limit
+        for key in (f"{model}:{operation}", f"{base}:{operation}"):
+            if key in self.limits:
+                return key
+        return model if model in self.limits else base
+
+    def _lane(self, name: str) -> _Lane:
+        lane = self._lanes.get(name)
+        if lane is None:
+            lane = self._lanes[name] = _Lane(name, self.limits.get(name, self.default_limit))
+            LLM_CONCURRENCY_LIMIT.labels(name).set(lane.capacity)
+        return lane
+
+    @contextmanager
+    def slot(self, model: str, operation: str, priority: int = BACKGROUND, max_wait: Optional[float] = None):
+        """
+        Holds a concurrency slot for one call; raises LLMQueueTimeout after `max_wait` seconds queued.
+        The call's latency (or failure) feeds the lane's adaptive limit.
+        """
+        if max_wait is None:
+            max_wait = (settings.LLM_INTERACTIVE_MAX_WAIT_SECONDS if priority == INTERACTIVE
+                        else settings.LLM_BACKGROUND_MAX_WAIT_SECONDS)
+        name = self.lane_for(model, operation)
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        start = time.monotonic()
+        self._acquire(name, priority, start + max_wait, operation, label)
+        granted = time.monotonic()
+        LLM_QUEUE_WAIT.labels(operation, label).observe(granted - start)
+        slot = Slot()
+        outcome = None  # None: not sent, True: completed, False: failed
+        try:
+            yield slot
+            outcome = not slot.failed
+        except LLMUnavailable:
+            raise
+        except Exception:
+            outcome = False
+            raise
+        finally:
+            self._release(name, operation, outcome, time.monotonic() - granted, slot.tokens)
+
+    def _acquire(self, name: str, priority: int, deadline: float, operation: str, label: str):
+        with self._cond:
+            lane = self._lane(name)
+            if lane.active < lane.capacity and not lane.queue:
+                lane.active += 1
+                return
+
+            waiter = _Waiter(priority, deadline)
+            heapq.heappush(lane.queue, (priority, next(self._seq), waiter))
+            LLM_QUEUE_DEPTH.labels(label).inc()
+            try:
+                while not waiter.granted:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        lane.queue = [item for item in lane.queue if item[2] is not waiter]
+                        heapq.heapify(lane.queue)
+                        LLM_QUEUE_REJECTED.labels(operation, label, "deadline").inc()
+                        logger.warning(f"LLM call {operation} ({label}) dropped after waiting for lane {name}")
+                        raise LLMQueueTimeout(f"No Ollama slot for {operation} within its deadline")
+                    self._cond.wait(remaining)
+            finally:
+                LLM_QUEUE_DEPTH.labels(label).dec()
+
+    def _release(self, name: str, operation: str = "", outcome: Optional[bool] = None, latency: float = 0.0,
+                 tokens: Optional[int] = None):
+        with self._cond:
+            lane = self._lanes[name]
+            lane.active -= 1
+            if self.adaptive and outcome is not None:
+                self._adjust(lane, operation, outcome, latency, tokens)
+            now = time.monotonic()
+            # Hand free slots to the first waiters whose deadline has not passed
+            while lane.queue and lane.active < lane.capacity:
+                _, _, waiter = heapq.heappop(lane.queue)
+                if waiter.deadline > now:
+                    waiter.granted = True
+                    lane.active += 1
+            self._cond.notify_all()
+
+    def _adjust(self, lane: _Lane, operation: str, ok: bool, latency: float, tokens: Optional[int] = None):
+        """AIMD: additive increase on fast completions, multiplicative decrease on slow or failed ones."""
+        cost, key = latency, operation
+        if tokens:
+            cost, key = latency / tokens, f"{operation}/token"
+        baseline = lane.baseline.get(key)
+        if ok and (baseline is None or cost < baseline):
+            lane.baseline[key] = baseline = cost
+        elif ok:
+            # Let the baseline drift up slowly, so one lucky fast call does not pin it
+            lane.baseline[key] = baseline = baseline + (cost - baseline) * 0.01
+
+        if ok and cost <= baseline * self.latency_tolerance:
+            lane.limit = min(lane.max_limit, lane.limit + 1 / lane.limit)
+        else:
+            now = time.monotonic()
+            # Calls in flight when the lane degraded report together: only calls started
+            # after the last decrease may decrease the limit again
+            if now - latency < lane.last_decrease:
+                return
+            lane.last_decrease = now
+            lane.limit = max(1.0, lane.limit / 2)
+            logger.warning(
+                f"LLM lane {lane.name} {'slow' if ok else 'failed'} call ({latency:.1f}s), "
+                f"concurrency limit now {lane.capacity}"
+            )
+        LLM_CONCURRENCY_LIMIT.labels(lane.name).set(lane.capacity)
+
+    def stats(self) -> Dict[str, dict]:
+        """Active and queued calls per lane."""
+        with self._cond:
+            return {name: {"limit": lane.capacity, "active": lane.active, "queued": len(lane.queue)}
+                    for name, lane in self._lanes.items()}
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open (one probe) after the reset time."""
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0, name: str = "ollama"):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Raises LLMCircuitOpen while open and before the reset time; does not claim the probe."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_seconds:
+                raise LLMCircuitOpen(f"{self.name} is unavailable, retry later")
+
+    def before_call(self):
+        """Raises LLMCircuitOpen unless the call may go ahead (in half-open state, only the probe)."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        raise LLMCircuitOpen(f"{self.name} is unavailable, retry later")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit {self.name} closed, calls resumed")
+                self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.error(f"Circuit {self.name} opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    def _set_state(self, state: int):
+        self.state = state
+        LLM_CIRCUIT_STATE.labels(self.name).set(state)
+
+
+llm_scheduler = LLMScheduler(
+    parse_limits(settings.LLM_CONCURRENCY),
+    settings.LLM_DEFAULT_CONCURRENCY,
+    adaptive=settings.LLM_ADAPTIVE_CONCURRENCY,
+    latency_tolerance=settings.LLM_LATENCY_TOLERANCE,
+)
+ollama_breaker = CircuitBreaker(settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS)
@@ -0,0 +1,197 @@
+"""
+Ollama model warm-up and keep-alive.
+
+Ollama unloads a model ``keep_alive`` after its last request (5 minutes by
+default), and loading llama2 again takes tens of seconds. To avoid paying
+that on the first request after idle:
+
+- Every call sends a ``keep_alive`` chosen by operation
+  (``OLLAMA_KEEP_ALIVE_BY_OPERATION``, default ``OLLAMA_KEEP_ALIVE``).
+- :class:`ModelKeeper` loads the generation and embedding models at startup
+  (``OLLAMA_WARMUP_ON_STARTUP``) and, during working hours
+  (``OLLAMA_KEEP_WARM_HOURS`` on ``OLLAMA_KEEP_WARM_DAYS``, local time in
+  ``OLLAMA_KEEP_WARM_TIMEZONE``, not the container's UTC), re-sends an empty
+  request every ``OLLAMA_KEEP_WARM_INTERVAL_SECONDS`` with a keep-alive
+  longer than the interval, so the models stay resident. Outside those hours
+  models expire normally and free the GPU.
+
+An empty prompt only loads the model, so keeper requests cost no generation.
+"""
+import asyncio
+import logging
+from datetime import datetime, time as dtime, tzinfo
+from typing import Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+import httpx
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+GENERATE = "generate"
+EMBED = "embed"
+
+
+def parse_pairs(spec: str) -> Dict[str, str]:
+    """``"rag_answer=30m,embedding=30m"`` -> {"rag_answer": "30m", "embedding": "30m"}."""
+    pairs = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, value = item.partition("=")
+        pairs[key.strip()] = value.strip()
+    return pairs
+
+
+_KEEP_ALIVE_BY_OPERATION = parse_pairs(settings.OLLAMA_KEEP_ALIVE_BY_OPERATION)
+
+
+def keep_alive_for(operation: str) -> str:
+    """Keep-alive sent with a call of the given operation."""
+    return _KEEP_ALIVE_BY_OPERATION.get(operation, settings.OLLAMA_KEEP_ALIVE)
+
+
+def parse_hours(spec: str) -> Optional[Tuple[dtime, dtime]]:
+    """``"08:00-15:00"`` -> (08:00, 15:00); empty disables the keeper."""
+    if not spec.strip():
+        return None
+    start, _, end = spec.partition("-")
+    return dtime.fromisoformat(start.strip()), dtime.fromisoformat(end.strip())
+
+
+def parse_days(spec: str) -> Set[int]:
+    """ISO weekdays (Monday = 1) from ``"1-5"`` or ``"1,3,5"``."""
+    days = set()
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        first, _, last = item.partition("-")
+        days.update(range(int(first), int(last or first) + 1))
+    return days
+
+
+def model_name(model: str) -> str:
+    """Name as Ollama reports it in /api/ps ("llama2" -> "llama2:latest")."""
+    return model if ":" in model else f"{model}:latest"
+
+
+class ModelKeeper:
+    """Loads the configured models at startup and keeps them resident during working hours."""
+
+    def __init__(
+        self,
+        host: str,
+        models: List[Tuple[str, str]],
+        interval: float,
+        hours: Optional[Tuple[dtime, dtime]] = None,
+        days: Optional[Set[int]] = None,
+        timezone: Optional[tzinfo] = None,
+    ):
+        self.host = host
+        self.models = list(dict.fromkeys(models))  # (model, GENERATE|EMBED), deduplicated
+        self.interval = interval
+        self.hours = hours
+        self.days = days if days is not None else set(range(1, 6))
+        self.timezone = timezone  # Of hours and days; None: the process' local time
+        self.last_warmed: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def keep_alive(self) -> str:
+        # Outlives the interval, so a missed round does not unload the model
+        return f"{int(self.interval * 2 + 60)}s"
+
+    def in_working_hours(self, now: Optional[datetime] = None) -> bool:
+        """Whether `now` (default: current time; naive values are local time) is within working hours."""
+        if self.hours is None:
+            return False
+        if now is None:
+            now = datetime.now(self.timezone)
+        elif now.tzinfo is not None and self.timezone is not None:
+            now = now.astimezone(self.timezone)
+        start, end = self.hours
+        return now.isoweekday() in self.days and start <= now.time() < end
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            # Loading a model from disk can take a while
+            self._client = httpx.AsyncClient(base_url=self.host, timeout=120)
+        return self._client
+
+    async def warm(self, model: str, kind: str, keep_alive: str):
+        """Loads `model` (empty request) and sets how long Ollama keeps it."""
+        if kind == EMBED:
+            response = await self._http().post(
+                "/api/embeddings", json={"model": model, "prompt": "", "keep_alive": keep_alive}
+            )
+        else:
+            response = await self._http().post(
+                "/api/generate", json={"model": model, "prompt": "", "stream": False, "keep_alive": keep_alive}
+            )
+        response.raise_for_status()
+        self.last_warmed[model] = datetime.now()
+
+    async def warm_all(self, keep_alive: Optional[str] = None):
+        """Loads every model concurrently; failures are logged, not raised."""
+        keep_alive = keep_alive or self.keep_alive
+        results = await asyncio.gather(
+            *(self.warm(model, kind, keep_alive) for model, kind in self.models), return_exceptions=True
+        )
+        for (model, _), result in zip(self.models, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Could not warm up Ollama model {model}: {result}")
+
+    async def loaded(self) -> Dict[str, str]:
+        """Models resident in Ollama and when they expire (GET /api/ps)."""
+        response = await self._http().get("/api/ps")
+        response.raise_for_status()
+        return {m["name"]: m.get("expires_at", "") for m in response.json().get("models", [])}
+
+    async def status(self) -> str:
+        """Health detail; raises when a hot model is not resident during working hours."""
+        loaded = await self.loaded()
+        missing = [model for model, _ in self.models if model_name(model) not in loaded]
+        if not missing:
+            return f"loaded: {', '.join(model for model, _ in self.models)}"
+        if self.in_working_hours():
+            raise RuntimeError(f"not loaded: {', '.join(missing)}")
+        return f"idle: {', '.join(missing)} not loaded outside working hours"
+
+    def start(self, warm_up: bool = True):
+        """Starts the warm-up and keep-alive loop on the running event loop."""
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run(warm_up), name="ollama-model-keeper")
+
+    async def stop(self):
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self, warm_up: bool):
+        if warm_up:
+            logger.info(f"Warming up Ollama models: {', '.join(model for model, _ in self.models)}")
+            await self.warm_all()
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.in_working_hours():
+                await self.warm_all()
+
+
+model_keeper = ModelKeeper(
+    host=settings.OLLAMA_HOST,
+    models=[(settings.OLLAMA_MODEL, GENERATE), (settings.OLLAMA_EMBEDDING_MODEL, EMBED)],
+    interval=settings.OLLAMA_KEEP_WARM_INTERVAL_SECONDS,
+    hours=parse_hours(settings.OLLAMA_KEEP_WARM_HOURS),
+    days=parse_days(settings.OLLAMA_KEEP_WARM_DAYS),
+    timezone=ZoneInfo(settings.OLLAMA_KEEP_WARM_TIMEZONE),
+)
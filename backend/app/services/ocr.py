@@ -0,0 +1,203 @@
+"""
+OCR fallback for scanned documents.
+
+Only pages without a text layer are OCR'd, following the page-streaming
+approach of the OCR skill (``.github/skills/skill-document-analysis-ocr``):
+each worker renders a single page with pdftoppm and runs tesseract on it, so
+a process holds at most one page bitmap whatever the document size. Workers
+live in a process pool shared by all uploads (``OCR_WORKERS``).
+
+Results are cached in ``ocr_paginas`` by a hash of the page content and the
+OCR settings, so reprocessing a document only OCRs pages never seen before.
+
+pytesseract, pdf2image and Pillow (plus the tesseract and poppler binaries)
+are optional: without them the fallback is disabled and scanned pages stay
+empty, as before.
+"""
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from importlib.util import find_spec
+from typing import Dict, Optional
+
+from pypdf import PageObject
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.ocr import PaginaOCR
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _ocr_pdf_page(pdf_path: str, page_number: int, dpi: int, lang: str) -> str:
+    """Render one page (1-based) and OCR it. Runs in a worker process."""
+    import pytesseract
+    from pdf2image import convert_from_path
+
+    image = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)[0]
+    try:
+        return pytesseract.image_to_string(image, lang=lang).strip()
+    finally:
+        image.close()
+
+
+def _ocr_image(content: bytes, lang: str) -> str:
+    """OCR an image file's bytes. Runs in a worker process."""
+    import pytesseract
+    from PIL import Image
+
+    with Image.open(io.BytesIO(content)) as image:
+        return pytesseract.image_to_string(image, lang=lang).strip()
+
+
+@lru_cache(maxsize=1)
+def ocr_available() -> bool:
+    """True when OCR is enabled and its Python dependencies are installed."""
+    if not settings.OCR_ENABLED:
+        return False
+    missing = [name for name in ("pytesseract", "pdf2image", "PIL") if find_spec(name) is None]
+    if missing:
+        logger.warning(f"OCR fallback disabled, missing packages: {', '.join(missing)}")
+        return False
+    return True
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Process pool shared by every document being processed."""
+    global _pool
+    if _pool is None:
+        # spawn: forking a process with live threads (uvicorn, DB pool) is unsafe
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.OCR_WORKERS or os.cpu_count() or 1,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the OCR worker processes (application shutdown)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _stream_data(obj) -> bytes:
+    try:
+        return obj.get_data()
+    except Exception:  # Filters pypdf cannot decode (JBIG2...): hash the raw stream
+        return getattr(obj, "_data", b"") or b""
+
+
+def _hash_resources(digest, resources, depth: int = 0):
+    """Adds the page's images and form XObjects (recursively) to the digest."""
+    if resources is None or depth > 3:
+        return
+    xobjects = resources.get_object().get("/XObject")
+    if not xobjects:
+        return
+    for name, ref in sorted(xobjects.get_object().items()):
+        obj = ref.get_object()
+        digest.update(name.encode("utf-8"))
+        digest.update(_stream_data(obj))
+        if obj.get("/Subtype") == "/Form":
+            _hash_resources(digest, obj.get("/Resources"), depth + 1)
+
+
+def page_hash(page: PageObject) -> str:
+    """SHA-256 of what a page renders to (content stream, images, geometry) and the OCR settings."""
+    digest = hashlib.sha256(f"pdf:{settings.OCR_LANG}:{settings.OCR_DPI}".encode("utf-8"))
+    digest.update(f"{list(page.mediabox)}:{page.rotation}".encode("utf-8"))
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+    _hash_resources(digest, page.get("/Resources"))
+    return digest.hexdigest()
+
+
+def image_hash(content: bytes) -> str:
+    return hashlib.sha256(f"img:{settings.OCR_LANG}:".encode("utf-8") + content).hexdigest()
+
+
+class OCRService:
+    """OCRs pages without a text layer and image uploads, with a per-page cache."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @property
+    def enabled(self) -> bool:
+        return ocr_available()
+
+    def ocr_pdf_pages(self, content: bytes, pages: Dict[int, PageObject]) -> Dict[int, str]:
+        """
+        OCR text of the given pages of a PDF, keyed by 0-based page index.
+
+        Cached pages are read from ``ocr_paginas``; the rest are OCR'd in the
+        process pool, at most ``OCR_WORKERS`` at a time.
+        """
+        hashes = {index: page_hash(page) for index, page in pages.items()}
+        cached = self._cached(set(hashes.values()))
+
+        # Pages with identical content are OCR'd once
+        pending: Dict[str, int] = {}
+        for index, digest in hashes.items():
+            if digest not in cached:
+                pending.setdefault(digest, index)
+
+        if pending:
+            logger.info(f"OCR of {len(pending)} pages ({len(hashes) - len(pending)} cached)")
+            with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+                pdf_file.write(content)
+                pdf_file.flush()
+                pool = get_pool()
+                futures = {
+                    digest: pool.submit(_ocr_pdf_page, pdf_file.name, index + 1, settings.OCR_DPI, settings.OCR_LANG)
+                    for digest, index in pending.items()
+                }
+                results = {digest: future.result() for digest, future in futures.items()}
+            self._store(results)
+            cached.update(results)
+
+        return {index: cached[digest] for index, digest in hashes.items()}
+
+    def ocr_image(self, content: bytes) -> str:
+        """OCR text of an uploaded image (JPEG/PNG)."""
+        digest = image_hash(content)
+        cached = self._cached({digest})
+        if digest in cached:
+            return cached[digest]
+        text = get_pool().submit(_ocr_image, content, settings.OCR_LANG).result()
+        self._store({digest: text})
+        return text
+
+    def _cached(self, hashes: set) -> Dict[str, str]:
+        if not hashes:
+            return {}
+        rows = self.db.query(PaginaOCR.hash, PaginaOCR.texto).filter(PaginaOCR.hash.in_(hashes)).all()
+        return {row.hash: row.texto for row in rows}
+
+    def _store(self, results: Dict[str, str]):
+        """Saves new results; a concurrent worker may have stored the same page first."""
+        # Own connection and transaction: the caller's session stays open for the whole document
+        bind = self.db.get_bind()
+        dialect_insert = postgresql.insert if bind.dialect.name == "postgresql" else sqlite.insert
+        try:
+            with bind.engine.begin() as conn:
+                conn.execute(
+                    dialect_insert(PaginaOCR)
+                    .values([{"hash": digest, "texto": text} for digest, text in results.items()])
+                    .on_conflict_do_nothing(index_elements=[PaginaOCR.hash])
+                )
+        except SQLAlchemyError as e:
+            # The text is already in hand; only reprocessing the same pages depends on it
+            logger.warning(f"Could not store OCR results: {e}")
@@ -2,24 +2,104 @@ import requests
 import json
 import os
 import logging
+import time
 from typing import Optional, Dict, Any
 
+from ..core.metrics import LLM_EXTRACTIONS, LLM_QUEUE_REJECTED, record_ollama_call
+from ..core.tracing import span
+from ..schemas.extraccion import describe_errors, parse_extraction, response_format, schema_for
+from .excerpt import PAGE_BREAK, build_excerpt
+from .model_keeper import keep_alive_for
+from .llm_scheduler import (
+    BACKGROUND, PRIORITY_NAMES, LLMCircuitOpen, LLMUnavailable, llm_scheduler, ollama_breaker,
+)
+
 logger = logging.getLogger(__name__)
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
+OLLAMA_EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", OLLAMA_MODEL)
+
+# Bump whenever the analysis prompt changes: cached extractions are keyed by it
+PROMPT_VERSION = "4"
 
 class OllamaService:
-    """Handles interaction with local LLM via Ollama."""
+    """
+    Handles interaction with local LLM via Ollama.
 
-    def __init__(self, host: str = OLLAMA_HOST, model: str = OLLAMA_MODEL):
+    Calls go through ``llm_scheduler`` with this service's priority
+    (``INTERACTIVE`` for user-facing requests, ``BACKGROUND`` otherwise) and
+    the process-wide ``ollama_breaker``.
+    """
+
+    def __init__(
+        self,
+        host: str = OLLAMA_HOST,
+        model: str = OLLAMA_MODEL,
+        priority: int = BACKGROUND,
+        embedding_model: Optional[str] = None,
+    ):
         self.host = host
         self.model = model
+        self.embedding_model = embedding_model or (OLLAMA_EMBEDDING_MODEL if model == OLLAMA_MODEL else model)
+        self.priority = priority
+
+    def post(self, operation: str, path: str, payload: Dict[str, Any], timeout: float):
+        """
+        POSTs to Ollama once the scheduler grants a slot, and records latency/throughput.
+        Returns (response, parsed body or None). Raises LLMUnavailable without calling Ollama
+        when no slot came in time or the circuit breaker is open.
+        """
+        label = PRIORITY_NAMES[self.priority]
+        payload = {**payload, "keep_alive": payload.get("keep_alive", keep_alive_for(operation))}
+        try:
+            ollama_breaker.check()  # Don't queue while the circuit is open
+            with llm_scheduler.slot(payload.get("model", self.model), operation, self.priority) as slot:
+                ollama_breaker.before_call()
+                try:
+                    response, result = self._post(operation, path, payload, timeout)
+                except Exception:
+                    slot.failed = True
+                    ollama_breaker.record_failure()
+                    raise
+                if response.status_code >= 500:
+                    slot.failed = True
+                    ollama_breaker.record_failure()
+                else:
+                    ollama_breaker.record_success()
+                if result:
+                    slot.tokens = (result.get("prompt_eval_count") or 0) + (result.get("eval_count") or 0) or None
+                return response, result
+        except LLMCircuitOpen:
+            LLM_QUEUE_REJECTED.labels(operation, label, "circuit_open").inc()
+            raise
+
+    def _post(self, operation: str, path: str, payload: Dict[str, Any], timeout: float):
+        start = time.perf_counter()
+        status = "error"
+        result = None
+        try:
+            with span(f"ollama.{operation}", **{"llm.model": payload.get("model")}):
+                response = requests.post(f"{self.host}{path}", json=payload, timeout=timeout)
+            status = str(response.status_code)
+            if response.status_code == 200:
+                result = response.json()
+            return response, result
+        finally:
+            record_ollama_call(operation, time.perf_counter() - start, status, result)
 
     def analyze_document_text(self, text: str) -> Dict[str, Any]:
         """
         Sends document text to Ollama to extract structured metadata.
+        Only an excerpt within LLM_EXCERPT_MAX_TOKENS is sent (pages separated by PAGE_BREAK).
+
+        The answer is validated against the schema of its document type
+        (``app/schemas/extraccion.py``). An invalid answer gets one repair
+        call with the same excerpt, constrained to that schema; if it is still
+        invalid the raw response is returned, so a document costs at most two
+        generations.
         """
+        excerpt = build_excerpt(text.split(PAGE_BREAK))
         prompt = f"""
         Analiza el siguiente texto de un documento administrativo y extrae la información en formato JSON.
         Busca los siguientes campos:
@@ -29,44 +109,90 @@ class OllamaService:
         - receptor (persona o entidad que recibe)
         - monto (si es una factura o documento económico, solo el número)
         - resumen (un resumen de 1 frase del contenido)
+        Según el tipo, añade también:
+        - Factura: numero_factura, nif_emisor
+        - Resolución: numero_resolucion, organo
+        - Solicitud: solicitante, objeto
+        - Informe: sentido (favorable, desfavorable o condicionado)
 
         Texto del documento:
         ---
-        {text[:2000]} 
+        {excerpt}
         ---
         Responde EXCLUSIVAMENTE con el objeto JSON válido.
         """
 
         try:
-            response = requests.post(
-                f"{self.host}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "format": "json"
-                },
-                timeout=60
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Ollama error: {response.status_code} - {response.text}")
+            response_text = self._generate_json(prompt, "json")
+            if response_text is None:
                 return {}
-
-            result = response.json()
-            response_text = result.get("response", "{}")
-            
-            # Parse the JSON string from LLM response
             try:
-                return json.loads(response_text)
-            except json.JSONDecodeError:
-                logger.error(f"Failed to parse Ollama JSON response: {response_text}")
-                return {"raw_response": response_text}
+                extraction = parse_extraction(response_text)
+                LLM_EXTRACTIONS.labels("valid").inc()
+                return extraction.model_dump(mode="json")
+            except ValueError as e:
+                errors = describe_errors(e)
+                logger.warning(f"Invalid Ollama extraction, retrying once: {errors}")
+
+            # One repair call with the text and the errors, constrained to the document type's schema
+            schema = schema_for(self._tipo_documento(response_text))
+            repair_prompt = f"""
+        La siguiente respuesta JSON con los metadatos de un documento administrativo no es válida.
+        Respuesta: {response_text[:1500]}
+        Errores: {errors}
+
+        Texto del documento:
+        ---
+        {excerpt}
+        ---
+        Corrige los errores con los datos del texto (usa null si un dato no aparece en él, no lo inventes)
+        y responde EXCLUSIVAMENTE con el objeto JSON.
+        """
+            repaired_text = self._generate_json(repair_prompt, response_format(schema))
+            if repaired_text is not None:
+                try:
+                    extraction = parse_extraction(repaired_text)
+                    LLM_EXTRACTIONS.labels("repaired").inc()
+                    return extraction.model_dump(mode="json")
+                except ValueError as e:
+                    errors = describe_errors(e)
+
+            LLM_EXTRACTIONS.labels("invalid").inc()
+            logger.error(f"Ollama extraction still invalid after repair: {errors}")
+            return {"raw_response": repaired_text or response_text}
 
+        except LLMUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error calling Ollama: {e}")
             return {"error": str(e)}
 
+    def _generate_json(self, prompt: str, response_format: Any) -> Optional[str]:
+        """Response text of a non-streamed JSON generation, or None on an HTTP error."""
+        response, result = self.post(
+            "analyze_document",
+            "/api/generate",
+            {
+                "model": self.model,
+                "prompt": prompt,
+                "stream": False,
+                "format": response_format
+            },
+            timeout=60
+        )
+        if response.status_code != 200:
+            logger.error(f"Ollama error: {response.status_code} - {response.text}")
+            return None
+        return result.get("response", "{}")
+
+    @staticmethod
+    def _tipo_documento(response_text: str) -> Optional[str]:
+        try:
+            data = json.loads(response_text)
+        except json.JSONDecodeError:
+            return None
+        return data.get("tipo_documento") if isinstance(data, dict) else None
+
     def check_health(self) -> bool:
         """Verifies if Ollama is reachable."""
         try:
@@ -80,10 +206,11 @@ class OllamaService:
         Generates a vector embedding for the given text.
         """
         try:
-            response = requests.post(
-                f"{self.host}/api/embeddings",
-                json={
-                    "model": self.model,
+            response, result = self.post(
+                "embedding",
+                "/api/embeddings",
+                {
+                    "model": self.embedding_model,
                     "prompt": text
                 },
                 timeout=30
@@ -93,9 +220,10 @@ class OllamaService:
                 logger.error(f"Ollama embedding error: {response.status_code} - {response.text}")
                 return None
 
-            result = response.json()
             return result.get("embedding")
 
+        except LLMUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error calling Ollama embeddings: {e}")
             return None
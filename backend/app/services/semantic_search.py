@@ -1,10 +1,10 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import select, desc
 from typing import List, Dict, Any, Optional
-import json
 import logging
 
 from ..models.expediente import Documento, Expediente
+from .llm_scheduler import INTERACTIVE, LLMUnavailable
 from .ollama_service import OllamaService
 
 logger = logging.getLogger(__name__)
@@ -14,7 +14,7 @@ class SemanticSearchService:
 
     def __init__(self, db: Session):
         self.db = db
-        self.ollama = OllamaService()
+        self.ollama = OllamaService(priority=INTERACTIVE)
 
     def search_documents(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """
@@ -41,7 +41,7 @@ class SemanticSearchService:
                 "nombre": doc.nombre,
                 "expediente_id": doc.expediente_id,
                 "tipo": doc.tipo,
-                "metadatos": json.loads(doc.metadatos_extraidos) if doc.metadatos_extraidos else {}
+                "metadatos": doc.metadatos_extraidos or {}
             }
             for doc in results
         ]
@@ -80,14 +80,13 @@ class SemanticSearchService:
 
         # 3. Generate response with Ollama
         try:
-            import requests
             import os
-            OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
             OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
 
-            response = requests.post(
-                f"{OLLAMA_HOST}/api/generate",
-                json={
+            response, result = self.ollama.post(
+                "rag_answer",
+                "/api/generate",
+                {
                     "model": OLLAMA_MODEL,
                     "prompt": prompt,
                     "stream": False
@@ -99,12 +98,13 @@ class SemanticSearchService:
                 logger.error(f"RAG LLM error: {response.status_code}")
                 return {"answer": "Lo siento, hubo un error al consultar el asistente.", "sources": docs}
 
-            result = response.json()
             return {
                 "answer": result.get("response", ""),
                 "sources": docs
             }
 
+        except LLMUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error in RAG Assistant: {e}")
             return {"answer": "Error al procesar la solicitud con el asistente.", "sources": docs}
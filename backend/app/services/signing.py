@@ -3,13 +3,15 @@ from datetime import datetime
 import hashlib
 from typing import Optional
 
-from ..models.expediente import Documento, Trazabilidad, Expediente
+from ..models.expediente import Documento
+from .audit import AuditTrail
 
 class SigningService:
     """Handles digital signatures for documents."""
 
     def __init__(self, db: Session):
         self.db = db
+        self.audit = AuditTrail(db)
 
     def sign_document(self, document_id: int, signed_by: str, user_id: Optional[int] = None):
         """Generates a digital signature hash for the document and updates its status."""
@@ -33,15 +35,14 @@ class SigningService:
         doc.fecha_firma = datetime.now()
 
         # Log action in Audit Trail
-        log = Trazabilidad(
+        self.audit.record(
             expediente_id=doc.expediente_id,
+            action="FIRMA_DOCUMENTO",
+            description=f"Documento '{doc.nombre}' firmado digitalmente por {signed_by}.",
             user_id=user_id,
-            accion="FIRMA_DOCUMENTO",
-            descripcion=f"Documento '{doc.nombre}' firmado digitalmente por {signed_by}.",
-            metadata_json=f'{{"hash": "{signature_hash}"}}'
+            metadata={"hash": signature_hash},
         )
-        self.db.add(log)
-        
+
         self.db.commit()
         self.db.refresh(doc)
         return doc
@@ -0,0 +1,223 @@
+"""Durable timers for legal deadlines and other delayed actions.
+
+Timers are rows in ``temporizadores``; pending ones are covered by a partial
+index on ``due_at``. A single :class:`TimerScheduler` thread per process
+sleeps until the earliest pending timer is due (or until a newly committed
+timer is earlier than that), then claims due timers in batches with
+``FOR UPDATE SKIP LOCKED`` so several workers can run the loop without firing
+a timer twice. Nothing is kept in memory: after a restart the loop simply
+picks up whatever is due.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import event, func, update
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.expediente import Expediente, EstadoExpediente, PasoTramitacion, EstadoPaso
+from ..models.temporizador import Temporizador
+from .audit import AuditTrail
+
+logger = logging.getLogger(__name__)
+
+TIPO_PLAZO_PASO = "PLAZO_PASO"
+
+_WAKEUP_KEY = "timer_wakeups"
+
+TimerHandler = Callable[[Session, Temporizador], None]
+
+
+def naive_local(value: datetime) -> datetime:
+    """Converts an aware datetime to naive local time, the form timers are stored and compared in."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+class TimerScheduler:
+    """Single-loop scheduler that fires due timers in batches."""
+
+    def __init__(self, batch_size: int, max_sleep: float):
+        self.batch_size = batch_size
+        # Upper bound on sleep, so timers committed by other processes are picked up
+        self.max_sleep = max_sleep
+        self._handlers: Dict[str, TimerHandler] = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._next_wake: Optional[datetime] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def register_handler(self, tipo: str, handler: TimerHandler):
+        """Registers the function run, inside the firing transaction, when a timer of this type is due."""
+        self._handlers[tipo] = handler
+
+    def schedule(
+        self,
+        db: Session,
+        tipo: str,
+        expediente_id: int,
+        due_at: datetime,
+        paso_id: Optional[int] = None,
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> Temporizador:
+        """Adds a timer to the caller's transaction; the loop is woken once it commits."""
+        due_at = naive_local(due_at)
+        timer = Temporizador(tipo=tipo, expediente_id=expediente_id, paso_id=paso_id, due_at=due_at, payload=payload)
+        db.add(timer)
+        db.info.setdefault(_WAKEUP_KEY, []).append(due_at)
+        return timer
+
+    def cancel_for_paso(self, db: Session, paso_id: int) -> int:
+        """Deletes the pending timers of a paso (e.g. when it completes in time)."""
+        return db.query(Temporizador).filter(
+            Temporizador.paso_id == paso_id,
+            Temporizador.fired_at.is_(None),
+        ).delete(synchronize_session=False)
+
+    def notify(self, due_at: datetime):
+        """Wakes the loop if `due_at` is earlier than its planned wake-up."""
+        due_at = naive_local(due_at)
+        next_wake = self._next_wake
+        if next_wake is None or due_at < next_wake:
+            self._wakeup.set()
+
+    def start(self):
+        """Starts the scheduler thread."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="timer-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stops the scheduler thread after the current batch."""
+        if not self.running:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def fire_due(self, db: Optional[Session] = None, now: Optional[datetime] = None) -> int:
+        """Fires one batch of due timers; returns how many were claimed."""
+        own_session = db is None
+        db = db or SessionLocal()
+        now = now or datetime.now()
+        try:
+            query = (
+                db.query(Temporizador)
+                .filter(Temporizador.fired_at.is_(None), Temporizador.due_at <= now)
+                .order_by(Temporizador.due_at)
+                .limit(self.batch_size)
+            )
+            if db.get_bind().dialect.name == "postgresql":
+                query = query.with_for_update(skip_locked=True)
+            timers = query.all()
+            if not timers:
+                return 0
+
+            for timer in timers:
+                handler = self._handlers.get(timer.tipo)
+                if handler is None:
+                    logger.warning(f"No handler for timer type {timer.tipo}, discarding timer {timer.id}")
+                    continue
+                try:
+                    # Savepoint per timer: a failing handler must not drop the rest of the batch
+                    with db.begin_nested():
+                        handler(db, timer)
+                except Exception as e:
+                    logger.error(f"Timer {timer.id} ({timer.tipo}) failed: {e}")
+
+            db.execute(
+                update(Temporizador)
+                .where(Temporizador.id.in_([t.id for t in timers]))
+                .values(fired_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            logger.info(f"Fired {len(timers)} timers")
+            return len(timers)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            if own_session:
+                db.close()
+
+    def next_due_at(self) -> Optional[datetime]:
+        """Earliest pending due_at (one probe of the partial index)."""
+        db = SessionLocal()
+        try:
+            return db.query(func.min(Temporizador.due_at)).filter(Temporizador.fired_at.is_(None)).scalar()
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Reset before looking at the table, so a notify() during the batch is not lost
+            self._next_wake = None
+            self._wakeup.clear()
+            next_due = None
+            try:
+                if self.fire_due() >= self.batch_size:
+                    continue
+                next_due = self.next_due_at()
+            except Exception as e:
+                logger.error(f"Timer scheduler iteration failed: {e}")
+
+            now = datetime.now()
+            timeout = self.max_sleep
+            if next_due is not None:
+                timeout = min(max((next_due - now).total_seconds(), 0.0), self.max_sleep)
+            self._next_wake = now + timedelta(seconds=timeout)
+            self._wakeup.wait(timeout)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_scheduler(session: Session):
+    """Let the loop know about timers that just became visible."""
+    wakeups = session.info.pop(_WAKEUP_KEY, None)
+    if wakeups:
+        # The data is already committed; a failed wake-up only delays the loop until max_sleep
+        try:
+            timer_scheduler.notify(min(wakeups))
+        except Exception as e:
+            logger.error(f"Could not wake the timer scheduler: {e}")
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_wakeups(session: Session, previous_transaction):
+    if previous_transaction.nested:
+        return  # The outer transaction may still commit its timers; an extra wake-up is harmless
+    session.info.pop(_WAKEUP_KEY, None)
+
+
+def _expire_step_deadline(db: Session, timer: Temporizador):
+    """Records that a paso's legal deadline passed without it being completed."""
+    paso = db.get(PasoTramitacion, timer.paso_id) if timer.paso_id else None
+    if paso is None or paso.estado == EstadoPaso.COMPLETADO:
+        return
+    expediente = db.get(Expediente, timer.expediente_id)
+    if expediente is not None and expediente.estado in (EstadoExpediente.CERRADO, EstadoExpediente.ANULADO):
+        return
+    AuditTrail(db).record(
+        timer.expediente_id,
+        "PLAZO_VENCIDO",
+        f"Plazo del paso '{paso.titulo}' vencido sin completar.",
+        metadata={"paso_id": paso.id, "fecha_limite": paso.fecha_limite},
+    )
+
+
+timer_scheduler = TimerScheduler(
+    batch_size=settings.TIMER_BATCH_SIZE,
+    max_sleep=settings.TIMER_MAX_SLEEP_SECONDS,
+)
+timer_scheduler.register_handler(TIPO_PLAZO_PASO, _expire_step_deadline)
@@ -1,34 +1,53 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import select, update
 from datetime import datetime
-from typing import Optional, List
-import json
+from typing import Optional, List, Dict, Any
 
-from ..models.expediente import Expediente, PasoTramitacion, EstadoPaso, EstadoExpediente, Trazabilidad
+from ..models.expediente import Expediente, PasoTramitacion, EstadoPaso, EstadoExpediente
+from .audit import AuditTrail
+from .workflow_definitions import TaskSpec, get_compiled_workflow, latest_definition
+from .timers import TIPO_PLAZO_PASO, naive_local, timer_scheduler
 
 class WorkflowService:
     """Orchestrates the state transitions and step execution of an expediente."""
 
     def __init__(self, db: Session):
         self.db = db
+        self.audit = AuditTrail(db)
 
     def log_action(self, expediente_id: int, action: str, description: str, user_id: Optional[int] = None, metadata_dict: Optional[dict] = None):
-        """Creates an audit trail entry."""
-        log = Trazabilidad(
+        """Records an audit trail entry; it is written when the caller commits."""
+        self.audit.record(
             expediente_id=expediente_id,
+            action=action,
+            description=description,
             user_id=user_id,
-            accion=action,
-            descripcion=description,
-            metadata_json=json.dumps(metadata_dict) if metadata_dict else None
+            metadata=metadata_dict,
         )
-        self.db.add(log)
-        self.db.commit()
 
-    def complete_step(self, expediente_id: int, paso_id: int, user_id: int, comments: Optional[str] = None):
+    def complete_step(self, expediente_id: int, paso_id: int, user_id: int, comments: Optional[str] = None,
+                      variables: Optional[Dict[str, Any]] = None):
         """Completes the current step and determines the next step in the workflow."""
+        paso = self._complete(expediente_id, paso_id, user_id, comments, variables)
+        self.db.commit()
+        self.db.refresh(paso)
+        return paso
+
+    def _complete(self, expediente_id: int, paso_id: int, user_id: Optional[int], comments: Optional[str] = None,
+                  variables: Optional[Dict[str, Any]] = None) -> PasoTramitacion:
+        """complete_step within the caller's transaction (bulk operations commit per chunk)."""
+        # Row lock first: parallel branches of the same expediente may complete concurrently,
+        # and the step and flow state must be read after the other completion commits
+        flow = self.db.execute(
+            select(Expediente.definicion_flujo_id, Expediente.estado_flujo)
+            .where(Expediente.id == expediente_id)
+            .with_for_update()
+        ).first()
+
         paso = self.db.query(PasoTramitacion).filter(
             PasoTramitacion.id == paso_id,
             PasoTramitacion.expediente_id == expediente_id
-        ).first()
+        ).populate_existing().first()
 
         if not paso:
             raise ValueError("Paso not found")
@@ -41,6 +60,8 @@ class WorkflowService:
         paso.datetime_fin = datetime.now()
         paso.responsable_id = user_id
         paso.comentarios = comments
+        if paso.fecha_limite is not None:
+            timer_scheduler.cancel_for_paso(self.db, paso.id)
         
         # Log action
         self.log_action(
@@ -51,20 +72,81 @@ class WorkflowService:
             metadata_dict={"paso_id": paso_id, "numero_paso": paso.numero_paso}
         )
 
-        # Check for next step or close expediente
-        self._progress_workflow(expediente_id, user_id)
-        
+        if flow.definicion_flujo_id and paso.nodo_id:
+            self._advance_definition(expediente_id, flow.definicion_flujo_id, flow.estado_flujo or {},
+                                     paso.nodo_id, user_id, variables)
+        else:
+            # Check for next step or close expediente (flush so the pending count sees this step)
+            self.db.flush()
+            self._progress_workflow(expediente_id, user_id)
+        return paso
+
+    def set_deadline(self, expediente_id: int, paso_id: int, fecha_limite: datetime, user_id: int):
+        """Sets (or moves) the legal deadline of a step; a timer records it if it expires."""
+        paso = self.db.query(PasoTramitacion).filter(
+            PasoTramitacion.id == paso_id,
+            PasoTramitacion.expediente_id == expediente_id
+        ).first()
+
+        if not paso:
+            raise ValueError("Paso not found")
+        if paso.estado == EstadoPaso.COMPLETADO:
+            raise ValueError("Paso already completed")
+
+        fecha_limite = naive_local(fecha_limite)
+        if paso.fecha_limite is not None:
+            timer_scheduler.cancel_for_paso(self.db, paso.id)
+        paso.fecha_limite = fecha_limite
+        timer_scheduler.schedule(self.db, TIPO_PLAZO_PASO, expediente_id, fecha_limite, paso_id=paso.id)
+
+        self.log_action(
+            expediente_id=expediente_id,
+            user_id=user_id,
+            action="PLAZO_ESTABLECIDO",
+            description=f"Plazo del paso '{paso.titulo}' fijado para {fecha_limite.isoformat()}.",
+            metadata_dict={"paso_id": paso_id, "fecha_limite": fecha_limite}
+        )
         self.db.commit()
         self.db.refresh(paso)
         return paso
 
+    def _advance_definition(self, expediente_id: int, definicion_id: int, state: Dict[str, Any], node_id: str,
+                            user_id: int, variables: Optional[Dict[str, Any]]):
+        """Advances an expediente driven by a workflow definition: a transition lookup plus one UPDATE."""
+        advance = get_compiled_workflow(self.db, definicion_id).complete(node_id, state, variables)
+        self._activate_tasks(expediente_id, advance.activated)
+
+        values = {"estado_flujo": advance.state, "estado": EstadoExpediente.EN_PROCESO}
+        if advance.finished:
+            values.update(estado=EstadoExpediente.CERRADO, fecha_cierre=datetime.now())
+            self.log_action(
+                expediente_id=expediente_id,
+                user_id=user_id,
+                action="EXPEDIENTE_CERRADO",
+                description="Flujo de tramitación finalizado. Expediente cerrado automáticamente."
+            )
+        self.db.execute(update(Expediente).where(Expediente.id == expediente_id).values(**values))
+
+    def _activate_tasks(self, expediente_id: int, tasks: List[TaskSpec]):
+        """Creates the pasos for tasks that just became active."""
+        now = datetime.now()
+        self.db.add_all([
+            PasoTramitacion(
+                expediente_id=expediente_id,
+                numero_paso=task.numero_paso,
+                titulo=task.titulo,
+                descripcion=task.descripcion,
+                nodo_id=task.node_id,
+                estado=EstadoPaso.PENDIENTE,
+                datetime_inicio=now,
+            )
+            for task in tasks
+        ])
+
     def _progress_workflow(self, expediente_id: int, user_id: int):
-        """Logic to advance to the next step or close the expediente."""
+        """Logic to advance to the next step or close the expediente (expedientes without a definition)."""
         expediente = self.db.query(Expediente).filter(Expediente.id == expediente_id).first()
         
-        # Current logic: Simple sequential steps
-        # In a real BPMN this would check the next definition
-        
         # Check if all steps are completed
         pending_steps = self.db.query(PasoTramitacion).filter(
             PasoTramitacion.expediente_id == expediente_id,
@@ -83,15 +165,32 @@ class WorkflowService:
         else:
             expediente.estado = EstadoExpediente.EN_PROCESO
             
-    def start_workflow(self, expediente_id: int, user_id: int):
-        """Initialize the first step of an expediente."""
+    def start_workflow(self, expediente_id: int, user_id: int, definicion_codigo: Optional[str] = None,
+                       variables: Optional[Dict[str, Any]] = None):
+        """Initialize the first step of an expediente, optionally driven by a workflow definition."""
         expediente = self.db.query(Expediente).filter(Expediente.id == expediente_id).first()
+        if not expediente:
+            raise ValueError("Expediente not found")
+
+        metadata = None
+        if definicion_codigo:
+            definicion = latest_definition(self.db, definicion_codigo)
+            if not definicion:
+                raise ValueError(f"Workflow definition '{definicion_codigo}' not found")
+
+            advance = get_compiled_workflow(self.db, definicion.id).start(variables)
+            expediente.definicion_flujo_id = definicion.id
+            expediente.estado_flujo = advance.state
+            self._activate_tasks(expediente_id, advance.activated)
+            metadata = {"definicion": definicion.codigo, "version": definicion.version}
+
         expediente.estado = EstadoExpediente.EN_PROCESO
         
         self.log_action(
             expediente_id=expediente_id,
             user_id=user_id,
             action="WORKFLOW_INICIADO",
-            description="Tramitación iniciada."
+            description="Tramitación iniciada.",
+            metadata_dict=metadata
         )
         self.db.commit()
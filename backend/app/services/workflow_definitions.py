@@ -0,0 +1,359 @@
+"""Declarative workflow definitions compiled into in-memory state machines.
+
+A definition is a JSON document stored in ``definiciones_flujo``::
+
+    {
+        "start": "registro",
+        "nodes": [
+            {"id": "registro", "type": "task", "title": "Registro de entrada", "next": "informes"},
+            {"id": "informes", "type": "parallel", "branches": ["tecnico", "juridico"]},
+            {"id": "tecnico", "type": "task", "title": "Informe técnico", "next": "union"},
+            {"id": "juridico", "type": "task", "title": "Informe jurídico", "next": "union"},
+            {"id": "union", "type": "join", "next": "importe"},
+            {"id": "importe", "type": "exclusive",
+             "conditions": [{"field": "monto", "op": ">", "value": 5000, "next": "pleno"}],
+             "default": "alcaldia"},
+            {"id": "pleno", "type": "task", "title": "Aprobación en pleno", "next": "fin"},
+            {"id": "alcaldia", "type": "task", "title": "Decreto de alcaldía", "next": "fin"},
+            {"id": "fin", "type": "end"}
+        ]
+    }
+
+Tasks become ``PasoTramitacion`` rows; gateways are resolved in memory.
+Each definition version is validated and compiled once: every node becomes
+a closure, conditions become predicates, and completing a task is a
+dictionary lookup plus evaluation of the gateways that follow it.
+"""
+import operator
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..models.flujo import DefinicionFlujo
+
+NODE_TYPES = {"task", "parallel", "join", "exclusive", "end"}
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "in": lambda left, right: left in right,
+    "not in": lambda left, right: left not in right,
+}
+
+
+class WorkflowDefinitionError(ValueError):
+    """Raised when a workflow definition is invalid."""
+
+
+@dataclass(frozen=True)
+class TaskSpec:
+    """A task node, materialized as a PasoTramitacion when it becomes active."""
+    node_id: str
+    numero_paso: int
+    titulo: str
+    descripcion: Optional[str] = None
+
+
+@dataclass
+class Advance:
+    """Outcome of starting a flow or completing one of its tasks."""
+    activated: List[TaskSpec]
+    state: Dict[str, Any]
+    finished: bool
+
+
+# A compiled node: (context, join arrivals) -> (activated task ids, end reached)
+_NodeFn = Callable[[Dict[str, Any], Dict[str, int]], Tuple[List[str], bool]]
+
+
+class CompiledWorkflow:
+    """State machine for one definition version."""
+
+    def __init__(self, tasks: Dict[str, TaskSpec], start: _NodeFn, transitions: Dict[str, _NodeFn]):
+        self.tasks = tasks
+        self._start = start
+        self._transitions = transitions
+
+    def start(self, variables: Optional[Dict[str, Any]] = None) -> Advance:
+        """Activates the first tasks of the flow."""
+        state = {"active": [], "joins": {}, "variables": dict(variables or {})}
+        return self._apply(self._start, state)
+
+    def complete(self, node_id: str, state: Dict[str, Any],
+                 variables: Optional[Dict[str, Any]] = None) -> Advance:
+        """Completes an active task and activates whatever follows it."""
+        transition = self._transitions.get(node_id)
+        if transition is None:
+            raise WorkflowDefinitionError(f"Unknown task node: {node_id}")
+        if node_id not in state.get("active", []):
+            raise WorkflowDefinitionError(f"Task node '{node_id}' is not active")
+        state = {
+            "active": [n for n in state.get("active", []) if n != node_id],
+            "joins": dict(state.get("joins", {})),
+            "variables": {**state.get("variables", {}), **(variables or {})},
+        }
+        return self._apply(transition, state)
+
+    def _apply(self, node: _NodeFn, state: Dict[str, Any]) -> Advance:
+        activated, ended = node(state["variables"], state["joins"])
+        state["active"].extend(activated)
+        # The flow finishes at an end node once no parallel branch is still running
+        finished = ended and not state["active"]
+        return Advance([self.tasks[n] for n in activated], state, finished)
+
+
+def _compile_condition(condition: dict, node_id: str) -> Callable[[Dict[str, Any]], bool]:
+    op = condition.get("op", "==")
+    if op not in _OPERATORS:
+        raise WorkflowDefinitionError(f"Node '{node_id}': unsupported operator '{op}'")
+    if not condition.get("field"):
+        raise WorkflowDefinitionError(f"Node '{node_id}': condition without field")
+
+    path = tuple(condition["field"].split("."))
+    value = condition.get("value")
+    compare = _OPERATORS[op]
+
+    def predicate(context: Dict[str, Any]) -> bool:
+        current: Any = context
+        for key in path:
+            if not isinstance(current, dict) or key not in current:
+                return False
+            current = current[key]
+        try:
+            return bool(compare(current, value))
+        except TypeError:
+            return False
+
+    return predicate
+
+
+def _targets(node: dict) -> List[str]:
+    """Outgoing edges of a node, one entry per edge."""
+    kind = node["type"]
+    if kind in ("task", "join"):
+        return [node.get("next")]
+    if kind == "parallel":
+        return list(node.get("branches") or [])
+    if kind == "exclusive":
+        return [c.get("next") for c in node.get("conditions") or []] + [node.get("default")]
+    return []
+
+
+def _check_join(join_id: str, by_id: Dict[str, dict]):
+    """Checks that a join closes a parallel gateway, one incoming edge per branch."""
+    # Edges from the alternatives of an exclusive gateway would never all arrive
+    sources = [node_id for node_id, node in by_id.items() for target in _targets(node) if target == join_id]
+
+    def reach(branch: str, gateway_id: str) -> set:
+        seen, pending = set(), [branch]
+        while pending:
+            node_id = pending.pop()
+            if node_id in seen or node_id in (join_id, gateway_id):
+                continue
+            seen.add(node_id)
+            pending.extend(_targets(by_id[node_id]))
+        return seen
+
+    for gateway_id, gateway in by_id.items():
+        if gateway["type"] != "parallel" or len(gateway["branches"]) != len(sources):
+            continue
+        covered = [reach(branch, gateway_id) for branch in gateway["branches"]]
+        if all(sum(source in nodes for nodes in covered) == 1 for source in sources) and \
+                all(sum(source in nodes for source in sources) == 1 for nodes in covered):
+            return
+    raise WorkflowDefinitionError(
+        f"Join '{join_id}' must close a parallel gateway with one incoming edge per branch"
+    )
+
+
+def _validate(definition: dict) -> Dict[str, dict]:
+    nodes = definition.get("nodes")
+    if not isinstance(nodes, list) or not nodes:
+        raise WorkflowDefinitionError("Definition must contain a non-empty 'nodes' list")
+
+    by_id: Dict[str, dict] = {}
+    for node in nodes:
+        node_id = node.get("id")
+        if not node_id:
+            raise WorkflowDefinitionError("Every node needs an 'id'")
+        if node_id in by_id:
+            raise WorkflowDefinitionError(f"Duplicate node id: {node_id}")
+        if node.get("type") not in NODE_TYPES:
+            raise WorkflowDefinitionError(f"Node '{node_id}': type must be one of {sorted(NODE_TYPES)}")
+        by_id[node_id] = node
+
+    for node in nodes:
+        kind, node_id = node["type"], node["id"]
+        if kind == "task" and not node.get("title"):
+            raise WorkflowDefinitionError(f"Task '{node_id}' needs a 'title'")
+        if kind == "parallel" and len(node.get("branches") or []) < 2:
+            raise WorkflowDefinitionError(f"Parallel gateway '{node_id}' needs at least two branches")
+        if kind == "exclusive" and not node.get("conditions"):
+            raise WorkflowDefinitionError(f"Exclusive gateway '{node_id}' needs 'conditions'")
+        for target in _targets(node):
+            if target not in by_id:
+                raise WorkflowDefinitionError(f"Node '{node_id}' points to unknown node '{target}'")
+
+    start = definition.get("start")
+    if start not in by_id:
+        raise WorkflowDefinitionError(f"Start node '{start}' not found")
+
+    # Everything must be reachable, and gateways alone must not form a loop
+    reachable, pending = set(), [start]
+    while pending:
+        node_id = pending.pop()
+        if node_id not in reachable:
+            reachable.add(node_id)
+            pending.extend(_targets(by_id[node_id]))
+    unreachable = set(by_id) - reachable
+    if unreachable:
+        raise WorkflowDefinitionError(f"Unreachable nodes: {', '.join(sorted(unreachable))}")
+    if not any(n["type"] == "end" for n in nodes):
+        raise WorkflowDefinitionError("Definition needs an 'end' node")
+    for node in nodes:
+        if node["type"] == "join":
+            _check_join(node["id"], by_id)
+
+    def check_gateway_cycle(node_id: str, path: Tuple[str, ...]):
+        if node_id in path:
+            raise WorkflowDefinitionError(f"Gateway cycle without tasks: {' -> '.join(path + (node_id,))}")
+        node = by_id[node_id]
+        if node["type"] in ("task", "end"):
+            return
+        for target in _targets(node):
+            check_gateway_cycle(target, path + (node_id,))
+
+    for node in nodes:
+        if node["type"] != "task":
+            check_gateway_cycle(node["id"], ())
+
+    return by_id
+
+
+def compile_definition(definition: dict) -> CompiledWorkflow:
+    """Validates a definition and compiles it into a CompiledWorkflow."""
+    by_id = _validate(definition)
+
+    tasks: Dict[str, TaskSpec] = {}
+    for node in definition["nodes"]:
+        if node["type"] == "task":
+            tasks[node["id"]] = TaskSpec(node["id"], len(tasks) + 1, node["title"], node.get("description"))
+
+    incoming: Dict[str, int] = {}
+    for node in definition["nodes"]:
+        for target in _targets(node):
+            incoming[target] = incoming.get(target, 0) + 1
+
+    compiled: Dict[str, _NodeFn] = {}
+
+    def node_fn(node_id: str) -> _NodeFn:
+        # Late-bound lookup so nodes can reference each other in any order
+        return lambda context, joins: compiled[node_id](context, joins)
+
+    for node_id, node in by_id.items():
+        kind = node["type"]
+        if kind == "task":
+            compiled[node_id] = (lambda task_id: lambda context, joins: ([task_id], False))(node_id)
+        elif kind == "end":
+            compiled[node_id] = lambda context, joins: ([], True)
+        elif kind == "parallel":
+            branches = [node_fn(b) for b in node["branches"]]
+
+            def parallel(context, joins, branches=branches):
+                activated, ended = [], False
+                for branch in branches:
+                    branch_tasks, branch_ended = branch(context, joins)
+                    activated.extend(branch_tasks)
+                    ended = ended or branch_ended
+                return activated, ended
+
+            compiled[node_id] = parallel
+        elif kind == "exclusive":
+            routes = [(_compile_condition(c, node_id), node_fn(c["next"])) for c in node["conditions"]]
+            default = node_fn(node["default"])
+
+            def exclusive(context, joins, routes=routes, default=default):
+                for predicate, target in routes:
+                    if predicate(context):
+                        return target(context, joins)
+                return default(context, joins)
+
+            compiled[node_id] = exclusive
+        elif kind == "join":
+            expected = incoming.get(node_id, 0)
+            target = node_fn(node["next"])
+
+            def join(context, joins, join_id=node_id, expected=expected, target=target):
+                arrived = joins.get(join_id, 0) + 1
+                if arrived < expected:
+                    joins[join_id] = arrived
+                    return [], False
+                joins.pop(join_id, None)
+                return target(context, joins)
+
+            compiled[node_id] = join
+
+    transitions = {task_id: node_fn(by_id[task_id]["next"]) for task_id in tasks}
+    return CompiledWorkflow(tasks, node_fn(definition["start"]), transitions)
+
+
+# Compiled state machines per definition version (rows are immutable, so entries never go stale)
+_compiled_cache: Dict[int, CompiledWorkflow] = {}
+_compiled_cache_lock = threading.Lock()
+
+
+def get_compiled_workflow(db: Session, definicion_id: int) -> CompiledWorkflow:
+    """Returns the compiled state machine for a definition version, compiling it once."""
+    compiled = _compiled_cache.get(definicion_id)
+    if compiled is not None:
+        return compiled
+
+    definicion = db.query(DefinicionFlujo).filter(DefinicionFlujo.id == definicion_id).first()
+    if not definicion:
+        raise ValueError(f"Workflow definition {definicion_id} not found")
+
+    compiled = compile_definition(definicion.definicion)
+    with _compiled_cache_lock:
+        _compiled_cache.setdefault(definicion_id, compiled)
+    return compiled
+
+
+def latest_definition(db: Session, codigo: str) -> Optional[DefinicionFlujo]:
+    """Latest active version of a workflow definition."""
+    return (
+        db.query(DefinicionFlujo)
+        .filter(DefinicionFlujo.codigo == codigo, DefinicionFlujo.activa.is_(True))
+        .order_by(DefinicionFlujo.version.desc())
+        .first()
+    )
+
+
+def create_definition(db: Session, codigo: str, nombre: str, definicion: dict) -> DefinicionFlujo:
+    """Validates and stores a new version of a workflow definition."""
+    compiled = compile_definition(definicion)
+
+    current = (
+        db.query(DefinicionFlujo.version)
+        .filter(DefinicionFlujo.codigo == codigo)
+        .order_by(DefinicionFlujo.version.desc())
+        .first()
+    )
+    row = DefinicionFlujo(
+        codigo=codigo,
+        version=(current[0] + 1) if current else 1,
+        nombre=nombre,
+        definicion=definicion,
+    )
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+
+    with _compiled_cache_lock:
+        _compiled_cache[row.id] = compiled
+    return row
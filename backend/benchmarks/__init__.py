@@ -0,0 +1,9 @@
+"""
+Performance benchmarks for the backend (run from backend/).
+
+- ``python -m benchmarks.serialization``: serialization cost of a list page.
+- ``python -m benchmarks.seed``: seeds a benchmark dataset.
+- ``python -m benchmarks.load``: seeds, starts the backend against local
+  Keycloak/Ollama fakes and reports p50/p95/p99 and throughput per endpoint.
+- ``python -m benchmarks.fake_ollama``: standalone fake Ollama server.
+"""
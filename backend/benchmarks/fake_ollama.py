@@ -0,0 +1,268 @@
+"""
+Deterministic stand-in for the Ollama HTTP API.
+
+Implements the endpoints the backend and the skill clients use:
+
+- ``GET /api/tags``, ``GET /api/version`` and ``GET /api/ps`` (models loaded
+  by recent requests, expiring after their ``keep_alive``)
+- ``POST /api/generate``: streamed NDJSON (the Ollama default) or a single
+  response with ``"stream": false``; ``"format": "json"`` returns a JSON
+  object, and a JSON schema as ``format`` returns an object with its
+  properties. An empty prompt only loads the model.
+- ``POST /api/embeddings`` (``prompt``) and ``POST /api/embed`` (``input``):
+  unit vectors seeded from a hash of the text, so the same text always
+  gets the same embedding.
+
+Output text depends only on the prompt. Latency before the first token,
+generation speed (tokens/s) and the fraction of requests failing with 500
+are configurable, so pipeline throughput can be measured without a GPU::
+
+    python -m benchmarks.fake_ollama --port 11434 --tokens-per-second 40 --latency 0.2
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from .fakes import FakeServer
+
+_WORDS = (
+    "el expediente consta de la documentación requerida y se propone continuar la tramitación "
+    "conforme a la normativa municipal vigente previa emisión del informe técnico correspondiente"
+).split()
+
+_METADATA = {
+    "tipo_documento": ["Factura", "Informe", "Solicitud", "Resolución"],
+    "emisor": ["Construcciones Norte S.L.", "María García López", "Servicios Técnicos Municipales"],
+    "receptor": ["Ayuntamiento", "Concejalía de Urbanismo", "Intervención"],
+    "resumen": ["Solicitud de licencia de obra menor.", "Factura de suministro de material.",
+                "Informe favorable con condiciones."],
+}
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+@lru_cache(maxsize=4096)
+def deterministic_embedding(text: str, dim: int) -> List[float]:
+    """Unit vector derived from a hash of `text`."""
+    rng = random.Random(_seed(text))
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _value_for(schema: Dict[str, Any], name: str, rng: random.Random) -> Any:
+    kind = schema.get("type")
+    if isinstance(kind, list):  # Nullable field (["number", "null"]): answer with a value
+        kind = next((k for k in kind if k != "null"), None)
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    if kind in ("number", "integer"):
+        value = rng.randrange(100, 100_000)
+        return value if kind == "integer" else value / 100
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if kind == "array":
+        return [_value_for(schema.get("items", {}), name, rng) for _ in range(rng.randint(1, 3))]
+    if kind == "object":
+        return {key: _value_for(sub, key, rng) for key, sub in schema.get("properties", {}).items()}
+    if name in _METADATA:
+        return rng.choice(_METADATA[name])
+    if "fecha" in name or schema.get("format") == "date":
+        return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(2, 5)))
+
+
+def generate_text(prompt: str, response_format: Any, max_tokens: int) -> str:
+    """Deterministic completion for a prompt (JSON when a format is requested)."""
+    rng = random.Random(_seed(prompt))
+    if isinstance(response_format, dict):
+        return json.dumps(_value_for({"type": "object", **response_format}, "", rng), ensure_ascii=False)
+    if response_format == "json":
+        metadata = {key: rng.choice(values) for key, values in _METADATA.items()}
+        metadata["fecha"] = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        metadata["monto"] = rng.randrange(100, 100_000) / 100
+        return json.dumps(metadata, ensure_ascii=False)
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(max_tokens // 2, max_tokens)))
+
+
+_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+
+def keep_alive_seconds(value: Any) -> float:
+    """Ollama keep_alive (seconds or a duration such as "5m") in seconds; negative = forever."""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    if value and value[-1] in _UNITS:
+        return float(value[:-1]) * _UNITS[value[-1]]
+    return float(value)
+
+
+def _model_name(model: str) -> str:
+    return model if ":" in model else f"{model}:latest"
+
+
+def _tokens(text: str) -> List[str]:
+    """Splits text into pseudo-tokens (words with their leading space)."""
+    words = text.split(" ")
+    return [words[0]] + [" " + w for w in words[1:]] if words else []
+
+
+class FakeOllama(FakeServer):
+    """Fake Ollama server with deterministic output and configurable speed and failures."""
+
+    def __init__(
+        self,
+        embedding_dim: int = 4096,
+        latency: float = 0.0,
+        tokens_per_second: float = 0.0,
+        error_rate: float = 0.0,
+        max_tokens: int = 48,
+        models: Optional[List[str]] = None,
+        seed: int = 0,
+        **kwargs,
+    ):
+        super().__init__(latency=latency, **kwargs)
+        self.embedding_dim = embedding_dim
+        self.tokens_per_second = tokens_per_second  # 0 = no generation delay
+        self.error_rate = error_rate
+        self.max_tokens = max_tokens
+        self.models = models or ["llama2:latest", "mistral:latest", "nomic-embed-text:latest"]
+        self.requests: Dict[str, int] = {}
+        self.loaded: Dict[str, float] = {}  # model -> expiry (epoch seconds)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.route("GET", "/api/tags", self._tags)
+        self.route("GET", "/api/version", lambda path, body: (200, {"version": "0.0.0-fake"}))
+        self.route("GET", "/api/ps", self._ps)
+        self.route("POST", "/api/generate", self._generate)
+        self.route("POST", "/api/embeddings", self._embeddings)
+        self.route("POST", "/api/embed", self._embed)
+
+    def _count(self, endpoint: str) -> bool:
+        """Counts the request; returns True when it should fail."""
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def _load(self, body: dict):
+        """Marks the requested model as loaded until its keep_alive runs out."""
+        name = _model_name(body.get("model", self.models[0]))
+        seconds = keep_alive_seconds(body.get("keep_alive"))
+        with self._lock:
+            if seconds == 0:
+                self.loaded.pop(name, None)
+            else:
+                self.loaded[name] = float("inf") if seconds < 0 else time.time() + seconds
+
+    def _ps(self, path: str, body: dict):
+        now = time.time()
+        with self._lock:
+            resident = {name: expiry for name, expiry in self.loaded.items() if expiry > now}
+        models = []
+        for name, expiry in resident.items():
+            expires = datetime.now(timezone.utc) + timedelta(seconds=min(expiry - now, 10 ** 9))
+            models.append({"name": name, "model": name, "size": 0, "expires_at": expires.isoformat()})
+        return 200, {"models": models}
+
+    def _tags(self, path: str, body: dict):
+        self._count("tags")
+        return 200, {"models": [{"name": name, "model": name, "size": 0} for name in self.models]}
+
+    def _generate(self, path: str, body: dict):
+        if self._count("generate"):
+            return 500, {"error": "fake ollama: injected failure"}
+
+        self._load(body)
+        prompt = body.get("prompt", "")
+        model = body.get("model", self.models[0])
+        if not prompt:
+            return 200, {"model": model, "created_at": _now(), "response": "", "done": True, "done_reason": "load"}
+
+        tokens = _tokens(generate_text(prompt, body.get("format"), self.max_tokens))
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        prompt_tokens = len(prompt.split())
+
+        def final(started: float) -> dict:
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            return {
+                "model": model, "created_at": _now(), "done": True, "done_reason": "stop",
+                "total_duration": int(elapsed * 1e9), "load_duration": 0,
+                "prompt_eval_count": prompt_tokens, "prompt_eval_duration": 0,
+                "eval_count": len(tokens), "eval_duration": int(elapsed * 1e9),
+            }
+
+        if body.get("stream", True) is False:
+            started = time.perf_counter()
+            time.sleep(delay * len(tokens))
+            return 200, {**final(started), "response": "".join(tokens), "context": []}
+
+        def stream() -> Iterator[dict]:
+            started = time.perf_counter()
+            for token in tokens:
+                time.sleep(delay)
+                yield {"model": model, "created_at": _now(), "response": token, "done": False}
+            yield {**final(started), "response": ""}
+
+        return 200, stream()
+
+    def _embeddings(self, path: str, body: dict):
+        if self._count("embeddings"):
+            return 500, {"error": "fake ollama: injected failure"}
+        self._load(body)
+        return 200, {"embedding": deterministic_embedding(body.get("prompt", ""), self.embedding_dim)}
+
+    def _embed(self, path: str, body: dict):
+        if self._count("embed"):
+            return 500, {"error": "fake ollama: injected failure"}
+        self._load(body)
+        inputs = body.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        return 200, {
+            "model": body.get("model", self.models[0]),
+            "embeddings": [deterministic_embedding(text, self.embedding_dim) for text in inputs],
+        }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="generation speed (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 500")
+    parser.add_argument("--embedding-dim", type=int, default=4096)
+    parser.add_argument("--max-tokens", type=int, default=48)
+    args = parser.parse_args()
+
+    server = FakeOllama(
+        embedding_dim=args.embedding_dim, latency=args.latency, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, max_tokens=args.max_tokens, host=args.host, port=args.port,
+    )
+    print(f"Fake Ollama listening on {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
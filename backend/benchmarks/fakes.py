@@ -0,0 +1,134 @@
+"""
+Local stand-ins for the backend's external services.
+
+FakeKeycloak serves a JWKS document for an RSA key generated at start-up
+and mints RS256 tokens the backend accepts; the Ollama stand-in is in
+:mod:`benchmarks.fake_ollama`. Servers run on a background thread and add a
+configurable latency to every response, so benchmarks measure the backend
+and not the network.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+# A handler returns (status, JSON body); an iterator of dicts is streamed as NDJSON
+Handler = Callable[[str, dict], Tuple[int, Union[dict, Iterator[dict]]]]
+
+
+class FakeServer:
+    """Minimal threaded JSON HTTP server with per-path handlers and fixed latency."""
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.routes: Dict[Tuple[str, str], Handler] = {}
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                handler = server.routes.get((method, self.path.split("?")[0]))
+                if server.latency:
+                    time.sleep(server.latency)
+                status, payload = handler(self.path, body) if handler else (404, {"error": "not found"})
+                if isinstance(payload, dict):
+                    data = json.dumps(payload).encode("utf-8")
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for item in payload:
+                    line = json.dumps(item).encode("utf-8") + b"\n"
+                    self.wfile.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), RequestHandler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def route(self, method: str, path: str, handler: Handler):
+        self.routes[(method, path)] = handler
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeKeycloak(FakeServer):
+    """Serves the realm JWKS and signs tokens with the matching private key."""
+
+    def __init__(self, realm: str = "olympus", audience: str = "olympus-backend", latency: float = 0.0, **kwargs):
+        super().__init__(latency=latency, **kwargs)
+        self.realm = realm
+        self.audience = audience
+        self.kid = uuid.uuid4().hex
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._private_pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        public_pem = key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+        public_jwk.update({"kid": self.kid, "use": "sig", "alg": "RS256"})
+        self.jwks = {"keys": [{k: v.decode() if isinstance(v, bytes) else v for k, v in public_jwk.items()}]}
+        self.route("GET", f"/realms/{realm}/protocol/openid-connect/certs", lambda path, body: (200, self.jwks))
+
+    def token(self, username: str, sub: str, roles: List[str], ttl: int = 3600) -> str:
+        """RS256 access token shaped like Keycloak's."""
+        now = int(time.time())
+        claims = {
+            "sub": sub,
+            "preferred_username": username,
+            "email": f"{username}@example.com",
+            "name": username,
+            "aud": self.audience,
+            "iat": now,
+            "exp": now + ttl,
+            "realm_access": {"roles": roles},
+        }
+        return jwt.encode(claims, self._private_pem, algorithm="RS256", headers={"kid": self.kid})
@@ -0,0 +1,315 @@
+"""
+Load test for the main API endpoints.
+
+Seeds a dataset (see :mod:`benchmarks.seed`), starts a fake Keycloak
+(:mod:`benchmarks.fakes`), the fake Ollama server of
+:mod:`benchmarks.fake_ollama` and a backend (uvicorn) wired to them, then
+runs every scenario at a fixed concurrency and reports latency percentiles
+and throughput::
+
+    DATABASE_URL=postgresql://... python -m benchmarks.load --concurrency 16 --requests 2000
+
+Pass ``--base-url`` to drive a backend that is already running (it must use
+the same database and the fakes' URLs, printed at start-up). ``--output``
+writes the results as JSON and ``--baseline`` compares against a previous
+file, exiting with status 1 when a scenario's p95 regresses more than
+``--max-regression``.
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+from .fake_ollama import FakeOllama
+from .fakes import FakeKeycloak
+from .seed import SeedResult, add_arguments, config_from_args, reset, seed
+
+API = "/api/v1"
+
+# A scenario issues one request with the given client and returns the response
+Scenario = Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int
+    errors: int
+    seconds: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def _pdf_bytes() -> bytes:
+    from pypdf import PdfWriter
+    writer = PdfWriter()
+    writer.add_blank_page(595, 842)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def build_scenarios(data: SeedResult, rng: random.Random) -> Dict[str, Scenario]:
+    """Listing, detail, search, upload and budget commit against the seeded rows."""
+    expedientes = data.expediente_ids
+    partidas = data.partida_ids
+    pdf = _pdf_bytes()
+    estados = ["ABIERTO", "EN_PROCESO", "CERRADO"]
+    queries = ["licencia de obra", "factura de suministros", "subvención asociación", "reclamación patrimonial"]
+    pages = itertools.count()
+
+    def list_expedientes(client):
+        # Vary the page so the list cache does not serve every request
+        skip = (next(pages) * 20) % max(len(expedientes), 1)
+        params = {"split": skip, "limit": 20}
+        if skip % 3 == 0:
+            params["estado"] = rng.choice(estados)
+        return client.get(f"{API}/expedientes", params=params)
+
+    def get_expediente(client):
+        return client.get(f"{API}/expedientes/{rng.choice(expedientes)}")
+
+    def list_facturas(client):
+        return client.get(f"{API}/finanzas/facturas", params={"expediente_id": rng.choice(expedientes)})
+
+    def semantic_search(client):
+        return client.post(f"{API}/ai/search/semantic", params={"query": rng.choice(queries)})
+
+    def upload_documento(client):
+        files = {"file": ("bench.pdf", pdf, "application/pdf")}
+        return client.post(f"{API}/expedientes/{rng.choice(expedientes)}/documentos", files=files)
+
+    def commit_budget(client):
+        params = {"monto": "1.00", "expediente_id": rng.choice(expedientes)}
+        return client.post(f"{API}/finanzas/presupuestos/{rng.choice(partidas)}/comprometer", params=params)
+
+    return {
+        "list_expedientes": list_expedientes,
+        "get_expediente": get_expediente,
+        "list_facturas": list_facturas,
+        "semantic_search": semantic_search,
+        "upload_documento": upload_documento,
+        "commit_budget": commit_budget,
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, scenario: Scenario,
+                       total: int, concurrency: int, warmup: int) -> ScenarioResult:
+    """Runs `total` requests with `concurrency` workers and measures each one."""
+    for _ in range(warmup):
+        try:
+            await scenario(client)
+        except httpx.HTTPError:
+            pass
+
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await scenario(client)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    return ScenarioResult(
+        name=name, requests=len(latencies), errors=errors, seconds=seconds,
+        p50_ms=percentile(latencies, 50), p95_ms=percentile(latencies, 95),
+        p99_ms=percentile(latencies, 99), max_ms=latencies[-1] if latencies else 0.0,
+    )
+
+
+def print_report(results: List[ScenarioResult], concurrency: int):
+    print(f"\nconcurrency {concurrency}")
+    print(f"{'scenario':<18} {'reqs':>6} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for r in results:
+        print(f"{r.name:<18} {r.requests:>6} {r.errors:>5} {r.throughput:>8.1f} "
+              f"{r.p50_ms:>8.1f} {r.p95_ms:>8.1f} {r.p99_ms:>8.1f} {r.max_ms:>8.1f}")
+
+
+def compare(results: List[ScenarioResult], baseline_path: str, max_regression: float) -> List[str]:
+    """Scenarios whose p95 grew more than `max_regression` (fraction) over the baseline."""
+    baseline = {r["name"]: r for r in json.loads(Path(baseline_path).read_text())["results"]}
+    regressions = []
+    for r in results:
+        before = baseline.get(r.name)
+        if before and before["p95_ms"] > 0 and r.p95_ms > before["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{r.name}: p95 {before['p95_ms']:.1f} ms -> {r.p95_ms:.1f} ms")
+    return regressions
+
+
+def _start_backend(port: int, keycloak: FakeKeycloak, ollama: FakeOllama, workers: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "KEYCLOAK_URL": keycloak.url,
+        "KEYCLOAK_REALM": keycloak.realm,
+        "OLLAMA_HOST": ollama.url,
+        "VERIFY_SSL": "false",
+        "ENVIRONMENT": "benchmark",
+    }
+    backend_dir = Path(__file__).resolve().parent.parent
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=backend_dir, env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}{API}/health/live", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        if process.poll() is not None:
+            raise RuntimeError("Backend exited during start-up")
+        time.sleep(0.3)
+    process.terminate()
+    raise RuntimeError("Backend did not become live within 60s")
+
+
+async def drive(base_url: str, token: str, scenarios: Dict[str, Scenario], args) -> List[ScenarioResult]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=args.timeout) as client:
+        results = []
+        for name, scenario in scenarios.items():
+            results.append(await run_scenario(client, name, scenario, args.requests, args.concurrency, args.warmup))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the main API endpoints")
+    add_arguments(parser)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--scenarios", help="comma-separated subset of scenarios")
+    parser.add_argument("--keycloak-latency", type=float, default=0.0, help="seconds added to JWKS responses")
+    parser.add_argument("--ollama-latency", type=float, default=0.0, help="seconds added to Ollama responses")
+    parser.add_argument("--ollama-tps", type=float, default=0.0, help="fake Ollama tokens/s (0 = instant)")
+    parser.add_argument("--ollama-error-rate", type=float, default=0.0, help="fraction of Ollama calls failing")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--base-url", help="use an already running backend instead of starting one")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the dataset of a previous run")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 growth (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    from sqlalchemy import select
+    from app.core.database import Base, SessionLocal, engine
+    from app.models.expediente import Documento, Expediente
+    from app.models.financiero import PartidaPresupuestaria
+    from app.models.user import User
+    from .seed import PREFIX
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.skip_seed:
+            data = SeedResult(
+                users=[dict(u._mapping) for u in db.execute(
+                    select(User.id, User.username, User.keycloak_id).where(User.username.like(f"{PREFIX.lower()}%"))
+                )],
+                expediente_ids=list(db.scalars(select(Expediente.id).where(Expediente.numero.like(f"{PREFIX}%")))),
+                partida_ids=list(db.scalars(
+                    select(PartidaPresupuestaria.id).where(PartidaPresupuestaria.codigo_contable.like(f"{PREFIX}%"))
+                )),
+            )
+        else:
+            reset(db)
+            started = time.perf_counter()
+            data = seed(config_from_args(args), db)
+            print(f"Seeded in {time.perf_counter() - started:.1f}s: "
+                  + ", ".join(f"{name} {count}" for name, count in data.counts.items()))
+    finally:
+        db.close()
+    if not data.users or not data.expediente_ids:
+        sys.exit("No benchmark dataset found; run without --skip-seed")
+
+    scenarios = build_scenarios(data, random.Random(args.seed))
+    if args.scenarios:
+        wanted = args.scenarios.split(",")
+        unknown = set(wanted) - set(scenarios)
+        if unknown:
+            sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        scenarios = {name: scenarios[name] for name in wanted}
+
+    keycloak = FakeKeycloak(latency=args.keycloak_latency).start()
+    ollama = FakeOllama(
+        embedding_dim=Documento.embedding.type.dim, latency=args.ollama_latency,
+        tokens_per_second=args.ollama_tps, error_rate=args.ollama_error_rate,
+    ).start()
+    print(f"Fake Keycloak: {keycloak.url}  Fake Ollama: {ollama.url}")
+    user = data.users[0]
+    token = keycloak.token(user["username"], user["keycloak_id"], ["FUNCIONARIO", "GESTOR"])
+
+    backend = None
+    try:
+        base_url = args.base_url
+        if not base_url:
+            backend = _start_backend(args.port, keycloak, ollama, args.workers)
+            base_url = f"http://127.0.0.1:{args.port}"
+        results = asyncio.run(drive(base_url, token, scenarios, args))
+    finally:
+        if backend:
+            backend.terminate()
+            backend.wait(10)
+        keycloak.stop()
+        ollama.stop()
+
+    print_report(results, args.concurrency)
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "concurrency": args.concurrency,
+            "dataset": data.counts,
+            "results": [{**asdict(r), "throughput": r.throughput} for r in results],
+        }, indent=2))
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.max_regression)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo p95 regression above {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
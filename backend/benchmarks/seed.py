@@ -0,0 +1,230 @@
+"""
+Seeds a realistic dataset for benchmarks.
+
+Rows are generated deterministically (fixed random seed) and written with
+multi-row INSERTs in chunks::
+
+    DATABASE_URL=postgresql://... python -m benchmarks.seed --expedientes 5000 --embeddings
+
+Everything the seed creates uses the ``BENCH-`` prefix, and ``--reset``
+removes a previous run first.
+"""
+import argparse
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.database import Base, SessionLocal, engine
+from app.models.expediente import (
+    Documento, EstadoExpediente, EstadoPaso, Expediente, PasoTramitacion, TipoDocumento, Trazabilidad,
+    TrazabilidadCadena,
+)
+from app.models.financiero import EstadoFactura, Factura, PartidaPresupuestaria
+from app.models.user import User
+from app.services.audit import write_events
+
+PREFIX = "BENCH-"
+CHUNK = 1000
+
+_ASUNTOS = [
+    "Licencia de obra menor", "Subvención a asociación vecinal", "Contrato de suministro de material",
+    "Reclamación patrimonial", "Solicitud de ocupación de vía pública", "Expediente de contratación menor",
+]
+_ACCIONES = ["EXPEDIENTE_CREADO", "CAMBIO_ESTADO", "PASO_COMPLETADO", "DOCUMENTO_ADJUNTO", "COMPROMISO_GASTO"]
+
+
+@dataclass
+class SeedConfig:
+    expedientes: int = 2000
+    documentos: int = 3  # per expediente
+    pasos: int = 4  # per expediente
+    trazabilidad: int = 5  # per expediente
+    facturas: int = 2000
+    partidas: int = 50
+    users: int = 20
+    embeddings: bool = False
+    seed: int = 42
+
+
+@dataclass
+class SeedResult:
+    users: List[Dict] = field(default_factory=list)  # {"id", "username", "keycloak_id"}
+    expediente_ids: List[int] = field(default_factory=list)
+    partida_ids: List[int] = field(default_factory=list)
+    counts: Dict[str, int] = field(default_factory=dict)
+
+
+def _insert_chunks(db: Session, model, rows: List[dict]):
+    for start in range(0, len(rows), CHUNK):
+        db.execute(insert(model), rows[start:start + CHUNK])
+
+
+def _embedding(rng: random.Random, dim: int) -> List[float]:
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+def reset(db: Session):
+    """Deletes the rows created by a previous seed."""
+    ids = select(Expediente.id).where(Expediente.numero.like(f"{PREFIX}%")).scalar_subquery()
+    for model in (Trazabilidad, TrazabilidadCadena, Documento, PasoTramitacion, Factura):
+        db.execute(delete(model).where(model.expediente_id.in_(ids)))
+    db.execute(delete(Factura).where(Factura.numero.like(f"{PREFIX}%")))
+    db.execute(delete(Expediente).where(Expediente.numero.like(f"{PREFIX}%")))
+    db.execute(delete(PartidaPresupuestaria).where(PartidaPresupuestaria.codigo_contable.like(f"{PREFIX}%")))
+    db.execute(delete(User).where(User.username.like(f"{PREFIX.lower()}%")))
+    db.commit()
+
+
+def seed(config: SeedConfig, db: Session = None) -> SeedResult:
+    """Creates the dataset and returns the ids the load scenarios need."""
+    own_session = db is None
+    db = db or SessionLocal()
+    rng = random.Random(config.seed)
+    now = datetime.now().replace(microsecond=0)
+    result = SeedResult()
+    try:
+        _insert_chunks(db, User, [
+            {
+                "keycloak_id": f"00000000-0000-4000-8000-{i:012d}",
+                "username": f"{PREFIX.lower()}user{i}",
+                "email": f"{PREFIX.lower()}user{i}@example.com",
+                "password_hash": "managed_by_keycloak",
+                "nombre_completo": f"Usuario Benchmark {i}",
+                "roles": ["FUNCIONARIO", "GESTOR"] if i % 5 == 0 else ["FUNCIONARIO"],
+                "activo": True,
+            }
+            for i in range(config.users)
+        ])
+        users = db.execute(
+            select(User.id, User.username, User.keycloak_id).where(User.username.like(f"{PREFIX.lower()}%"))
+        ).all()
+        result.users = [dict(u._mapping) for u in users]
+        user_ids = [u["id"] for u in result.users]
+
+        _insert_chunks(db, PartidaPresupuestaria, [
+            {
+                "codigo_contable": f"{PREFIX}{i:04d}",
+                "descripcion": f"Partida de gasto corriente {i}",
+                "presupuestado": Decimal(rng.randrange(100_000, 5_000_000)),
+                "comprometido": Decimal(0),
+                "pagado": Decimal(0),
+            }
+            for i in range(config.partidas)
+        ])
+        result.partida_ids = list(db.scalars(
+            select(PartidaPresupuestaria.id).where(PartidaPresupuestaria.codigo_contable.like(f"{PREFIX}%"))
+        ))
+
+        estados = list(EstadoExpediente)
+        _insert_chunks(db, Expediente, [
+            {
+                "numero": f"{PREFIX}{i:07d}",
+                "asunto": f"{rng.choice(_ASUNTOS)} nº {i}",
+                "descripcion": "Expediente generado para pruebas de rendimiento. " * rng.randint(1, 6),
+                "estado": rng.choice(estados),
+                "responsable_id": rng.choice(user_ids),
+                "fecha_creacion": now - timedelta(minutes=i),
+            }
+            for i in range(config.expedientes)
+        ])
+        result.expediente_ids = list(db.scalars(
+            select(Expediente.id).where(Expediente.numero.like(f"{PREFIX}%")).order_by(Expediente.id)
+        ))
+
+        pasos, documentos, facturas, eventos = [], [], [], []
+        dim = Documento.embedding.type.dim
+        for n, exp_id in enumerate(result.expediente_ids):
+            for p in range(config.pasos):
+                pasos.append({
+                    "expediente_id": exp_id, "numero_paso": p + 1, "titulo": f"Paso {p + 1}",
+                    "descripcion": "Revisión y emisión de informe", "responsable_id": rng.choice(user_ids),
+                    "estado": EstadoPaso.COMPLETADO if p < config.pasos // 2 else EstadoPaso.PENDIENTE,
+                })
+            for d in range(config.documentos):
+                documentos.append({
+                    "expediente_id": exp_id, "nombre": f"documento_{n}_{d}.pdf", "tipo": rng.choice(list(TipoDocumento)),
+                    "metadatos_extraidos": {"tipo_documento": "Informe", "resumen": "Documento de prueba."},
+                    "embedding": _embedding(rng, dim) if config.embeddings else None,
+                })
+            for t in range(config.trazabilidad):
+                eventos.append({
+                    "expediente_id": exp_id, "user_id": rng.choice(user_ids), "accion": rng.choice(_ACCIONES),
+                    "descripcion": "Evento generado para pruebas de rendimiento.", "metadata_json": None,
+                    "timestamp": now - timedelta(minutes=n, seconds=config.trazabilidad - t),
+                })
+
+        for i in range(config.facturas):
+            facturas.append({
+                "numero": f"{PREFIX}F{i:07d}", "proveedor": f"Proveedor {rng.randrange(200)} S.L.",
+                "monto": Decimal(rng.randrange(100, 50_000)) / 10, "fecha_emision": now - timedelta(days=rng.randrange(365)),
+                "estado": rng.choice(list(EstadoFactura)),
+                "expediente_id": rng.choice(result.expediente_ids) if result.expediente_ids else None,
+                "partida_presupuestaria_id": rng.choice(result.partida_ids) if result.partida_ids else None,
+            })
+
+        _insert_chunks(db, PasoTramitacion, pasos)
+        _insert_chunks(db, Documento, documentos)
+        _insert_chunks(db, Factura, facturas)
+        for start in range(0, len(eventos), CHUNK):
+            write_events(db, eventos[start:start + CHUNK])
+        db.commit()
+
+        result.counts = {
+            "users": len(result.users), "partidas": len(result.partida_ids),
+            "expedientes": len(result.expediente_ids), "pasos": len(pasos), "documentos": len(documentos),
+            "facturas": len(facturas), "trazabilidad": len(eventos),
+        }
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = SeedConfig()
+    parser.add_argument("--expedientes", type=int, default=defaults.expedientes)
+    parser.add_argument("--documentos", type=int, default=defaults.documentos, help="per expediente")
+    parser.add_argument("--pasos", type=int, default=defaults.pasos, help="per expediente")
+    parser.add_argument("--trazabilidad", type=int, default=defaults.trazabilidad, help="per expediente")
+    parser.add_argument("--facturas", type=int, default=defaults.facturas)
+    parser.add_argument("--partidas", type=int, default=defaults.partidas)
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--embeddings", action="store_true", help="store random document embeddings (pgvector)")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args) -> SeedConfig:
+    return SeedConfig(
+        expedientes=args.expedientes, documentos=args.documentos, pasos=args.pasos,
+        trazabilidad=args.trazabilidad, facturas=args.facturas, partidas=args.partidas,
+        users=args.users, embeddings=args.embeddings, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a benchmark dataset")
+    add_arguments(parser)
+    parser.add_argument("--reset", action="store_true", help="delete a previous benchmark dataset first")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.reset:
+            reset(db)
+        result = seed(config_from_args(args), db)
+    finally:
+        db.close()
+    print(", ".join(f"{name}: {count}" for name, count in result.counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Serialization cost of a ``list_expedientes`` page.
+
+Compares the previous path (``ExpedientePaginatedResponse`` validation from
+ORM rows, ``jsonable_encoder`` and ``json.dumps``) with the compiled
+serializers plus orjson used by the routes now. Rows are built in memory,
+so no database is needed::
+
+    python -m benchmarks.serialization --items 100 --pasos 5 --documentos 3
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.serialization import dumps, serialize_many
+from app.models.expediente import Documento, EstadoExpediente, EstadoPaso, Expediente, PasoTramitacion, TipoDocumento
+from app.schemas.expediente import ExpedientePaginatedResponse, ExpedienteRead
+
+
+def build_page(items: int, pasos: int, documentos: int):
+    """Detached expedientes with nested pasos and documentos, as the list query returns them."""
+    now = datetime(2024, 3, 1, 9, 30)
+    rows = []
+    for i in range(items):
+        exp = Expediente(
+            id=i + 1,
+            numero=f"EXP-2024-{i:05d}",
+            asunto=f"Solicitud de licencia de obra menor número {i}",
+            descripcion="Reforma interior de vivienda sin afección estructural. " * 4,
+            estado=EstadoExpediente.EN_PROCESO,
+            responsable_id=1,
+            fecha_creacion=now - timedelta(days=i),
+            fecha_actualizacion=now,
+        )
+        exp.pasos = [
+            PasoTramitacion(
+                id=i * pasos + n + 1, expediente_id=exp.id, numero_paso=n + 1,
+                titulo=f"Paso {n + 1}", descripcion="Revisión de la documentación aportada",
+                estado=EstadoPaso.COMPLETADO if n else EstadoPaso.EN_PROGRESO,
+                datetime_inicio=now, created_at=now, updated_at=now,
+            )
+            for n in range(pasos)
+        ]
+        exp.documentos = [
+            Documento(
+                id=i * documentos + n + 1, expediente_id=exp.id, nombre=f"anexo_{n}.pdf",
+                tipo=TipoDocumento.ADJUNTO, fecha_carga=now,
+                metadatos_extraidos={"nif": "12345678Z", "importe": 1520.75},
+            )
+            for n in range(documentos)
+        ]
+        rows.append(exp)
+    return rows
+
+
+def pydantic_path(rows) -> bytes:
+    page = ExpedientePaginatedResponse.model_validate(
+        {"items": rows, "total": len(rows), "skip": 0, "limit": len(rows)}, from_attributes=True
+    )
+    return json.dumps(jsonable_encoder(page), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def compiled_path(rows) -> bytes:
+    return dumps({"items": serialize_many(ExpedienteRead, rows), "total": len(rows), "skip": 0, "limit": len(rows)})
+
+
+def measure(fn, rows, repeat: int):
+    fn(rows)  # warm-up (schema/serializer compilation)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--pasos", type=int, default=5)
+    parser.add_argument("--documentos", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = build_page(args.items, args.pasos, args.documentos)
+    assert json.loads(pydantic_path(rows)) == json.loads(compiled_path(rows))
+
+    print(f"list_expedientes page: {args.items} items, {args.pasos} pasos and {args.documentos} documentos each")
+    baseline = None
+    for name, fn in (("pydantic + json", pydantic_path), ("compiled + orjson", compiled_path)):
+        median, best = measure(fn, rows, args.repeat)
+        speedup = f"  x{baseline / median:.1f}" if baseline else ""
+        baseline = baseline or median
+        print(f"  {name:<18} median {median:7.2f} ms   min {best:7.2f} ms{speedup}")
+
+
+if __name__ == "__main__":
+    main()
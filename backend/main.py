@@ -9,7 +9,16 @@ load_dotenv()
 
 from app.core.config import settings
 from app.core.database import engine, Base, init_db, close_db
-from app.routes import health, expedientes, presupuestos, ai
+from app.core.serialization import ORJSONResponse
+from app.core.metrics import MetricsMiddleware
+from app.core.tracing import setup_tracing, shutdown_tracing
+from app.routes import health, expedientes, documentos, presupuestos, ai, flujos, bulk, metrics
+from app.services.audit import audit_writer
+from app.services.audit_partitions import AuditPartitionManager
+from app.services.timers import timer_scheduler
+from app.services.health import health_monitor
+from app.services import ocr
+from app.services.model_keeper import model_keeper
 
 # Configure logging
 logging.basicConfig(
@@ -24,6 +33,7 @@ Base.metadata.create_all(bind=engine)
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.PROJECT_VERSION,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS configuration - restrictive for security
@@ -40,6 +50,8 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization", "Accept"],
 )
+app.add_middleware(MetricsMiddleware)
+setup_tracing(app, engine)
 
 
 # Startup and shutdown events
@@ -48,20 +60,39 @@ async def startup():
     """Initialize database on startup."""
     logger.info("Starting up Olympus Backend...")
     await init_db()
+    partitions = AuditPartitionManager(engine)
+    if partitions.is_partitioned():
+        partitions.ensure_future_partitions()
+    if settings.AUDIT_ASYNC_ENABLED:
+        audit_writer.start()
+    if settings.TIMERS_ENABLED:
+        timer_scheduler.start()
+    health_monitor.start()
+    model_keeper.start(warm_up=settings.OLLAMA_WARMUP_ON_STARTUP)
 
 
 @app.on_event("shutdown")
 async def shutdown():
     """Close database connections on shutdown."""
     logger.info("Shutting down Olympus Backend...")
+    await health_monitor.stop()
+    await model_keeper.stop()
+    timer_scheduler.stop()
+    audit_writer.stop()
+    ocr.shutdown_pool()
     await close_db()
+    shutdown_tracing()
 
 
 # Include routers
 app.include_router(health.router, prefix=settings.API_V1_STR)
+app.include_router(bulk.router, prefix=settings.API_V1_STR)
 app.include_router(expedientes.router, prefix=settings.API_V1_STR)
+app.include_router(documentos.router, prefix=settings.API_V1_STR)
 app.include_router(presupuestos.router, prefix=settings.API_V1_STR)
 app.include_router(ai.router, prefix=settings.API_V1_STR)
+app.include_router(flujos.router, prefix=settings.API_V1_STR)
+app.include_router(metrics.router)
 
 
 @app.get("/")
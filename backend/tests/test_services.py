@@ -1,10 +1,43 @@
+import asyncio
+import json
+import time
 import pytest
 from sqlalchemy.orm import Session
 from decimal import Decimal
+from datetime import datetime, timedelta, timezone
 
 from app.services.workflow import WorkflowService
 from app.services.accounting import AccountingService
-from app.models.expediente import Expediente, EstadoExpediente, PasoTramitacion, EstadoPaso
+from app.services.audit_chain import GENESIS_HASH, seal_unchained_entries, verify_shard
+from app.services.workflow_definitions import WorkflowDefinitionError, create_definition, get_compiled_workflow
+from app.services.timers import timer_scheduler
+from app.models.temporizador import Temporizador
+from app.schemas.expediente import PasoPlazoSet
+from app.services.bulk_operations import BulkOperationService, AVANZAR, CERRAR
+from fastapi import HTTPException
+from app.core import security
+from app.core.security import get_current_user
+from benchmarks.fakes import FakeKeycloak
+from benchmarks.fake_ollama import FakeOllama
+from app.services.ollama_service import OllamaService
+from app.services.health import HealthMonitor, check_database
+from app.services.model_keeper import EMBED, GENERATE, ModelKeeper, parse_days, parse_hours
+from app.services.llm_scheduler import (
+    BACKGROUND, INTERACTIVE, CircuitBreaker, LLMCircuitOpen, LLMQueueTimeout, LLMScheduler, parse_limits,
+)
+from app.services import ocr
+from app.services.ocr_quality import score_pages
+from app.services.document_processing import DocumentProcessingService
+from app.services.extraction_cache import ExtractionCache
+from app.services.excerpt import GAP, build_excerpt, signal_kinds
+from app.models.extraccion import ExtraccionLLM
+from app.core.serialization import dumps, get_serializer
+from app.schemas.expediente import ExpedienteRead
+from app.schemas.financiero import PartidaPresupuestariaRead
+from main import app
+from app.models.expediente import (
+    Expediente, EstadoExpediente, PasoTramitacion, EstadoPaso, Trazabilidad, TrazabilidadArchivada, Documento,
+)
 from app.models.financiero import PartidaPresupuestaria
 
 def test_workflow_start(db: Session):
@@ -40,6 +73,890 @@ def test_workflow_complete_step(db: Session):
     # In our simple logic, 0 pending steps closes the expediente
     assert exp.estado == EstadoExpediente.CERRADO
 
+def test_workflow_audit_events_written_at_commit(db: Session):
+    """Audit events are buffered and written together when the step commits."""
+    exp = Expediente(numero="EXP-TEST-03", asunto="Test Audit Buffer", estado=EstadoExpediente.EN_PROCESO)
+    db.add(exp)
+    db.commit()
+
+    paso = PasoTramitacion(expediente_id=exp.id, numero_paso=1, titulo="Paso 1", estado=EstadoPaso.PENDIENTE)
+    db.add(paso)
+    db.commit()
+
+    service = WorkflowService(db)
+    service.complete_step(exp.id, paso.id, user_id=1)
+
+    acciones = [t.accion for t in db.query(Trazabilidad).filter(Trazabilidad.expediente_id == exp.id)]
+    assert sorted(acciones) == ["EXPEDIENTE_CERRADO", "PASO_COMPLETADO"]
+    assert service.audit.pending() == 0
+
+def test_non_critical_audit_events_go_to_background_writer(db: Session, monkeypatch):
+    """Non-critical events skip the session buffer and are written by the background writer."""
+    from sqlalchemy.orm import sessionmaker
+    from app.services import audit
+
+    exp = Expediente(numero="EXP-TEST-AW", asunto="Audit writer")
+    db.add(exp)
+    db.commit()
+
+    writer = audit.AsyncAuditWriter(max_queue=10, batch_size=5, flush_interval=0.05)
+    monkeypatch.setattr(audit, "audit_writer", writer)
+    monkeypatch.setattr(audit, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    trail = audit.AuditTrail(db)
+    writer.start()
+    try:
+        trail.record(exp.id, "IA_ANALYSIS_COMPLETED", "Análisis IA", critical=False)
+        assert trail.pending() == 0
+    finally:
+        writer.stop()
+    assert [t.accion for t in db.query(Trazabilidad).filter(Trazabilidad.expediente_id == exp.id)] == [
+        "IA_ANALYSIS_COMPLETED"
+    ]
+
+    trail.record(exp.id, "IA_ANALYSIS_COMPLETED", critical=False)  # Writer stopped: buffered inline
+    assert trail.pending() == 1
+
+def test_audit_chain_links_and_detects_tampering(db: Session):
+    """Audit entries are hash-chained per expediente and edits break verification."""
+    exp = Expediente(numero="EXP-TEST-04", asunto="Test Audit Chain", estado=EstadoExpediente.ABIERTO)
+    db.add(exp)
+    db.commit()
+
+    service = WorkflowService(db)
+    service.start_workflow(exp.id, user_id=1)
+    service.log_action(exp.id, "NOTA", "Segunda entrada", user_id=1)
+    db.commit()
+
+    entries = db.query(Trazabilidad).filter(Trazabilidad.expediente_id == exp.id).order_by(Trazabilidad.secuencia).all()
+    assert [e.secuencia for e in entries] == [1, 2]
+    assert entries[0].hash_anterior == GENESIS_HASH
+    assert entries[1].hash_anterior == entries[0].hash
+
+    database_url = str(db.get_bind().url)
+    assert verify_shard(database_url, 0, 1).ok
+
+    entries[0].descripcion = "Editado"
+    db.commit()
+    report = verify_shard(database_url, 0, 1)
+    assert not report.ok
+    assert report.failures[0]["secuencia"] == 1
+
+def test_audit_chain_detects_deleted_first_entries(db: Session):
+    """Deleting the oldest entries of a chain is tampering unless their partition was archived."""
+    exp = Expediente(numero="EXP-TEST-04C", asunto="Truncated chain", estado=EstadoExpediente.ABIERTO)
+    db.add(exp)
+    db.commit()
+    service = WorkflowService(db)
+    for n in range(3):
+        service.log_action(exp.id, "NOTA", f"Entrada {n}", user_id=1)
+        db.commit()
+
+    db.query(Trazabilidad).filter(Trazabilidad.expediente_id == exp.id, Trazabilidad.secuencia == 1).delete()
+    db.commit()
+    report = verify_shard(str(db.get_bind().url), 0, 1)
+    assert not report.ok and report.chains_resumed == 0
+    assert report.failures[0]["expediente_id"] == exp.id and report.failures[0]["secuencia"] == 2
+
+def test_audit_chain_survives_archiving_and_seals_legacy_rows(db: Session):
+    """Chains resume after archived entries; unhashed rows are appended to existing chains."""
+    exp = Expediente(numero="EXP-TEST-04B", asunto="Archived chain", estado=EstadoExpediente.ABIERTO)
+    db.add(exp)
+    db.commit()
+    service = WorkflowService(db)
+    for n in range(3):
+        service.log_action(exp.id, "NOTA", f"Entrada {n}", user_id=1)
+        db.commit()
+
+    database_url = str(db.get_bind().url)
+    first = db.query(Trazabilidad).filter(Trazabilidad.expediente_id == exp.id, Trazabilidad.secuencia == 1).one()
+    # As if its month had been archived (see AuditPartitionManager._archive_partition)
+    db.add(TrazabilidadArchivada(particion="trazabilidad_p202001", expediente_id=exp.id, secuencia=1, hash=first.hash))
+    db.delete(first)
+    db.commit()
+    report = verify_shard(database_url, 0, 1)
+    assert report.ok and report.chains_resumed == 1
+
+    db.add(Trazabilidad(expediente_id=exp.id, accion="LEGACY", timestamp=datetime(2020, 1, 1)))
+    db.commit()
+    assert verify_shard(database_url, 0, 1).unsealed_entries == 1
+    assert seal_unchained_entries(db) == 1
+    legacy = db.query(Trazabilidad).filter(Trazabilidad.accion == "LEGACY").one()
+    assert legacy.secuencia == 4
+    report = verify_shard(database_url, 0, 1)
+    assert report.ok and report.unsealed_entries == 0
+
+def test_workflow_definition_parallel_and_exclusive(db: Session):
+    """A definition drives parallel branches, a join and a conditional gateway."""
+    create_definition(db, "licencia-obra", "Licencia de obra", {
+        "start": "registro",
+        "nodes": [
+            {"id": "registro", "type": "task", "title": "Registro", "next": "informes"},
+            {"id": "informes", "type": "parallel", "branches": ["tecnico", "juridico"]},
+            {"id": "tecnico", "type": "task", "title": "Informe técnico", "next": "union"},
+            {"id": "juridico", "type": "task", "title": "Informe jurídico", "next": "union"},
+            {"id": "union", "type": "join", "next": "importe"},
+            {"id": "importe", "type": "exclusive",
+             "conditions": [{"field": "monto", "op": ">", "value": 5000, "next": "pleno"}],
+             "default": "alcaldia"},
+            {"id": "pleno", "type": "task", "title": "Pleno", "next": "fin"},
+            {"id": "alcaldia", "type": "task", "title": "Alcaldía", "next": "fin"},
+            {"id": "fin", "type": "end"},
+        ],
+    })
+    exp = Expediente(numero="EXP-TEST-05", asunto="Test Workflow Definition", estado=EstadoExpediente.ABIERTO)
+    db.add(exp)
+    db.commit()
+
+    service = WorkflowService(db)
+    service.start_workflow(exp.id, user_id=1, definicion_codigo="licencia-obra")
+
+    def pending():
+        return {p.nodo_id: p for p in db.query(PasoTramitacion).filter(
+            PasoTramitacion.expediente_id == exp.id, PasoTramitacion.estado == EstadoPaso.PENDIENTE)}
+
+    service.complete_step(exp.id, pending()["registro"].id, user_id=1)
+    assert set(pending()) == {"tecnico", "juridico"}
+
+    service.complete_step(exp.id, pending()["tecnico"].id, user_id=1)
+    assert set(pending()) == {"juridico"}
+    db.refresh(exp)
+    with pytest.raises(WorkflowDefinitionError):
+        # A second completion of the same branch must not reach the join
+        get_compiled_workflow(db, exp.definicion_flujo_id).complete("tecnico", exp.estado_flujo)
+    service.complete_step(exp.id, pending()["juridico"].id, user_id=1, variables={"monto": 12000})
+    assert set(pending()) == {"pleno"}
+
+    service.complete_step(exp.id, pending()["pleno"].id, user_id=1)
+    db.refresh(exp)
+    assert exp.estado == EstadoExpediente.CERRADO
+    assert exp.estado_flujo["active"] == []
+
+def test_workflow_definition_rejects_join_after_exclusive(db: Session):
+    """A join fed by the alternatives of an exclusive gateway would wait forever."""
+    with pytest.raises(WorkflowDefinitionError, match="union"):
+        create_definition(db, "join-exclusivo", "Join tras exclusiva", {
+            "start": "importe",
+            "nodes": [
+                {"id": "importe", "type": "exclusive",
+                 "conditions": [{"field": "monto", "op": ">", "value": 5000, "next": "p"}],
+                 "default": "q"},
+                {"id": "p", "type": "task", "title": "Pleno", "next": "union"},
+                {"id": "q", "type": "task", "title": "Alcaldía", "next": "union"},
+                {"id": "union", "type": "join", "next": "fin"},
+                {"id": "fin", "type": "end"},
+            ],
+        })
+
+def test_step_deadline_timer_fires_once(db: Session):
+    """An expired deadline is recorded once; completed steps cancel their timer."""
+    exp = Expediente(numero="EXP-TEST-06", asunto="Test Deadlines", estado=EstadoExpediente.EN_PROCESO)
+    db.add(exp)
+    db.commit()
+    vencido = PasoTramitacion(expediente_id=exp.id, numero_paso=1, titulo="Alegaciones", estado=EstadoPaso.PENDIENTE)
+    a_tiempo = PasoTramitacion(expediente_id=exp.id, numero_paso=2, titulo="Informe", estado=EstadoPaso.PENDIENTE)
+    db.add_all([vencido, a_tiempo])
+    db.commit()
+
+    service = WorkflowService(db)
+    limite = datetime.now() + timedelta(days=10)
+    service.set_deadline(exp.id, vencido.id, limite, user_id=1)
+    service.set_deadline(exp.id, a_tiempo.id, limite, user_id=1)
+    service.complete_step(exp.id, a_tiempo.id, user_id=1)
+
+    assert timer_scheduler.fire_due(db, now=datetime.now()) == 0
+    assert timer_scheduler.fire_due(db, now=limite + timedelta(minutes=1)) == 1
+    assert timer_scheduler.fire_due(db, now=limite + timedelta(minutes=2)) == 0
+
+    vencidos = db.query(Trazabilidad).filter(
+        Trazabilidad.expediente_id == exp.id, Trazabilidad.accion == "PLAZO_VENCIDO"
+    ).all()
+    assert len(vencidos) == 1
+    assert db.query(Temporizador).filter(Temporizador.fired_at.is_(None)).count() == 0
+
+
+def test_step_deadline_accepts_aware_datetime(db: Session):
+    """A UTC deadline (as sent by the frontend) is stored as naive local time and wakes the scheduler."""
+    exp = Expediente(numero="EXP-TEST-06B", asunto="Test Aware Deadline", estado=EstadoExpediente.EN_PROCESO)
+    db.add(exp)
+    db.commit()
+    paso = PasoTramitacion(expediente_id=exp.id, numero_paso=1, titulo="Alegaciones", estado=EstadoPaso.PENDIENTE)
+    db.add(paso)
+    db.commit()
+
+    limite = datetime.now(timezone.utc) + timedelta(days=10)
+    assert PasoPlazoSet(fecha_limite=limite.isoformat()).fecha_limite.tzinfo is None
+    timer_scheduler._next_wake = datetime.now() + timedelta(days=30)
+    try:
+        paso = WorkflowService(db).set_deadline(exp.id, paso.id, limite, user_id=1)
+    finally:
+        timer_scheduler._next_wake = None
+    assert paso.fecha_limite == limite.astimezone().replace(tzinfo=None)
+    assert timer_scheduler.fire_due(db, now=paso.fecha_limite + timedelta(minutes=1)) == 1
+def test_bulk_close_in_chunks(db: Session):
+    """Bulk close updates in chunks, skips closed expedientes and audits each change."""
+    exps = [Expediente(numero=f"EXP-BULK-{i}", asunto="Cierre anual", estado=EstadoExpediente.EN_PROCESO)
+            for i in range(5)]
+    exps[0].estado = EstadoExpediente.CERRADO
+    db.add_all(exps)
+    db.commit()
+    ids = [e.id for e in exps]
+
+    service = BulkOperationService(db)
+    job = service.create_job(CERRAR, {"ids": ids}, {}, user_id=1)
+    assert job.total == 5
+
+    job = service.run_job(job.id, chunk_size=2)
+    assert job.estado == "COMPLETADA"
+    assert (job.procesados, job.afectados) == (5, 4)
+    assert db.query(Expediente).filter(Expediente.id.in_(ids), Expediente.estado == EstadoExpediente.CERRADO).count() == 5
+    assert db.query(Trazabilidad).filter(
+        Trazabilidad.expediente_id.in_(ids), Trazabilidad.accion == "EXPEDIENTE_CERRADO"
+    ).count() == 4
+
+def test_bulk_close_cancels_deadlines_and_bulk_advance(db: Session):
+    """Closing drops pending deadline timers; advancing completes one pending step per expediente."""
+    exps = [Expediente(numero=f"EXP-AVZ-{i}", asunto="Avance", estado=EstadoExpediente.EN_PROCESO) for i in range(3)]
+    db.add_all(exps)
+    db.commit()
+    for exp in exps:
+        db.add_all([
+            PasoTramitacion(expediente_id=exp.id, numero_paso=n, titulo=f"Paso {n}", estado=EstadoPaso.PENDIENTE)
+            for n in (1, 2)
+        ])
+    db.commit()
+    ids = [e.id for e in exps]
+
+    service = BulkOperationService(db)
+    job = service.run_job(service.create_job(AVANZAR, {"ids": ids}, {"comentarios": "Lote"}, user_id=1).id,
+                          chunk_size=2)
+    assert (job.estado, job.afectados) == ("COMPLETADA", 3)
+    completados = db.query(PasoTramitacion).filter(
+        PasoTramitacion.expediente_id.in_(ids), PasoTramitacion.estado == EstadoPaso.COMPLETADO).all()
+    assert sorted(p.numero_paso for p in completados) == [1, 1, 1]
+
+    limite = datetime.now() + timedelta(days=10)
+    paso = db.query(PasoTramitacion).filter(
+        PasoTramitacion.expediente_id == ids[0], PasoTramitacion.numero_paso == 2).one()
+    WorkflowService(db).set_deadline(ids[0], paso.id, limite, user_id=1)
+    service.run_job(service.create_job(CERRAR, {"ids": ids}, {}, user_id=1).id)
+    assert db.query(Temporizador).filter(Temporizador.expediente_id == ids[0]).count() == 0
+    assert timer_scheduler.fire_due(db, now=limite + timedelta(minutes=1)) == 0
+
+def test_bulk_advance_isolates_failing_expedientes(db: Session, monkeypatch):
+    """An expediente that fails to advance is rolled back alone and reported on the job."""
+    exps = [Expediente(numero=f"EXP-AVZ-F{i}", asunto="Avance", estado=EstadoExpediente.EN_PROCESO) for i in range(3)]
+    db.add_all(exps)
+    db.commit()
+    db.add_all([PasoTramitacion(expediente_id=exp.id, numero_paso=1, titulo="Paso 1", estado=EstadoPaso.PENDIENTE)
+                for exp in exps])
+    db.commit()
+    ids = [e.id for e in exps]
+
+    complete = WorkflowService._complete
+
+    def failing_complete(self, expediente_id, *args, **kwargs):
+        paso = complete(self, expediente_id, *args, **kwargs)
+        if expediente_id == ids[1]:
+            raise RuntimeError("Fallo simulado")
+        return paso
+
+    monkeypatch.setattr(WorkflowService, "_complete", failing_complete)
+    service = BulkOperationService(db)
+    job = service.run_job(service.create_job(AVANZAR, {"ids": ids}, {}, user_id=1).id, chunk_size=2)
+    assert (job.estado, job.procesados, job.afectados) == ("COMPLETADA", 3, 2)
+    assert job.errores == [{"expediente_id": ids[1], "error": "Fallo simulado"}]
+    pendientes = db.query(PasoTramitacion.expediente_id).filter(
+        PasoTramitacion.expediente_id.in_(ids), PasoTramitacion.estado == EstadoPaso.PENDIENTE).all()
+    assert pendientes == [(ids[1],)]
+    audited = db.query(Trazabilidad.expediente_id).filter(
+        Trazabilidad.expediente_id.in_(ids), Trazabilidad.accion == "PASO_COMPLETADO").all()
+    assert sorted(audited) == [(ids[0],), (ids[2],)]
+
+def test_expediente_etag_and_list_cache(client, db: Session):
+    """Unchanged resources answer 304; writes change the ETag and invalidate cached lists."""
+    app.dependency_overrides[get_current_user] = lambda: None
+    exp = Expediente(numero="EXP-TEST-07", asunto="Test ETag", estado=EstadoExpediente.ABIERTO)
+    db.add(exp)
+    db.commit()
+
+    first = client.get(f"/api/v1/expedientes/{exp.id}")
+    etag = first.headers["ETag"]
+    assert client.get(f"/api/v1/expedientes/{exp.id}", headers={"If-None-Match": etag}).status_code == 304
+
+    listed = client.get("/api/v1/expedientes")
+    assert listed.json()["total"] == 1
+    assert client.get("/api/v1/expedientes", headers={"If-None-Match": listed.headers["ETag"]}).status_code == 304
+
+    db.add(PasoTramitacion(expediente_id=exp.id, numero_paso=1, titulo="Paso 1", estado=EstadoPaso.PENDIENTE))
+    db.commit()
+    assert client.get(f"/api/v1/expedientes/{exp.id}", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/api/v1/expedientes").json()["items"][0]["pasos"][0]["titulo"] == "Paso 1"
+
+def test_filter_documents_by_extracted_metadata(client, db: Session):
+    """Documents are filtered in SQL by typed columns, prefix, NIF and any extracted key."""
+    from datetime import date
+
+    app.dependency_overrides[get_current_user] = lambda: None
+    exp = Expediente(numero="EXP-META-1", asunto="Metadatos")
+    db.add(exp)
+    db.commit()
+    db.add_all([
+        Documento(expediente_id=exp.id, nombre="f1.pdf", tipo_extraido="Factura", emisor="Construcciones Norte S.L.",
+                  importe=Decimal("1250.00"), fecha_documento=date(2024, 3, 12),
+                  metadatos_extraidos={"tipo_documento": "Factura", "nif_emisor": "B12345678", "numero_factura": "F-12"}),
+        Documento(expediente_id=exp.id, nombre="f2.pdf", tipo_extraido="Factura", emisor="Norte_Servicios",
+                  importe=Decimal("90.00"), fecha_documento=date(2024, 5, 2),
+                  metadatos_extraidos={"tipo_documento": "Factura", "nif_emisor": "A87654321"}),
+        Documento(expediente_id=exp.id, nombre="i1.pdf", tipo_extraido="Informe",
+                  metadatos_extraidos={"tipo_documento": "Informe", "sentido": "favorable"}),
+        Documento(expediente_id=exp.id, nombre="e1.pdf", metadatos_extraidos={"revision_manual": True}),
+    ])
+    db.commit()
+
+    def names(**params):
+        response = client.get("/api/v1/documentos", params=params)
+        assert response.status_code == 200
+        return [d["nombre"] for d in response.json()]
+
+    assert names(tipo="Factura") == ["f2.pdf", "f1.pdf"]
+    assert names(emisor="construcciones") == ["f1.pdf"]
+    assert names(emisor="norte_") == ["f2.pdf"]  # LIKE wildcards are escaped
+    assert names(nif="b12345678") == ["f1.pdf"]
+    assert names(importe_min="100", fecha_desde="2024-01-01") == ["f1.pdf"]
+    assert names(meta=["sentido:favorable"]) == ["i1.pdf"]
+    assert names(meta=["revision_manual:true"]) == ["e1.pdf"]
+    assert names(meta=["numero_factura:F-12"]) == ["f1.pdf"]
+    listed = client.get("/api/v1/documentos", params={"meta": "numero_factura:F-12"}).json()
+    assert listed[0]["metadatos_extraidos"]["nif_emisor"] == "B12345678" and listed[0]["importe"] == "1250.00"
+    assert client.get("/api/v1/documentos", params={"meta": "sin_valor"}).status_code == 400
+
+def test_compiled_serializer_matches_pydantic(db: Session):
+    """Compiled serializers produce the same JSON as validating through the schema."""
+    exp = Expediente(numero="EXP-TEST-08", asunto="Test serializer", estado=EstadoExpediente.EN_PROCESO)
+    db.add(exp)
+    db.commit()
+    db.add(PasoTramitacion(expediente_id=exp.id, numero_paso=1, titulo="Paso 1", estado=EstadoPaso.PENDIENTE))
+    partida = PartidaPresupuestaria(codigo_contable="PT-SER", descripcion="Serializer", presupuestado=Decimal("1234.50"))
+    db.add(partida)
+    db.commit()
+    db.refresh(exp)
+
+    for schema, row in ((ExpedienteRead, exp), (PartidaPresupuestariaRead, partida)):
+        expected = schema.model_validate(row).model_dump_json()
+        assert dumps(get_serializer(schema)(row)) == expected.encode()
+
+def test_health_monitor_probes_concurrently_and_caches():
+    """Probes run in parallel under a timeout; readiness only follows critical ones."""
+    calls = []
+
+    async def slow_ok():
+        calls.append("db")
+        await asyncio.sleep(0.2)
+        return "connected"
+
+    async def hanging():
+        await asyncio.sleep(10)
+
+    async def failing():
+        raise RuntimeError("status 500")
+
+    monitor = HealthMonitor(interval=60, timeout=0.3)
+    monitor.register("database", slow_ok, critical=True)
+    monitor.register("ollama", hanging)
+    monitor.register("keycloak", failing)
+
+    async def scenario():
+        start = time.perf_counter()
+        snapshot = await monitor.current()
+        elapsed = time.perf_counter() - start
+        assert await monitor.current() is snapshot
+        return snapshot, elapsed
+
+    snapshot, elapsed = asyncio.run(scenario())
+    assert elapsed < 0.6
+    assert calls == ["db"]
+    assert snapshot["status"] == "degraded"
+    assert snapshot["checks"]["ollama"]["detail"].startswith("error: timeout")
+    assert snapshot["checks"]["keycloak"]["detail"] == "error: status 500"
+    assert monitor.is_ready()
+    # The real database probe uses its own unpooled connection
+    assert asyncio.run(check_database()) == "connected"
+
+def test_metrics_endpoint_reports_route_templates(client):
+    """Request latency is labelled with the route template; pool gauges are exported."""
+    app.dependency_overrides[get_current_user] = lambda: None
+    assert client.get("/api/v1/expedientes/999999/pasos").status_code == 404
+
+    body = client.get("/metrics").text
+    assert 'route="/api/v1/expedientes/{expediente_id}/pasos"' in body
+    assert 'status="404"' in body
+    assert "olympus_db_pool_checked_out" in body
+    assert "olympus_audit_queue_depth" in body
+
+def test_failed_statement_does_not_leak_query_timer():
+    """A statement that fails leaves no start time behind; the next one is timed on its own."""
+    from sqlalchemy import text
+    from sqlalchemy.exc import SQLAlchemyError
+    from prometheus_client import REGISTRY
+    from app.core.database import engine
+
+    def sample(suffix):
+        return REGISTRY.get_sample_value(f"olympus_db_query_duration_seconds_{suffix}") or 0
+
+    with engine.connect() as conn:
+        with pytest.raises(SQLAlchemyError):
+            conn.execute(text("SELECT * FROM tabla_inexistente"))
+        count, total = sample("count"), sample("sum")
+        started = time.perf_counter()
+        conn.execute(text("SELECT 1"))
+        elapsed = time.perf_counter() - started
+        assert sample("count") == count + 1
+        assert sample("sum") - total <= elapsed
+        assert "query_start" not in conn.info
+
+def test_keycloak_token_audience_list(db: Session, monkeypatch):
+    """Tokens for any accepted audience authenticate; other audiences are rejected."""
+    keycloak = FakeKeycloak(audience="account")
+    monkeypatch.setattr(security, "_jwks_cache", keycloak.jwks)
+    monkeypatch.setattr(security, "_jwks_last_fetch", time.time())
+
+    token = keycloak.token("gestor1", "11111111-2222-4333-8444-555555555555", ["GESTOR"])
+    user = asyncio.run(get_current_user(token, db))
+    assert user.username == "gestor1" and user.roles == ["GESTOR"]
+
+    keycloak.audience = "otra-aplicacion"
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(get_current_user(keycloak.token("gestor1", user.keycloak_id, []), db))
+    assert rejected.value.status_code == 401
+
+def test_ollama_service_against_fake_ollama():
+    """The fake Ollama streams tokens, returns deterministic embeddings and injects failures."""
+    import requests
+
+    with FakeOllama(embedding_dim=8, tokens_per_second=500) as fake:
+        service = OllamaService(host=fake.url, model="llama2")
+        metadata = service.analyze_document_text("Factura nº 12 de Construcciones Norte S.L.")
+        assert {"tipo_documento", "emisor", "monto", "resumen"} <= set(metadata)
+        assert service.analyze_document_text("Factura nº 12 de Construcciones Norte S.L.") == metadata
+
+        embedding = service.generate_embedding("licencia de obra")
+        assert len(embedding) == 8 and embedding == service.generate_embedding("licencia de obra")
+        assert embedding != service.generate_embedding("otro texto")
+
+        with requests.post(f"{fake.url}/api/generate", json={"model": "llama2", "prompt": "hola"}, stream=True) as r:
+            chunks = [json.loads(line) for line in r.iter_lines() if line]
+        assert len(chunks) > 2 and chunks[-1]["done"] and chunks[-1]["eval_count"] == len(chunks) - 1
+
+        fake.error_rate = 1.0
+        assert service.analyze_document_text("texto") == {}
+        assert fake.requests["generate"] == 4
+
+def test_ocr_fallback_only_for_pages_without_text_and_cached(db: Session, monkeypatch):
+    """Scanned pages are OCR'd once per distinct page; reprocessing reads the cache."""
+    import io
+    from concurrent.futures import ThreadPoolExecutor
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=595, height=842)
+    writer.add_blank_page(width=595, height=842)  # Same content as page 1
+    writer.add_blank_page(width=842, height=595)
+    pdf = io.BytesIO()
+    writer.write(pdf)
+
+    calls = []
+
+    def fake_ocr(pdf_path, page_number, dpi, lang):
+        calls.append(page_number)
+        return f"texto escaneado de la página {page_number}"
+
+    monkeypatch.setattr(ocr, "ocr_available", lambda: True)
+    monkeypatch.setattr(ocr, "_ocr_pdf_page", fake_ocr)
+    monkeypatch.setattr(ocr, "get_pool", lambda: ThreadPoolExecutor(max_workers=2))
+
+    service = DocumentProcessingService(db)
+    pages, ocr_pages = service._extract_pages(pdf.getvalue())
+    assert sorted(calls) == [1, 3]
+    assert pages == [
+        "texto escaneado de la página 1", "texto escaneado de la página 1", "texto escaneado de la página 3",
+    ]
+    assert ocr_pages == {0, 1, 2}
+    assert not db.new and not db.dirty  # Cached in its own transaction, not through the caller's session
+
+    calls.clear()
+    assert service._extract_pages(pdf.getvalue())[0] == pages
+    assert calls == []
+
+def test_skill_ocr_service_streams_pages_in_order_with_bounded_images(tmp_path, monkeypatch):
+    """iter_pdf_pages keeps page order, bounds page images, cleans up on early exit and propagates errors."""
+    import contextlib
+    import importlib.util
+    import os
+    import sys
+    import types
+    from concurrent.futures import ThreadPoolExecutor
+    from pathlib import Path
+
+    for name, attributes in {
+        "pytesseract": {},
+        "pdf2image": {"convert_from_path": None, "pdfinfo_from_path": lambda path: {"Pages": 6}},
+        "PIL": {"Image": None},
+        "ollama": {"Client": lambda host: None},
+    }.items():
+        monkeypatch.setitem(sys.modules, name, types.SimpleNamespace(**attributes))
+    script = (Path(__file__).resolve().parents[2] / ".github" / "skills" / "skill-document-analysis-ocr"
+              / "scripts" / "ocr_service.py")
+    spec = importlib.util.spec_from_file_location("skill_ocr_service", script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    folders, images, fail_at = set(), [], []
+
+    def rasterize(pdf_path, page_num, output_folder, dpi):
+        if page_num in fail_at:
+            raise RuntimeError(f"pdftoppm failed on page {page_num}")
+        folders.add(output_folder)
+        image = os.path.join(output_folder, f"page-{page_num}.png")
+        Path(image).write_bytes(b"png")
+        images.append(len(os.listdir(output_folder)))
+        return image
+
+    def ocr_image(image_path, lang, delete):
+        page_num = int(Path(image_path).stem.split("-")[1])
+        time.sleep(0.01 * (7 - page_num))  # Later pages finish first
+        os.remove(image_path)
+        return f"texto {page_num}"
+
+    monkeypatch.setattr(module, "_rasterize_page", rasterize)
+    monkeypatch.setattr(module, "_ocr_image", ocr_image)
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(b"%PDF")
+    service = module.OCRService(max_pages_in_flight=2)
+    service._pool = ThreadPoolExecutor(max_workers=4)
+
+    async def collect(stop_after=None):
+        pages = []
+        async with contextlib.aclosing(service.iter_pdf_pages(str(pdf))) as stream:
+            async for page_num, text in stream:
+                pages.append((page_num, text))
+                if stop_after and len(pages) == stop_after:
+                    break
+        return pages
+
+    assert asyncio.run(collect()) == [(n, f"texto {n}") for n in range(1, 7)]
+    assert max(images) <= 2
+
+    images.clear()
+    assert [n for n, _ in asyncio.run(collect(stop_after=2))] == [1, 2]
+    assert len(images) < 6
+
+    fail_at.append(3)
+    pages = []
+
+    async def until_error():
+        async for item in service.iter_pdf_pages(str(pdf)):
+            pages.append(item[0])
+
+    with pytest.raises(RuntimeError, match="page 3"):
+        asyncio.run(until_error())
+    assert pages == [1, 2]
+    assert not any(os.path.exists(folder) for folder in folders)
+    service.close()
+
+def test_ocr_quality_scores_gate_llm_extraction(db: Session, monkeypatch):
+    """Noisy or mangled OCR text scores low and is not sent to the LLM."""
+    import io
+    from concurrent.futures import ThreadPoolExecutor
+    from pypdf import PdfWriter
+
+    scores = score_pages([
+        "Por la presente se solicita licencia de obra menor conforme a la normativa municipal vigente.",
+        "FACTURA Nº 2024/118  Fecha: 12/03/2024  NIF B12345678  Importe total: 1.250,00 €",
+        "l1!| ~~ ¬¬ @@ %%% ^^ }{ ]][ ·· ¦¦ ÿÿ þ ĸ ƒƒ ‡‡ ※ ■■ □ ▪ §§ ¶¶",
+        "Tne exqediemte consfa dc la docvmentaclon requerlda y se prcpone contlnuar",
+        "",
+    ])
+    assert scores[0] > 0.9 and scores[1] > 0.9
+    assert scores[2] < 0.1 and scores[3] < 0.35 and scores[4] == 0
+
+    # English is one of the OCR_LANG languages; a Catalan text layer is judged on legibility alone
+    english = "Please find attached the invoice for the services provided to the city council during March."
+    catalan = "Per la present se sol·licita llicència d'obra menor d'acord amb la normativa municipal vigent."
+    mangled = "Tne exqediemte consfa dc la docvmentaclon requerlda y se prcpone contlnuar"
+    assert score_pages([english])[0] > 0.9
+    layer_score, ocr_score = score_pages([catalan, mangled], dictionary=[False, True])
+    assert layer_score > 0.9 and ocr_score < 0.35
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=595, height=842)
+    pdf = io.BytesIO()
+    writer.write(pdf)
+    expediente = Expediente(numero="EXP-OCR-1", asunto="Escaneo ilegible")
+    db.add(expediente)
+    db.commit()
+    documento = Documento(expediente_id=expediente.id, nombre="escaneo.pdf", contenido_blob=pdf.getvalue())
+    db.add(documento)
+    db.commit()
+
+    monkeypatch.setattr(ocr, "ocr_available", lambda: True)
+    monkeypatch.setattr(ocr, "_ocr_pdf_page", lambda *args: "l1!| ~~ ¬¬ @@ %%% ^^ }{ ]][ ·· ¦¦ ÿÿ þ ĸ ƒƒ")
+    monkeypatch.setattr(ocr, "get_pool", lambda: ThreadPoolExecutor(max_workers=1))
+    service = DocumentProcessingService(db)
+    monkeypatch.setattr(service.ollama, "analyze_document_text", lambda text: pytest.fail("LLM called"))
+
+    result = service.process_pdf_content(documento.id, user_id=1)
+    assert result["error"] == "OCR quality too low"
+    db.refresh(documento)
+    assert documento.metadatos_extraidos["revision_manual"] is True
+
+def test_document_analysis_deferred_when_llm_unavailable(db: Session, monkeypatch):
+    """An unavailable LLM leaves the document marked pendiente_ia and audited instead of a generic error."""
+    import io
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=595, height=842)
+    pdf = io.BytesIO()
+    writer.write(pdf)
+    expediente = Expediente(numero="EXP-IA-PEND", asunto="IA no disponible")
+    db.add(expediente)
+    db.commit()
+    documento = Documento(expediente_id=expediente.id, nombre="factura.pdf", contenido_blob=pdf.getvalue())
+    db.add(documento)
+    db.commit()
+
+    service = DocumentProcessingService(db)
+    monkeypatch.setattr(service, "_extract_pages", lambda blob: (
+        ["FACTURA Nº 2024/118  Fecha: 12/03/2024  NIF B12345678  Importe total: 1.250,00 €"], set()))
+
+    def circuit_open(text):
+        raise LLMCircuitOpen("Ollama circuit open")
+
+    monkeypatch.setattr(service.ollama, "analyze_document_text", circuit_open)
+    result = service.process_pdf_content(documento.id, user_id=1)
+    assert result == {"error": "LLM unavailable", "pendiente_ia": True, "motivo": "LLMCircuitOpen"}
+    db.refresh(documento)
+    assert documento.metadatos_extraidos["pendiente_ia"] is True
+    assert db.query(Trazabilidad).filter(
+        Trazabilidad.expediente_id == expediente.id, Trazabilidad.accion == "IA_ANALYSIS_DEFERRED").count() == 1
+
+def test_llm_scheduler_priorities_limits_and_deadlines():
+    """Interactive calls take a freed slot before older background ones; stale waiters are dropped."""
+    import threading
+
+    scheduler = LLMScheduler(parse_limits("llama2=1, llama2:embedding=2"), default_limit=1)
+    assert scheduler.lane_for("llama2:latest", "embedding") == "llama2:embedding"
+    assert scheduler.lane_for("llama2", "analyze_document") == "llama2"
+
+    order = []
+
+    def call(name, priority, max_wait=5):
+        try:
+            with scheduler.slot("llama2", "analyze_document", priority, max_wait=max_wait):
+                order.append(name)
+        except LLMQueueTimeout:
+            order.append(f"{name}:timeout")
+
+    with scheduler.slot("llama2", "analyze_document", BACKGROUND):
+        threads = [threading.Thread(target=call, args=("bg1", BACKGROUND)),
+                   threading.Thread(target=call, args=("stale", BACKGROUND, 0.05)),
+                   threading.Thread(target=call, args=("bg2", BACKGROUND))]
+        for t in threads:
+            t.start()
+            time.sleep(0.02)
+        threads.append(threading.Thread(target=call, args=("user", INTERACTIVE)))
+        threads[-1].start()
+        time.sleep(0.15)
+        assert scheduler.stats()["llama2"] == {"limit": 1, "active": 1, "queued": 3}
+    for t in threads:
+        t.join()
+
+    assert order == ["stale:timeout", "user", "bg1", "bg2"]
+    assert scheduler.stats()["llama2"]["active"] == 0
+
+def test_llm_adaptive_limit_and_circuit_breaker(monkeypatch):
+    """Slow or failed calls halve a lane's limit, fast ones grow it back; repeated failures open the circuit."""
+    from app.services import ollama_service
+
+    scheduler = LLMScheduler({"llama2": 4}, adaptive=True, latency_tolerance=5.0)
+
+    def call(seconds, fail=False, tokens=None):
+        try:
+            with scheduler.slot("llama2", "analyze_document") as slot:
+                time.sleep(seconds)
+                slot.tokens = tokens
+                if fail:
+                    raise RuntimeError("timeout")
+        except RuntimeError:
+            pass
+
+    for _ in range(3):
+        call(0.01)
+    assert scheduler.stats()["llama2"]["limit"] == 4
+    call(0.01, tokens=20)
+    call(0.2, tokens=1000)  # A long document: slower call, but not per token
+    assert scheduler.stats()["llama2"]["limit"] == 4
+    call(0.2)  # Slower than 5x the fastest call
+    assert scheduler.stats()["llama2"]["limit"] == 2
+    time.sleep(0.1)
+    call(0.01, fail=True)
+    assert scheduler.stats()["llama2"]["limit"] == 1
+    for _ in range(4):  # +1/limit per call: 1 -> 2 -> 2.5 -> 2.9 -> 3.24
+        call(0.01)
+    assert scheduler.stats()["llama2"]["limit"] == 3
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.1)
+    monkeypatch.setattr(ollama_service, "ollama_breaker", breaker)
+    with FakeOllama(embedding_dim=8, error_rate=1.0) as fake:
+        service = OllamaService(host=fake.url, model="llama2")
+        assert service.analyze_document_text("texto") == {}
+        assert service.analyze_document_text("texto") == {}
+        with pytest.raises(LLMCircuitOpen):
+            service.analyze_document_text("texto")
+        assert fake.requests["generate"] == 2  # Failed fast, Ollama not called
+
+        time.sleep(0.15)
+        fake.error_rate = 0.0
+        breaker.before_call()  # Another caller holds the half-open probe
+        with pytest.raises(LLMCircuitOpen):
+            service.generate_embedding("texto")
+        breaker.record_success()
+        assert service.generate_embedding("texto") is not None
+        assert breaker.state == CircuitBreaker.CLOSED
+
+def test_model_keeper_warms_models_and_reports_residency():
+    """Warm-up loads both models; calls send keep_alive by operation; health reports residency."""
+    with FakeOllama(embedding_dim=8) as fake:
+        keeper = ModelKeeper(
+            fake.url, [("llama2", GENERATE), ("nomic-embed-text", EMBED)], interval=60,
+            hours=parse_hours("00:00-23:59"), days=parse_days("1-7"),
+        )
+
+        async def scenario():
+            try:
+                with pytest.raises(RuntimeError, match="not loaded: llama2, nomic-embed-text"):
+                    await keeper.status()
+                await keeper.warm_all()
+                return await keeper.status()
+            finally:
+                await keeper.stop()
+
+        assert asyncio.run(scenario()) == "loaded: llama2, nomic-embed-text"
+        assert fake.loaded["llama2:latest"] - time.time() == pytest.approx(180, abs=5)
+
+        service = OllamaService(host=fake.url, model="llama2", embedding_model="nomic-embed-text")
+        service.generate_embedding("licencia")  # embedding: 30m
+        assert fake.loaded["nomic-embed-text:latest"] - time.time() == pytest.approx(1800, abs=5)
+        service.analyze_document_text("texto")  # Default: 5m
+        assert fake.loaded["llama2:latest"] - time.time() == pytest.approx(300, abs=5)
+
+    assert parse_days("1-3,6") == {1, 2, 3, 6}
+    closed = ModelKeeper("http://ollama", [], 60, parse_hours("08:00-15:00"), parse_days("1-5"))
+    assert closed.in_working_hours(datetime(2026, 10, 19, 9, 30))  # Monday
+    assert not closed.in_working_hours(datetime(2026, 10, 18, 9, 30))  # Sunday
+    assert not closed.in_working_hours(datetime(2026, 10, 19, 15, 0))
+
+    from datetime import timezone
+    from zoneinfo import ZoneInfo
+    madrid = ModelKeeper("http://ollama", [], 60, parse_hours("08:00-15:00"), parse_days("1-5"),
+                         ZoneInfo("Europe/Madrid"))
+    assert madrid.in_working_hours(datetime(2026, 10, 19, 12, 30, tzinfo=timezone.utc))  # 14:30 in Madrid
+    assert not madrid.in_working_hours(datetime(2026, 10, 19, 13, 30, tzinfo=timezone.utc))  # 15:30 in Madrid
+
+def test_extraction_cache_analyzes_identical_text_once(db: Session, monkeypatch):
+    """Same text (modulo whitespace) and model hit the cache; failed extractions are not stored."""
+    from app.core.config import settings
+
+    with FakeOllama(embedding_dim=8, tokens_per_second=500) as fake:
+        service = OllamaService(host=fake.url, model="llama2")
+        cache = ExtractionCache(db)
+        text = "Factura nº 12 de Construcciones Norte S.L."
+
+        def analyze(body):
+            return lambda: service.analyze_document_text(body)
+
+        first = cache.get_or_compute(text, "llama2", "1", analyze(text))
+        again = cache.get_or_compute(f"  {text}\n", "llama2", "1", analyze(text))
+        assert first and again == first
+        assert fake.requests["generate"] == 1
+        assert db.query(ExtraccionLLM).populate_existing().one().hits == 1  # Counted outside this session
+        assert not db.new  # Stored outside this session too
+
+        cache.get_or_compute(text, "llama2", "2", analyze(text))  # New prompt version: new key
+        assert fake.requests["generate"] == 2
+
+        fake.error_rate = 1.0
+        assert cache.get_or_compute("otro texto", "llama2", "1", analyze("otro texto")) == {}
+        assert db.query(ExtraccionLLM).count() == 2
+
+    monkeypatch.setattr(settings, "LLM_CACHE_MAX_ENTRIES", 1)
+    assert cache.evict() == 1
+    assert db.query(ExtraccionLLM).count() == 1
+
+def test_excerpt_keeps_head_tail_and_key_lines_within_budget():
+    """The excerpt keeps the first and last page ends and lines with amounts, dates and NIFs."""
+    filler = "\n".join(f"Consideración {i}: se estima procedente continuar la tramitación." for i in range(40))
+    pages = [
+        "AYUNTAMIENTO DE EJEMPLO\nFACTURA\nEmisor: Construcciones Norte S.L.\n" + filler,
+        filler + "\nImporte total: 1.250,00 €\n" + filler,
+        filler + "\nEn Sevilla, a 12 de marzo de 2024\nFdo.: Ana Pérez, NIF 12345678Z",
+    ]
+    assert signal_kinds("Importe 1.250,00 € el 12/03/2024, CIF B12345678") == 3
+    assert signal_kinds("se estima procedente continuar") == 0
+
+    excerpt = build_excerpt(pages, max_tokens=200)
+    lines = excerpt.splitlines()
+    assert len(excerpt) <= 200 * 4 + 50
+    assert lines[0] == "AYUNTAMIENTO DE EJEMPLO" and lines[-1] == "Fdo.: Ana Pérez, NIF 12345678Z"
+    assert "Importe total: 1.250,00 €" in lines and GAP in lines
+    assert build_excerpt(pages, max_tokens=200) == excerpt
+    assert build_excerpt(["Solicitud breve", "Firmado"], max_tokens=200) == "Solicitud breve\nFirmado"
+
+    # A text layer without line breaks: its end and the chunk with the amount are still chosen
+    one_line = " ".join(["AYUNTAMIENTO DE EJEMPLO FACTURA", filler.replace("\n", " "), "Importe total: 1.250,00 €",
+                         filler.replace("\n", " "), "Fdo.: Ana Pérez, NIF 12345678Z"])
+    excerpt = build_excerpt([one_line], max_tokens=200)
+    assert len(excerpt) <= 200 * 4 + 50
+    assert excerpt.startswith("AYUNTAMIENTO DE EJEMPLO") and excerpt.endswith("Fdo.: Ana Pérez, NIF 12345678Z")
+    assert "1.250,00 €" in excerpt and GAP in excerpt.splitlines()
+
+def test_extraction_validated_and_repaired_once(db: Session, monkeypatch):
+    """An invalid answer gets one schema-constrained repair call; typed columns come from the result."""
+    from types import SimpleNamespace
+
+    answers = [
+        '{"tipo_documento": "Factura", "fecha": "12/03/2024", "monto": "no consta", "nif_emisor": "B-12345678"}',
+        '{"tipo_documento": "Factura", "fecha": "2024-03-12", "monto": "1.250,00 €", "nif_emisor": "B12345678"}',
+    ]
+    payloads = []
+
+    def fake_post(operation, path, payload, timeout):
+        payloads.append(payload)
+        return SimpleNamespace(status_code=200, text=""), {"response": answers[len(payloads) - 1]}
+
+    service = OllamaService(model="llama2")
+    monkeypatch.setattr(service, "post", fake_post)
+    metadata = service.analyze_document_text("Factura nº 12 de Construcciones Norte S.L.")
+    assert metadata["monto"] == 1250.0 and metadata["fecha"] == "2024-03-12"
+    assert len(payloads) == 2 and payloads[0]["format"] == "json"
+    repair = payloads[1]
+    assert repair["format"]["required"] == ["tipo_documento"] and "monto" in repair["prompt"]
+    assert "Construcciones Norte" in repair["prompt"]  # The document text, not only the bad answer
+    assert repair["format"]["properties"]["nif_emisor"]["type"] == ["string", "null"]
+
+    payloads.clear()
+    answers[1] = "no es JSON"
+    assert "raw_response" in service.analyze_document_text("otra factura")
+    assert len(payloads) == 2
+
+    expediente = Expediente(numero="EXP-IA-1", asunto="Factura")
+    db.add(expediente)
+    db.commit()
+    documento = Documento(expediente_id=expediente.id, nombre="factura.pdf")
+    DocumentProcessingService(db)._apply_extraction(documento, metadata)
+    assert documento.tipo_extraido == "Factura" and documento.importe == Decimal("1250.00")
+    assert documento.fecha_documento.isoformat() == "2024-03-12"
+
 def test_accounting_budget_availability(db: Session):
     """Test budget availability checks."""
     partida = PartidaPresupuestaria(
@@ -303,13 +303,7 @@ export function ExpedienteDetalle() {
                           <div className="mt-2 bg-blue-50 p-2 rounded border border-blue-100">
                             <p className="text-xs text-blue-700 font-bold">Metadatos Extraídos (IA):</p>
                             <pre className="text-xs text-blue-700 font-mono whitespace-pre-wrap">
-                              {(() => {
-                                try {
-                                  return JSON.stringify(JSON.parse(doc.metadatos_extraidos), null, 2);
-                                } catch (e) {
-                                  return "[Error: Invalid JSON format]";
-                                }
-                              })()}
+                              {JSON.stringify(doc.metadatos_extraidos, null, 2)}
                             </pre>
                           </div>
                         )}
@@ -561,7 +555,7 @@ export function ExpedienteDetalle() {
                         {doc.metadatos_extraidos && (
                           <div className="mt-2 bg-blue-50 p-2 rounded border border-blue-100">
                             <p className="text-xs text-blue-700 font-bold">Metadatos Extraídos (IA):</p>
-                            <pre className="text-xs text-blue-700 font-mono whitespace-pre-wrap">{JSON.stringify(JSON.parse(doc.metadatos_extraidos), null, 2)}</pre>
+                            <pre className="text-xs text-blue-700 font-mono whitespace-pre-wrap">{JSON.stringify(doc.metadatos_extraidos, null, 2)}</pre>
                           </div>
                         )}
                       </div>
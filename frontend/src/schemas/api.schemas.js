@@ -15,7 +15,12 @@ export const expedienteSchema = z.object({
     tipo: z.string(),
     hash_firma: z.string().optional().nullable(),
     firmado_por: z.string().optional().nullable(),
-    metadatos_extraidos: z.string().optional().nullable(),
+    metadatos_extraidos: z.record(z.any()).optional().nullable(),
+    tipo_extraido: z.string().optional().nullable(),
+    fecha_documento: z.string().optional().nullable(),
+    emisor: z.string().optional().nullable(),
+    receptor: z.string().optional().nullable(),
+    importe: z.union([z.number(), z.string()]).optional().nullable(),
   })).optional().nullable(),
 });
 